@@ -1,24 +1,35 @@
 import asyncio
 import contextlib
-import requests
 import string
+import time
 import traceback
 
-from config import load_settings, logger
+from config import load_settings, logger, mask_secret
 from audio import AudioAssistant
+from boot import BootOrchestrator
 from display import LCDScreen
+from http_session import close_session
+from loop_monitor import start_debug_loop_monitor
+from metrics import metrics, monitor_loop_lag
+from network import network_monitor
+from route_executor import route_executor, RouteTimeout
 from router import AssistantRouter
-import speech_recognition as sr
+from routes import routes_dict
+from tracing import tracer
 
+UTTERANCES = metrics.counter("gpt_home_utterances_total", "Phrases heard, by outcome.", labels=("outcome",))
+UTTERANCE_DURATION = metrics.histogram("gpt_home_utterance_duration_seconds", "Time from a transcribed phrase to the answer being spoken.")
 
 class AssistantApp:
     def __init__(self):
-        self._semaphore = asyncio.Semaphore(10)  # Limit to 10 concurrent tasks
+        self._semaphore = asyncio.Semaphore(10)  # Limit to 10 concurrent speech and display tasks
         self._state_task = None
         self._speaker = None
         self._router = None
         self._display = None
         self._isRunning = False
+        self._event_loop = None
+        self._boot = None
 
     def start(self):
         asyncio.run(self._run())
@@ -28,6 +39,11 @@ class AssistantApp:
 
     async def _run(self):
         loop = asyncio.get_running_loop()
+        self._event_loop = loop
+        metrics.start_export()
+        asyncio.create_task(monitor_loop_lag(metrics, "assistant"))
+        # With GPT_HOME_DEBUG_LOOP set, callbacks blocking the loop are logged with their stack
+        start_debug_loop_monitor("assistant")
         main_task = asyncio.create_task(self._main())
 
         try:
@@ -46,9 +62,11 @@ class AssistantApp:
             for task in pending:
                 with contextlib.suppress(asyncio.CancelledError):
                     await task
+            await close_session()
 
     async def _main(self):
-        await self._initialize()  # Wait for the event to be set
+        if not await self._initialize():
+            return
 
         self._isRunning = True
 
@@ -67,25 +85,27 @@ class AssistantApp:
         self._display = LCDScreen()
         if self._display.is_available():
             logger.success("Display initialized successfully")
-            self._limited_task(self._safe_task(self._display.updateLCD("Booting up")))
         else:
             logger.error("No Display found")
 
-        logger.info(f"Initializing Audio")
-        self._speaker = AudioAssistant()
-        logger.success(f"Audio initialized successfully")
-        await self._speaker.speak("Booting up")
-
-        logger.info(f"Initializing Assistant Router, this may take a while...")
+        # Independent stages run concurrently, listening starts once the required ones are ready
+        self._boot = BootOrchestrator(on_progress=self._show_boot_progress)
+        self._boot.add("audio", self._init_audio)
+        self._boot.add("router", self._init_router)
+        self._boot.add("greeting", lambda: self._speaker.speak("Booting up"), after=("audio",))
+        # After the greeting, so the microphone doesn't calibrate on it
+        self._boot.add("calibration", lambda: asyncio.to_thread(self._speaker.calibrate), after=("greeting",))
+        # Optional: alarms, lights and the time work offline, routes check the state the monitor publishes
+        self._boot.add("network", self._check_network, after=("audio",), required=False)
+        # Route modules and connections, a question before then loads its route itself
+        self._boot.add("routes", self._warmup_routes, after=("network",), required=False)
         try:
-            self._router = AssistantRouter("all-MiniLM-L6-v2")
+            await self._boot.run()
         except Exception as e:
-            logger.error(f"Failed to initialize Assistant Router, Shutting down")
-            logger.debug(f"Failed to initialize Assistant Router, Shutting down: {e}")
-            return
-        logger.success("Assistant Router initialized successfully")
+            logger.error(f"Failed to boot, Shutting down: {e}")
+            logger.debug(f"Failed to boot, Shutting down: {traceback.format_exc()}")
+            return False
 
-        await self._check_network()
         self._check_api_key()
 
         try:
@@ -95,26 +115,63 @@ class AssistantApp:
             logger.debug(f"An error occurred: {traceback.format_exc()}")
             await self._speaker.speak(f"Couldn't start assistant. An error occurred: {e}")
         logger.success("Listening for commands")
+        return True
+
+    async def _init_audio(self):
+        logger.info(f"Initializing Audio")
+        self._speaker = AudioAssistant()
+        logger.success(f"Audio initialized successfully")
+
+    async def _init_router(self):
+        logger.info(f"Initializing Assistant Router, this may take a while...")
+        # Loading the encoder model is CPU-bound, keep the loop free for the other stages
+        self._router = await asyncio.to_thread(AssistantRouter, "all-MiniLM-L6-v2")
+        logger.success("Assistant Router initialized successfully")
+
+    def _show_boot_progress(self, ready, total, pending):
+        if self._display.is_available():
+            self._display.display_boot_progress(ready, total, pending)
     
     def _clean(self):
         self._speaker.stop_listening()
     
     def _on_heard_sentence(self, text):
-        asyncio.run(self._process_text(text))
+        # Called from the listener thread, run on the main loop so routes can
+        # share connections and clients created there
+        asyncio.run_coroutine_threadsafe(self._process_text(text), self._event_loop).result()
+
+    async def _warmup_routes(self):
+        for name, spec in routes_dict.items():
+            try:
+                # Imported off the loop, some route modules take seconds to load
+                route = await asyncio.to_thread(spec.load)
+                await route.warmup()
+            except Exception as e:
+                logger.warning(f"Failed to warm up {name}: {e}")
+                logger.debug(f"Failed to warm up {name}: {traceback.format_exc()}")
 
     async def _process_text(self, text):
         logger.debug(f"Heard sentence: {text}")
+        # Continues the trace started when the phrase was captured
+        with tracer.utterance():
+            await self._respond(text)
+
+    async def _respond(self, text):
         # Load settings from settings.json
         settings = load_settings()
         keyword = settings.get("keyword").lower()
         
         # Check if keyword is in text and respond
         if text:
-            clean_text = text.lower().translate(str.maketrans('', '', string.punctuation))
+            with tracer.span("keyword") as keyword_span:
+                clean_text = text.lower().translate(str.maketrans('', '', string.punctuation))
+                keyword_span.attributes["matched"] = keyword in clean_text
             if keyword in clean_text:
                 enable_heard = settings.get("sayHeard", True) == True
                 actual_text = clean_text.split(keyword, 1)[1].strip()
+                UTTERANCES.inc(outcome="command" if actual_text else "keyword_only")
                 if actual_text:
+                    started = time.perf_counter()
                     heard_message = f"Heard: \"{actual_text}\""
                     logger.success(heard_message)
                     stop_event_heard = asyncio.Event()
@@ -122,116 +179,64 @@ class AssistantApp:
 
                     # Resolve the route for the actual text
                     logger.info(f"Resolving route for: {actual_text}")
-                    route = self._router.resolveRoute(actual_text)
+                    spec = self._router.resolveRoute(actual_text)
+                    # A question before the warmup imports its route, some modules take seconds to load
+                    route = (spec.load() if spec.loaded else await asyncio.to_thread(spec.load))()
 
-                    # Create a task for Routing query, don't await it yet
-                    query_task = asyncio.create_task(self._limited_task(route.handle(actual_text)))
+                    # Create a task for Routing query, don't await it yet. The
+                    # executor applies the route's deadline and concurrency limit
+                    query_task = asyncio.create_task(route_executor.execute(route, actual_text))
 
+                    heard_tasks = []
                     if enable_heard:
-                        await asyncio.gather(
-                            self._limited_task(self._safe_task(self._speaker.speak("I'm on it", stop_event_heard))),
-                            self._limited_task(self._safe_task(self._display.updateLCD(heard_message, stop_event=stop_event_heard)))
-                        )
+                        heard_tasks = [
+                            asyncio.create_task(self._limited_task(self._safe_task(self._speaker.speak("I'm on it", stop_event_heard)))),
+                            asyncio.create_task(self._limited_task(self._safe_task(self._display.updateLCD(heard_message, stop_event=stop_event_heard))))
+                        ]
 
+                    response_tasks = []
                     try:
-                        response_message = await query_task
-                    except Exception as e:
-                        logger.error(f"An error occurred while processing the command: {e}")
-                        logger.debug(f"An error occurred while processing the command: {traceback.format_exc()}")
-                        response_message = f"An error occurred in the {route.__class__.__name__} module"
-                    
-                    # speak and display answer
-                    response_task_speak = asyncio.create_task(self._limited_task(self._safe_task(self._speaker.speak(response_message, stop_event_response))))
-                    response_task_lcd = asyncio.create_task(self._limited_task(self._safe_task(self._display.updateLCD(response_message, stop_event=stop_event_response))))
-
-                    logger.success(response_message)
-                    await asyncio.gather(response_task_speak, response_task_lcd)
-            else:
-                return  # Skip to the next iteration
-
-    
-    async def _loop(self):
-        try:
-            # Load settings from settings.json
-            settings = load_settings()
-            keyword = settings.get("keyword").lower()
-            logger.info(f"Listening for keyword {keyword}")
-
-            # Start displaying 'Listening'
-            stop_event = asyncio.Event()
-            state_task = asyncio.create_task(self._display.display_state("Listening", stop_event))
-
-            text = None
-            try:
-                text = await self._speaker.listen(state_task, stop_event)
-            except OSError as e:
-                logger.error("Microphone not initialized or not available. Sleeping 2 seconds.")
-                await asyncio.sleep(2)
-            except Exception as e:
-                logger.error(f"Listening failed")
-                logger.debug(f"Listening failed: {traceback.format_exc()}")
-                return
-
-            # Stop displaying 'Listening'
-            stop_event.set()
-            if state_task:
-                state_task.cancel()
-                try:
-                    await state_task
-                except asyncio.CancelledError:
-                    pass
-
-            # Check if keyword is in text and respond
-            if text:
-                clean_text = text.lower().translate(str.maketrans('', '', string.punctuation))
-                if keyword in clean_text:
-                    enable_heard = settings.get("sayHeard", True) == True
-                    actual_text = clean_text.split(keyword, 1)[1].strip()
-                    if actual_text:
-                        heard_message = f"Heard: \"{actual_text}\""
-                        logger.success(heard_message)
-                        stop_event_heard = asyncio.Event()
-                        stop_event_response = asyncio.Event()
-
-                        # Resolve the route for the actual text
-                        logger.info(f"Resolving route for: {actual_text}")
-                        route = self._router.resolveRoute(actual_text)
-
-                        # Create a task for Routing query, don't await it yet
-                        query_task = asyncio.create_task(self._limited_task(route.handle(text)))
-
-                        if enable_heard:
-                            await asyncio.gather(
-                                self._limited_task(self._safe_task(self._speaker.speak("I'm on it", stop_event_heard))),
-                                self._limited_task(self._safe_task(self._display.updateLCD(heard_message, stop_event=stop_event_heard)))
-                            )
-
-                        response_message = await query_task
-                        
-                        # Calculate time to speak and display
-                        response_task_speak = asyncio.create_task(self._limited_task(self._safe_task(self._speaker.speak(response_message, stop_event_response))))
-                        response_task_lcd = asyncio.create_task(self._limited_task(self._safe_task(self._display.updateLCD(response_message, stop_event=stop_event_response))))
+                        try:
+                            response_message = await query_task
+                        except RouteTimeout as e:
+                            # Say so right away rather than after the rest of "I'm on it"
+                            response_message = str(e)
+                            AssistantApp._cancel_tasks(heard_tasks, stop_event_heard)
+                        except Exception as e:
+                            logger.error(f"An error occurred while processing the command: {e}")
+                            logger.debug(f"An error occurred while processing the command: {traceback.format_exc()}")
+                            response_message = f"An error occurred in the {route.__class__.__name__} module"
+                        await asyncio.gather(*heard_tasks, return_exceptions=True)
+
+                        # speak and display answer
+                        response_tasks = [
+                            asyncio.create_task(self._limited_task(self._safe_task(self._speaker.speak(response_message, stop_event_response)))),
+                            asyncio.create_task(self._limited_task(self._safe_task(self._display.updateLCD(response_message, stop_event=stop_event_response))))
+                        ]
 
                         logger.success(response_message)
-                        await asyncio.gather(response_task_speak, response_task_lcd)
-                        
-                else:
-                    return  # Skip to the next iteration
+                        await asyncio.gather(*response_tasks)
+                    except asyncio.CancelledError:
+                        # Whatever is still being said or shown about the question stops with it
+                        query_task.cancel()
+                        AssistantApp._cancel_tasks(heard_tasks, stop_event_heard)
+                        AssistantApp._cancel_tasks(response_tasks, stop_event_response)
+                        raise
+                    UTTERANCE_DURATION.observe(time.perf_counter() - started)
             else:
+                UTTERANCES.inc(outcome="no_keyword")
                 return  # Skip to the next iteration
-        except sr.UnknownValueError: # TODO move as it's only related to listening
-            pass
-        except sr.RequestError as e:
-            error_message = f"Could not request results; {e}"
-            await self._handle_error(error_message, state_task)
-        except Exception as e:
-            error_message = f"Something Went Wrong: {e}"
-            await self._handle_error(error_message, state_task)
 
     async def _limited_task(self, task):
         async with self._semaphore:
             return await task
 
+    @staticmethod
+    def _cancel_tasks(tasks, stop_event):
+        stop_event.set()
+        for task in tasks:
+            task.cancel()
+
     async def _safe_task(self, task):
         try:
             await task
@@ -243,43 +248,19 @@ class AssistantApp:
         settings = load_settings()
         api_key = settings.get("litellm_api_key")
 
-        logger.info(f"Initialize system with LiteLLM API Key: {api_key}")
+        logger.info(f"Initialize system with LiteLLM API Key: {mask_secret(api_key)}")
 
         if not api_key and self._display._is_available():
             self._display.display_no_api_key()
 
     async def _check_network(self):
-        stop_event_init = asyncio.Event()
-        state_task = asyncio.create_task(self._display.display_state("Connecting", stop_event_init))
-
-        while not AssistantApp._is_network_connected():
-            await asyncio.sleep(10)
-            message = "Network not connected. Retrying in 10 seconds..."
+        # Probes keep running in the background, routes check the state it publishes
+        network_monitor.start()
+        if not await network_monitor.wait_online(timeout=10):
+            message = "Network not connected. Some answers won't be available until it's back."
             logger.error(message)
             await self._speaker.speak(message)
 
-        stop_event_init.set()  # Signal to stop the 'Connecting' display
-        state_task.cancel()  # Cancel the display task
-
-    async def _handle_error(self, message, state_task):
-        if state_task: 
-            state_task.cancel()
-        logger.critical(f"An error occurred: {message}\n{traceback.format_exc()}")
-        message = message[:500]
-        stop_event = asyncio.Event()
-        lcd_task = asyncio.create_task(self._display.updateLCD(message, stop_event=stop_event))
-        speak_task = asyncio.create_task(self._speaker.speak(message, stop_event))
-        await speak_task
-        lcd_task.cancel()
-
-    @staticmethod
-    def _is_network_connected():
-        try:
-            response = requests.get("http://www.google.com", timeout=5)
-            return response.status_code == 200
-        except requests.RequestException:
-            return False
-
 if __name__ == "__main__":
     logger.info("Starting Assistant App")
     AssistantApp().start()
\ No newline at end of file
@@ -1,4 +1,6 @@
 import asyncio
+import time
+import traceback
 import pyttsx3
 import speech_recognition as sr
 from concurrent.futures import ThreadPoolExecutor
@@ -9,6 +11,13 @@ from io import BytesIO
 from pygame import mixer
 
 from config import load_settings, logger
+from metrics import metrics
+from tracing import tracer
+
+STT_DURATION = metrics.histogram("gpt_home_stt_seconds", "Speech-to-text latency.")
+STT_FAILURES = metrics.counter("gpt_home_stt_failures_total", "Phrases speech-to-text couldn't transcribe, by reason.", labels=("reason",))
+TTS_QUEUE_DEPTH = metrics.gauge("gpt_home_tts_queue_depth", "Sentences being spoken or waiting to be.")
+TTS_DURATION = metrics.histogram("gpt_home_tts_seconds", "Time to speak a sentence, by engine.", labels=("engine",))
 
 
 class AudioAssistant:
@@ -19,6 +28,7 @@ class AudioAssistant:
         self.speech_engine.setProperty('alsa_device', 'hw:Headphones,0')
         self._listening_task = None
         self._listening_callback = None
+        self._calibrated = False
 
         self.speak_lock = asyncio.Lock()
         self.executor = ThreadPoolExecutor()
@@ -34,13 +44,22 @@ class AudioAssistant:
     def _recognize_audio(self, recognizer, audio):
         text = None
 
+        # Each phrase starts an utterance trace, the capture ended just now
+        tracer.new_trace()
+        captured_at = time.time()
+        duration = len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+        tracer.record("capture", captured_at - duration, captured_at)
+
         try:
-            logger.debug(f"Audio captured, processing... {audio}")
-            text = self.speech_recognition.recognize_google(audio)
-            logger.debug(f"Audio to text: {text}")
+            with tracer.span("stt", engine="google"), STT_DURATION.time():
+                logger.debug(f"Audio captured, processing... {audio}")
+                text = self.speech_recognition.recognize_google(audio)
+                logger.debug(f"Audio to text: {text}")
         except sr.UnknownValueError:
             logger.info("Could not understand audio, waiting for a new phrase...")
+            STT_FAILURES.inc(reason="unintelligible")
         except Exception as e:
+            STT_FAILURES.inc(reason="unreachable")
             logger.info("The audio to text server couldn't be contacted")
             logger.debug(f"The audio to text server couldn't be contacted: {e}")
             text = "The audio to text server couldn't be contacted"
@@ -48,14 +67,20 @@ class AudioAssistant:
         if text is not None:
             self._listening_callback(text)
 
+    def calibrate(self):
+        """Measures the ambient noise level, blocks for about a second."""
+        with sr.Microphone() as source:
+            logger.debug("adjust ambient noise")
+            self.speech_recognition.adjust_for_ambient_noise(source, duration=1)
+        self._calibrated = True
+
     def start_listening(self, callback):
         self._listening_callback = callback
         logger.debug("start_listening")
 
         if (self._listening_task is None):
-            with sr.Microphone() as source:
-                logger.debug("adjust ambient noise")
-                self.speech_recognition.adjust_for_ambient_noise(source, duration=1)
+            if not self._calibrated:
+                self.calibrate()
 
             logger.debug("start background listening")
             self._listening_task = self.speech_recognition.listen_in_background(sr.Microphone(), self._recognize_audio)
@@ -65,27 +90,56 @@ class AudioAssistant:
             self._listening_task(wait_for_stop=False)
             self._listening_task = None
 
+    def _interrupt(self, speech_engine):
+        try:
+            if speech_engine == 'gtts':
+                mixer.music.stop()
+            else:
+                self.speech_engine.stop()
+        except Exception as e:
+            logger.debug(f"Couldn't interrupt speech: {e}")
+
     async def speak(self, text, stop_event=asyncio.Event()):
         settings = load_settings()
         speech_engine = settings.get("speechEngine", "pyttsx3")
 
+        TTS_QUEUE_DEPTH.inc()
         try:
             async with self.speak_lock:
-                def _speak():
-                    if speech_engine == 'gtts':
-                        mp3_fp = BytesIO()
-                        tts = gTTS(text, lang='en')
-                        tts.write_to_fp(mp3_fp)
-                        mixer.init()
-                        mp3_fp.seek(0)
-                        mixer.music.load(mp3_fp, "mp3")
-                        mixer.music.play()
-                    else:
-                        self.speech_engine.say(text)
-                        self.speech_engine.runAndWait()
-
-                await self.loop.run_in_executor(self.executor, _speak)
+                with tracer.span("tts", engine=speech_engine) as tts_span, TTS_DURATION.time(engine=speech_engine):
+                    # The executor thread doesn't inherit the utterance's context
+                    trace_id = tts_span.trace_id
+
+                    def _speak():
+                        start = time.time()
+                        if speech_engine == 'gtts':
+                            mp3_fp = BytesIO()
+                            tts = gTTS(text, lang='en')
+                            tts.write_to_fp(mp3_fp)
+                            synthesized = time.time()
+                            tracer.record("tts_synthesis", start, synthesized, trace_id=trace_id, parent_id=tts_span.span_id)
+                            mixer.init()
+                            mp3_fp.seek(0)
+                            mixer.music.load(mp3_fp, "mp3")
+                            mixer.music.play()
+                            tracer.record("playback_start", synthesized, time.time(), trace_id=trace_id, parent_id=tts_span.span_id)
+                        else:
+                            # pyttsx3 synthesizes and plays in one blocking call
+                            self.speech_engine.say(text)
+                            self.speech_engine.runAndWait()
+                            tracer.record("tts_speak", start, time.time(), trace_id=trace_id, parent_id=tts_span.span_id)
+
+                    playback = self.loop.run_in_executor(self.executor, _speak)
+                    try:
+                        await asyncio.shield(playback)
+                    except asyncio.CancelledError:
+                        # Cut the phrase short, the next one waits until the thread lets go of the engine
+                        self._interrupt(speech_engine)
+                        await asyncio.wait([playback])
+                        raise
                 stop_event.set()
         except Exception as e:
             logger.error(f"Couldn't TTS: {e}")
-            logger.debug(f"Couldn't TTS: {traceback.format_exc()}")
\ No newline at end of file
+            logger.debug(f"Couldn't TTS: {traceback.format_exc()}")
+        finally:
+            TTS_QUEUE_DEPTH.dec()
\ No newline at end of file
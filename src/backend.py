@@ -1,23 +1,23 @@
-from fastapi.responses import FileResponse, JSONResponse, RedirectResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
+from log_stream import log_broadcaster, log_index, BroadcastHandler, LOG_LEVELS, format_sse
 from config import logger, SOURCE_DIR, log_file_path
+from model_catalog import model_catalog
+from loop_monitor import start_debug_loop_monitor
+from metrics import metrics, load_exported_metrics, monitor_loop_lag
+from tracing import load_exported_spans, stage_stats
+from spotify_control import spotify_session, execute_spotify_command, serve_spotify_ipc, SpotifyUnavailable, InvalidSpotifyCommand
 from fastapi import FastAPI, Request, Response, status
-from spotipy.oauth2 import SpotifyClientCredentials
 from dotenv import load_dotenv, set_key, unset_key
 from fastapi.exceptions import HTTPException
 from fastapi.staticfiles import StaticFiles
 from datetime import datetime, timedelta
 from typing import Optional
-import spotipy.util as util
-from phue import Bridge
 import subprocess
 import traceback
-import requests
-import litellm
 import asyncio
 import spotipy
 import hashlib
 import base64
-import httpx
 import time
 import json
 import os
@@ -25,13 +25,32 @@ import re
 
 ROOT_DIR = SOURCE_DIR.parent
 ENV_FILE_PATH = SOURCE_DIR / "frontend" / ".env"
-TOKEN_PATH = "spotify_token.json"
 LOGS_INITIAL_MAX_LINES = 100
+LOGS_STREAM_KEEPALIVE = 15  # seconds
+
+HTTP_REQUESTS = metrics.counter("gpt_home_backend_requests_total", "Backend HTTP requests, by method, route and status.", labels=("method", "route", "status"))
+HTTP_REQUEST_DURATION = metrics.histogram("gpt_home_backend_request_seconds", "Backend HTTP request latency, by route.", labels=("route",))
 
 load_dotenv(ENV_FILE_PATH)
 
 app = FastAPI()
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # The route's template, so path parameters don't explode the label set
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    HTTP_REQUESTS.inc(method=request.method, route=route, status=response.status_code)
+    HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, route=route)
+    return response
+
+@app.on_event("startup")
+async def start_loop_lag_monitor():
+    asyncio.create_task(monitor_loop_lag(metrics, "backend"))
+    # With GPT_HOME_DEBUG_LOOP set, callbacks blocking the loop are logged with their stack
+    start_debug_loop_monitor("backend")
+
 app.mount("/static", StaticFiles(directory=SOURCE_DIR / "frontend" / "build" / "static"), name="static")
 
 @app.get("/favicon.ico")
@@ -42,6 +61,55 @@ def read_favicon():
 def read_robot():
     return FileResponse(SOURCE_DIR / "frontend" / "build" / "robot.gif")
 
+# Server-sent events, declared before the catch-all below so it isn't shadowed
+@app.get("/logs/stream")
+async def stream_logs(request: Request, level: Optional[str] = "DEBUG"):
+    subscriber = log_broadcaster.subscribe(min_level=parse_log_level(level))
+
+    async def event_stream():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    entry = await subscriber.get(timeout=LOGS_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if subscriber.dropped:
+                    # Prefixed like log lines, the page styles entries by their level
+                    dropped_entry = {"level": "WARNING", "content": f"WARNING: {subscriber.dropped} log entries dropped, client too slow"}
+                    yield format_sse(dropped_entry, event="dropped")
+                    subscriber.dropped = 0
+                yield format_sse(entry)
+        finally:
+            log_broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Latency traces the assistant exported, one span per pipeline stage
+@app.get("/traces")
+async def traces(trace_id: Optional[str] = None, limit: int = 200):
+    spans = load_exported_spans()
+    if trace_id:
+        spans = [span for span in spans if span["trace_id"] == trace_id]
+    return JSONResponse(content={"spans": spans[-limit:]})
+
+@app.get("/traces/stats")
+async def trace_stats():
+    spans = load_exported_spans()
+    return JSONResponse(content={
+        "utterances": len({span["trace_id"] for span in spans if span["name"] == "utterance"}),
+        "stages": stage_stats(spans),
+    })
+
+# Prometheus scrape target: the assistant's latest export followed by the backend's own metrics
+@app.get("/metrics")
+async def read_metrics():
+    return PlainTextResponse(load_exported_metrics() + metrics.render(), media_type="text/plain; version=0.0.4")
+
 ## React App + API Calls ##
 
 # Catch-all route for React and other specific FastAPI routes
@@ -92,55 +160,40 @@ async def toggle_dark_mode(request: Request):
         return JSONResponse(content={"error": str(e), "traceback": traceback.format_exc()}, status_code=500)
 
 ## Event Logs ##
-def tail(file_path, n=100):
+
+@app.on_event("startup")
+async def attach_log_stream():
+    logger.addHandler(BroadcastHandler(log_broadcaster))
+
+def parse_log_level(level):
+    min_level = LOG_LEVELS.get((level or "DEBUG").upper())
+    if min_level is None:
+        raise HTTPException(status_code=400, detail=f"Unknown log level {level}")
+    return min_level
+
+def parse_since(since):
+    """An ISO 8601 date or time, None when not given."""
+    if not since:
+        return None
     try:
-        output = subprocess.check_output(["tail", f"-n{n}", str(file_path)])
-        return output.decode("utf-8").splitlines()
-    except subprocess.CalledProcessError as e:
-        print(f"tail failed: {e}")
-        return []
+        return datetime.fromisoformat(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid since {since}, expected an ISO 8601 date or time")
 
 @app.post("/logs")
-def logs(request: Request):
+def logs(request: Request, level: Optional[str] = None, since: Optional[str] = None):
     if log_file_path.exists() and log_file_path.is_file():
-        last_lines = tail(log_file_path, LOGS_INITIAL_MAX_LINES)
-        cleaned_data = ''.join(last_lines).replace('`', '')
-        return JSONResponse(content={"log_data": cleaned_data})
+        last_entries = log_index.entries(min_level=parse_log_level(level), since=parse_since(since), last=LOGS_INITIAL_MAX_LINES)
+        return JSONResponse(content={"log_data": "\n".join(last_entries)})
     else:
         return Response(status_code=status.HTTP_404_NOT_FOUND, content="Log file not found")
-    
-def is_start_of_new_log(line):
-    return re.match(r"^(INFO|SUCCESS|DEBUG|ERROR|WARNING|CRITICAL):", line)
 
 @app.post("/new-logs")
-def last_logs(request: Request, last_line_number: Optional[int] = 0):
+def last_logs(request: Request, last_line_number: Optional[int] = 0, level: Optional[str] = None, since: Optional[str] = None):
     if log_file_path.exists() and log_file_path.is_file():
-        new_logs = []
-        current_entry = []
-        total_lines = 0
-        with log_file_path.open("r") as f:
-            for line in f:
-                line = line.replace("`", "")
-                if is_start_of_new_log(line):
-                    if current_entry:  # If there's an accumulated entry, add it to new_logs
-                        new_logs.append(''.join(current_entry))
-                        current_entry = []  # Reset for the next entry
-                current_entry.append(line)
-                total_lines += 1
-
-            # Append the last accumulated entry if present
-            if current_entry:
-                new_logs.append(''.join(current_entry))
-
-        # Slice new_logs to only include entries after the last checked line number
-        # Calculate where to start based on entries, not lines
-        if last_line_number < len(new_logs):
-            return JSONResponse(content={
-                "last_logs": new_logs[last_line_number:],
-                "new_last_line_number": len(new_logs)
-            })
-        else:
-            return JSONResponse(content={"last_logs": [], "new_last_line_number": len(new_logs)})
+        # Entries are counted, not lines, so continuation lines stay with their entry
+        new_logs = log_index.entries(start=last_line_number, min_level=parse_log_level(level), since=parse_since(since))
+        return JSONResponse(content={"last_logs": new_logs, "new_last_line_number": len(log_index)})
     else:
         return Response(status_code=status.HTTP_404_NOT_FOUND, content="Log file not found")
 
@@ -200,14 +253,19 @@ async def shutdown(request: Request):
     subprocess.run(["shutdown", "now"])
     return JSONResponse(content={"success": True})
 
+@app.on_event("startup")
+async def start_model_catalog():
+    model_catalog.load()
+    model_catalog.start()
+
+@app.on_event("shutdown")
+async def stop_model_catalog():
+    await model_catalog.stop()
+
 @app.post("/availableModels")
 async def available_models():
     try:
-        response = requests.get("https://raw.githubusercontent.com/BerriAI/litellm/main/model_prices_and_context_window.json")
-        model_list = response.json()
-        supported_models = [model for model in model_list.keys()]
-
-        return JSONResponse(content={"models": supported_models})
+        return JSONResponse(content={"models": model_catalog.models()})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
     
@@ -217,15 +275,7 @@ async def update_model(request: Request):
         incoming_data = await request.json()
         model_id = incoming_data['model_id']
         
-        with open("settings.json", "r") as f:
-            settings = json.load(f)
-            litellm.api_key = settings["litellm_api_key"]
-        
-        response = requests.get("https://raw.githubusercontent.com/BerriAI/litellm/main/model_prices_and_context_window.json")
-        model_list = response.json()
-        supported_models = [model for model in model_list.keys()]
-        
-        if model_id in supported_models:
+        if model_id in model_catalog:
             settings_path = SOURCE_DIR / "settings.json"
             with settings_path.open("r") as f:
                 settings = json.load(f)
@@ -453,8 +503,7 @@ async def disconnect_service(request: Request):
         if name == "spotify":
             unset_key(ENV_FILE_PATH, "SPOTIFY_CLIENT_ID")
             unset_key(ENV_FILE_PATH, "SPOTIFY_CLIENT_SECRET")
-            if os.path.exists(TOKEN_PATH):
-                os.remove(TOKEN_PATH)
+            spotify_session.clear_token()
         elif name == "openweather":
             unset_key(ENV_FILE_PATH, "OPEN_WEATHER_API_KEY")
         elif name == "philipshue":
@@ -496,8 +545,7 @@ async def get_service_statuses(request: Request):
                 is_matching_scheme = False
 
         # Check token expiry for Spotify
-        token_info = get_stored_token()
-        token_is_valid = valid_token(token_info) if token_info else False
+        token_is_valid = spotify_session.is_token_valid()
 
         statuses = {
             "Spotify": "SPOTIFY_CLIENT_ID" in env_config and "SPOTIFY_CLIENT_SECRET" in env_config and token_is_valid,
@@ -531,7 +579,7 @@ async def handle_callback(request: Request):
             if not token_info:
                 return JSONResponse(content={"message": "Failed to get token info"}) 
 
-            store_token(token_info)
+            spotify_session.store_token(token_info)
 
             subprocess.run(["supervisorctl", "restart", "app"])
             
@@ -546,27 +594,26 @@ async def handle_callback(request: Request):
         logger.error(f"Error: {traceback.format_exc()}")
         return RedirectResponse(url=auth_url)
     
-def get_stored_token():
+@app.on_event("startup")
+async def start_spotify_session():
+    spotify_session.start()
+    # Lets the assistant send commands without going through HTTP
     try:
-        with open(TOKEN_PATH, 'r') as f:
-            return json.load(f)
-    except:
-        return None
-
-def store_token(token_info):
-    with open(TOKEN_PATH, 'w') as f:
-        json.dump(token_info, f)
-
-def valid_token(token_info):
-    now = time.time()
-    return token_info and token_info["expires_at"] > now
+        app.state.spotify_ipc_server = await serve_spotify_ipc()
+    except Exception as e:
+        app.state.spotify_ipc_server = None
+        logger.error(f"Failed to start the Spotify IPC socket: {e}")
 
+@app.on_event("shutdown")
+async def stop_spotify_session():
+    if app.state.spotify_ipc_server is not None:
+        app.state.spotify_ipc_server.close()
+    await spotify_session.stop()
 
 @app.post("/spotify-token-exists")
 async def spotify_token_exists(request: Request):
     try:
-        token_info = get_stored_token()
-        token_exists = True if token_info else False
+        token_exists = True if spotify_session.token_info() else False
         return JSONResponse(content={"token_exists": token_exists})
     except Exception as e:
         return JSONResponse(content={"error": str(e), "traceback": traceback.format_exc()})
@@ -599,172 +646,26 @@ async def reauthorize_spotify(request: Request):
 @app.post("/spotify-control")
 async def spotify_control(request: Request):
     try:
-        token_info = get_stored_token()
-
-        if not token_info:
-            return JSONResponse(content={"message": "No token information available. Please reauthorize with Spotify."}) 
-
-        if not valid_token(token_info):
-            # Try to refresh token
-            sp_oauth = spotipy.oauth2.SpotifyOAuth(
-                client_id=os.environ['SPOTIFY_CLIENT_ID'],
-                client_secret=os.environ['SPOTIFY_CLIENT_SECRET'],
-                redirect_uri=os.environ['SPOTIFY_REDIRECT_URI'],
-                scope=os.environ['SPOTIFY_SCOPES'],
-            )
-            token_info = sp_oauth.refresh_access_token(token_info['refresh_token'])
-            store_token(token_info)
-            if not valid_token(token_info):
-                logger.warning("Token expired. Need to reauthorize with Spotify.")
-                return JSONResponse(content={"message": "Token expired. Need to reauthorize Spotify in the web interface."}, status_code=200)
-
-        sp = spotipy.Spotify(auth=token_info['access_token'])
-
         incoming_data = await request.json()
-        text = incoming_data.get("text", "").lower().strip()
-
-        devices = sp.devices()
-        logger.debug(f"Devices: {devices}")
-        device_id = None
-        for device in devices['devices']:
-
-            if "GPT Home" in device['name']:
-                device_id = device['id']
-                break
-
-        if not device_id:
-            # restart spotifyd and try again
-            subprocess.run(["supervisorctl", "stop", "spotifyd"])
-            time.sleep(3)
-            subprocess.run(["supervisorctl", "start", "spotifyd"])
-            time.sleep(3)
-            devices = sp.devices()
-            logger.debug(f"Devices: {devices}")
-            found = False
-            for device in devices['devices']:
-                if "GPT Home" in device['name']:
-                    device_id = device['id']
-                    found = True
-                    break
-
-            if not found:
-                return JSONResponse(content={"message": "GPT Home not found as an available device."}) 
-
-        if "play" in text:
-            song = re.sub(r'^play\s+', '', text)  # Remove "play" at the beginning
-            song = re.sub(r'\s+on\s+spotify$', '', song)  # Remove "on Spotify" at the end
-            song = song.strip()
-            if song:
-                spotify_uris, message = await spotify_get_track_uris(song, sp)
-                sp.start_playback(device_id=device_id, uris=spotify_uris)
-                return JSONResponse(content={"message": message})
-            else:
-                sp.start_playback(device_id=device_id)
-                return JSONResponse(content={"message": "Resumed playback."})
-
-        elif "next" in text or "skip" in text:
-            sp.next_track(device_id=device_id)
-            return JSONResponse(content={"message": "Playing next track."})
-
-        elif "previous" in text or "go back" in text:
-            sp.previous_track(device_id=device_id)
-            return JSONResponse(content={"message": "Playing previous track."})
-
-        elif "pause" in text or "stop" in text:
-            sp.pause_playback(device_id=device_id)
-            return JSONResponse(content={"message": "Paused playback."})
-
-        elif "volume" in text:
-            volume = int(text.split('volume', 1)[1].strip())
-            sp.volume(volume_percent=volume, device_id=device_id)
-            return JSONResponse(content={"message": f"Set volume to {text.split('volume', 1)[1].strip()}."})
-        
-        elif "shuffle" in text:
-            sp.shuffle(state=True, device_id=device_id)
-            return JSONResponse(content={"message": "Shuffled playback."})
-        
-        elif "repeat" in text:
-            sp.repeat(state="track", device_id=device_id)
-            return JSONResponse(content={"message": "Repeating track."})
-
-        else:
-            logger.warning(f"Invalid command: {text}")
-            return JSONResponse(content={"message": "Invalid command."}, status_code=400)
-
+        message = await execute_spotify_command(incoming_data.get("text", ""))
+        return JSONResponse(content={"message": message})
+    except InvalidSpotifyCommand as e:
+        return JSONResponse(content={"message": str(e)}, status_code=400)
+    except SpotifyUnavailable as e:
+        return JSONResponse(content={"message": str(e)})
     except spotipy.exceptions.SpotifyException as e:
-        # If the token has been revoked
-        if e.http_status == 401:
-            # Try to refresh token
-            sp_oauth = spotipy.oauth2.SpotifyOAuth(
-                client_id=os.environ['SPOTIFY_CLIENT_ID'],
-                client_secret=os.environ['SPOTIFY_CLIENT_SECRET'],
-                redirect_uri=os.environ['SPOTIFY_REDIRECT_URI'],
-                scope=os.environ['SPOTIFY_SCOPES'],
-            )
-            token_info = sp_oauth.refresh_access_token(token_info['refresh_token'])
-            store_token(token_info)
-            if not valid_token(token_info):
-                logger.warning("Token expired. Need to reauthorize with Spotify.")
-                return JSONResponse(content={"message": "Token expired. Need to reauthorize Spotify in the web interface."}, status_code=200)
-            else:
-                return await spotify_control(request)
-        else:
-            logger.error(f"Error: {traceback.format_exc()}")
-            return JSONResponse(content={"message": f"Something went wrong: Try to reauthorize Spotify in the web interface."}) 
+        logger.error(f"Error: {traceback.format_exc()}")
+        return JSONResponse(content={"message": f"Something went wrong: Try to reauthorize Spotify in the web interface."}) 
     except Exception as e:
         logger.critical(f"Error: {traceback.format_exc()}")
         return JSONResponse(content={"message": f"Something went wrong: {e}"}) 
 
-async def search_spotify(song: str, search_type: str, limit: int, sp):
-    return sp.search(song, limit=limit, type=search_type)
-
-async def get_podcast_episodes(show_id: str, sp):
-    episodes = sp.show_episodes(show_id)
-    return [episode['uri'] for episode in episodes['items']]
-
-async def get_album_tracks(album_id: str, sp):
-    tracks = sp.album_tracks(album_id)
-    return [track['uri'] for track in tracks['items']]
-
-async def get_artist_top_tracks(artist_id: str, sp):
-    tracks = sp.artist_top_tracks(artist_id)
-    return [track['uri'] for track in tracks['tracks']]
-
-async def get_track_recommendations(track_id: str, sp):
-    recommendations = sp.recommendations(seed_tracks=[track_id])
-    return [track['uri'] for track in recommendations['tracks']]
-
-async def spotify_get_track_uris(song: str, sp, search_types=['album', 'artist', 'track', 'show'], limit=1):
-    for search_type in search_types:
-        result = await search_spotify(song, search_type, limit, sp)
-        
-        if result[search_type+'s']['items']:
-            item_id = result[search_type+'s']['items'][0]['id']
-            item_name = result[search_type+'s']['items'][0]['name']
-
-            if search_type == 'album':
-                message = f"Playing album '{item_name} by {result[search_type+'s']['items'][0]['artists'][0]['name']}'..."
-                return (await get_album_tracks(item_id, sp), message)
-                
-            elif search_type == 'artist':
-                message = f"Playing top tracks based on artist '{item_name}'..."
-                return (await get_artist_top_tracks(item_id, sp), message)
-                
-            elif search_type == 'track':
-                message = f"Playing radio based on track '{item_name}'..."
-                recommended_uris = await get_track_recommendations(item_id, sp)
-                return ([item_id] + recommended_uris, message)
-                
-            elif search_type == 'show':
-                message = f"Playing episodes from the show '{item_name}'..."
-                return (await get_podcast_episodes(item_id, sp), message)
-                
-    return JSONResponse(content={"message": f"No match found for: {song}"}) 
-
 
 ## Philips Hue ##
 
 async def set_philips_hue_username(bridge_ip: str):
+    # Only needed while pairing, not loaded with the backend
+    from phue import Bridge
     try:
         b = Bridge(bridge_ip)
         b.connect()
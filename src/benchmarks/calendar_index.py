@@ -0,0 +1,91 @@
+"""
+Compares calendar queries on the time-indexed event store against scanning
+and expanding every event per question, on a synthetic calendar.
+
+    cd src && python -m benchmarks.calendar_index --events 5000
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from caldav.objects import Event
+
+from calendar_service import CalendarItem
+from event_index import EventIndex
+
+RECURRENCE_RULES = ["FREQ=DAILY", "FREQ=WEEKLY", "FREQ=WEEKLY;BYDAY=MO,WE,FR", "FREQ=MONTHLY"]
+WORDS = ["standup", "dentist", "soccer", "piano", "review", "lunch", "call", "school", "gym", "dinner", "meeting", "yoga"]
+
+
+def synthetic_events(count, recurring_ratio, seed=0):
+    random.seed(seed)
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    items = []
+    for i in range(count):
+        start = now + timedelta(hours=random.randint(-24 * 60, 24 * 300))
+        end = start + timedelta(minutes=random.choice([15, 30, 60, 90]))
+        summary = f"{random.choice(WORDS)} {random.choice(WORDS)} {i}"
+        lines = [
+            "BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//gpt-home//benchmark//EN", "BEGIN:VEVENT",
+            f"UID:benchmark-{i}", f"SUMMARY:{summary}",
+            f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}", f"DTEND:{end.strftime('%Y%m%dT%H%M%S')}",
+        ]
+        if random.random() < recurring_ratio:
+            lines.append(f"RRULE:{random.choice(RECURRENCE_RULES)}")
+        lines += ["END:VEVENT", "END:VCALENDAR", ""]
+        items.append(CalendarItem(Event(client=None, url=f"http://localhost/calendar/{i}.ics", data="\n".join(lines))))
+    return items
+
+
+def scan_events(items, start, end):
+    # What answering a question cost without the index
+    occurrences = [occurrence for item in items for occurrence in item.occurrences(start, end)]
+    occurrences.sort(key=lambda occurrence: occurrence[0])
+    return occurrences
+
+
+def scan_find(items, name):
+    return next((item for item in items if name.lower() in item.summary.lower()), None)
+
+
+def timed(function, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--recurring", type=float, default=0.2, help="Share of recurring events")
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    items = synthetic_events(args.events, args.recurring)
+    start = time.perf_counter()
+    index = EventIndex(items)
+    print(f"{args.events} events, {len(index)} occurrences indexed in {(time.perf_counter() - start) * 1000:.1f} ms\n")
+
+    now = datetime.now()
+    month = now + timedelta(days=30)
+    name = items[-1].summary
+    queries = [
+        ("next event", lambda: scan_events(items, now, month)[:1], lambda: index.next(now)),
+        ("next 30 days", lambda: scan_events(items, now, month), lambda: index.between(now, month)),
+        ("by name", lambda: scan_find(items, name), lambda: index.names.find(name)),
+        ("by name prefix", lambda: scan_find(items, name[:-1]), lambda: index.names.find(name[:-1])),
+    ]
+    print(f"{'query':<16} {'scan (ms)':>12} {'index (ms)':>12} {'speedup':>10}")
+    for label, scan, indexed in queries:
+        scan_ms, _ = timed(scan, args.iterations)
+        index_ms, _ = timed(indexed, args.iterations)
+        print(f"{label:<16} {scan_ms:>12.3f} {index_ms:>12.3f} {scan_ms / max(index_ms, 1e-6):>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Stand-ins for the assistant's hardware: a null audio sink with a fake
+speech recognizer fed from WAV files, a virtual display and a router that
+resolves scripted questions without the encoder model.
+"""
+import asyncio
+import string
+import textwrap
+import time
+import wave
+from pathlib import Path
+
+import speech_recognition as sr
+
+from audio import AudioAssistant
+from routes import routes_dict
+from tracing import tracer
+
+SAMPLE_RATE = 16000
+SECONDS_PER_WORD = 0.35  # Length of the synthetic recordings
+
+
+def write_wav(path, seconds, sample_rate=SAMPLE_RATE):
+    """A silent mono 16-bit recording, enough to exercise the capture path."""
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(b"\x00\x00" * int(seconds * sample_rate))
+
+
+def synthetic_recordings(directory, phrases):
+    """One WAV per phrase with its transcript next to it, as `load_recordings` expects."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for i, phrase in enumerate(phrases):
+        write_wav(directory / f"{i:03d}.wav", SECONDS_PER_WORD * len(phrase.split()))
+        (directory / f"{i:03d}.txt").write_text(phrase)
+    return directory
+
+
+def load_recordings(directory):
+    """[(AudioData, transcript)] for each <name>.wav with a <name>.txt transcript."""
+    recordings = []
+    for wav_path in sorted(Path(directory).glob("*.wav")):
+        transcript_path = wav_path.with_suffix(".txt")
+        if not transcript_path.exists():
+            continue
+        with sr.AudioFile(str(wav_path)) as source:
+            audio = sr.Recognizer().record(source)
+        recordings.append((audio, transcript_path.read_text().strip()))
+    return recordings
+
+
+class FakeRecognizer:
+    """
+    Answers recognize_google with the recording's transcript after a fixed
+    latency, and remembers the trace each recording started.
+    """
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.transcripts = {}
+        self.traces = {}
+
+    def expect(self, audio, transcript):
+        self.transcripts[id(audio)] = transcript
+
+    def recognize_google(self, audio):
+        self.traces[id(audio)] = tracer.current_trace()
+        time.sleep(self.latency)
+        transcript = self.transcripts.pop(id(audio), None)
+        if transcript is None:
+            raise sr.UnknownValueError()
+        return transcript
+
+
+class NullAudio(AudioAssistant):
+    """
+    AudioAssistant without a microphone or speaker. Recognition goes through
+    the real `_recognize_audio` with a FakeRecognizer; speech is recorded
+    and takes `tts_latency` seconds, one sentence at a time like the real one.
+    """
+    def __init__(self, tts_latency=0.0, stt_latency=0.0):
+        self._listening_task = None
+        self._listening_callback = None
+        self.speak_lock = asyncio.Lock()
+        self.speech_recognition = FakeRecognizer(stt_latency)
+        self.tts_latency = tts_latency
+        self.spoken = []
+
+    def start_listening(self, callback):
+        self._listening_callback = callback
+
+    def stop_listening(self):
+        self._listening_callback = None
+
+    async def hear(self, audio, transcript):
+        """Feeds a recording to the listener callback as the background listener would, returns its trace id."""
+        self.speech_recognition.expect(audio, transcript)
+        await asyncio.to_thread(self._recognize_audio, None, audio)
+        return self.speech_recognition.traces.pop(id(audio), None)
+
+    async def speak(self, text, stop_event=None):
+        async with self.speak_lock:
+            with tracer.span("tts", engine="null"):
+                await asyncio.sleep(self.tts_latency)
+                self.spoken.append(text)
+        if stop_event is not None:
+            stop_event.set()
+
+
+class VirtualDisplay:
+    """Keeps the pages the LCD would show instead of drawing them."""
+    def __init__(self):
+        self.pages = []
+
+    def is_available(self):
+        return True
+
+    _is_available = is_available
+
+    async def updateLCD(self, text, stop_event=None):
+        with tracer.span("lcd", characters=len(text)):
+            lines = textwrap.fill(text, 21).split("\n")
+            self.pages.extend("\n".join(lines[i:i + 2]) for i in range(0, len(lines), 2))
+
+    async def display_state(self, state, stop_event):
+        self.pages.append(state)
+
+    def display_no_api_key(self):
+        self.pages.append("No API key")
+
+
+class ScriptedRouter:
+    """Resolves each benchmark question to the route it was written for."""
+    def __init__(self, scenarios):
+        self.routes_dict = routes_dict
+        self._routes = {ScriptedRouter.normalize(text): route for route, text in scenarios}
+
+    @staticmethod
+    def normalize(text):
+        # As the app hands questions over, lowercased and without punctuation
+        return text.lower().translate(str.maketrans('', '', string.punctuation)).strip()
+
+    def isReady(self):
+        return True
+
+    def resolveRoute(self, text):
+        with tracer.span("route_resolve") as span:
+            route = self._routes.get(ScriptedRouter.normalize(text), "GeneralRoute")
+            span.attributes["route"] = route
+            return self.routes_dict[route]
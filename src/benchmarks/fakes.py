@@ -0,0 +1,369 @@
+"""
+Local stand-ins for every upstream service the assistant talks to, served
+by one aiohttp app on a background thread:
+
+- an OpenAI-compatible chat completions endpoint for litellm, with a
+  configurable latency,
+- OpenWeather (One Call and geocoding), Open-Meteo, Nominatim and ipinfo,
+- a Philips Hue bridge,
+- a CalDAV server with one calendar of events and todos, supporting
+  sync-collection reports.
+
+`FakeUpstreams.environment()` gives the variables that point the assistant
+at them.
+"""
+import asyncio
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from xml.sax.saxutils import escape
+
+from aiohttp import web
+
+HUE_USERNAME = "benchmark"
+CALDAV_USERNAME = "benchmark"
+CALDAV_PASSWORD = "benchmark"
+HOME_CITY = "Springfield"
+HOME_COORDS = {"lat": 39.7817, "lon": -89.6501}
+
+HUE_GROUPS = {"1": ("Living room", ["1", "2", "3"]), "2": ("Kitchen", ["4", "5"]), "3": ("Bedroom", ["6", "7"])}
+HUE_LIGHTS = {"1": "Sofa lamp", "2": "Ceiling", "3": "Reading light", "4": "Counter", "5": "Island", "6": "Nightstand", "7": "Dresser"}
+
+CALENDAR_WORDS = ["review", "lunch", "call", "school", "gym", "dinner", "meeting", "yoga", "piano", "soccer"]
+DAV_NS = {"d": "DAV:", "c": "urn:ietf:params:xml:ns:caldav", "cs": "http://calendarserver.org/ns/"}
+SYNC_TOKEN_PATTERN = re.compile(rb"<(?:\w+:)?sync-token[^>]*>([^<]*)</(?:\w+:)?sync-token>")
+
+
+def _ics(uid, component, summary, start=None, duration=timedelta(hours=1), rrule=None, status=None):
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//gpt-home//benchmark//EN", f"BEGIN:{component}", f"UID:{uid}", f"SUMMARY:{summary}"]
+    if start is not None:
+        lines += [f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}", f"DTEND:{(start + duration).strftime('%Y%m%dT%H%M%S')}"]
+    if rrule:
+        lines.append(f"RRULE:{rrule}")
+    if status:
+        lines.append(f"STATUS:{status}")
+    lines += [f"END:{component}", "END:VCALENDAR", ""]
+    return "\r\n".join(lines)
+
+
+def calendar_objects(event_count, seed=0):
+    """A calendar with a few known events and todos plus random filler events."""
+    random.seed(seed)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    objects = {
+        "standup": _ics("standup", "VEVENT", "Standup", today + timedelta(hours=9), timedelta(minutes=15), rrule="FREQ=DAILY"),
+        "dentist": _ics("dentist", "VEVENT", "Dentist", today + timedelta(days=2, hours=14)),
+        "soccer": _ics("soccer", "VEVENT", "Soccer practice", today + timedelta(days=1, hours=17), rrule="FREQ=WEEKLY"),
+        "milk": _ics("milk", "VTODO", "Buy milk", status="NEEDS-ACTION"),
+        "mom": _ics("mom", "VTODO", "Call mom", status="NEEDS-ACTION"),
+        "rent": _ics("rent", "VTODO", "Pay rent", status="COMPLETED"),
+    }
+    for i in range(event_count):
+        start = today + timedelta(hours=random.randint(-24 * 30, 24 * 180))
+        summary = f"{random.choice(CALENDAR_WORDS).capitalize()} {random.choice(CALENDAR_WORDS)} {i}"
+        rrule = "FREQ=WEEKLY" if random.random() < 0.1 else None
+        objects[f"event-{i}"] = _ics(f"event-{i}", "VEVENT", summary, start, timedelta(minutes=random.choice([30, 60, 90])), rrule=rrule)
+    return objects
+
+
+class FakeCalDAV:
+    """
+    One principal with one calendar. Every change bumps the calendar's
+    version, which is both its ctag and its sync token.
+    """
+    def __init__(self, prefix, event_count):
+        self.principal = f"{prefix}/principal/"
+        self.home = f"{prefix}/calendars/"
+        self.calendar = f"{self.home}home/"
+        self.objects = calendar_objects(event_count)
+        self.version = 1
+        self.deleted = {}  # href -> version it was deleted in
+
+    def _href(self, uid):
+        return f"{self.calendar}{uid}.ics"
+
+    @staticmethod
+    def _etag(data):
+        return f'"{hashlib.md5(data.encode()).hexdigest()}"'
+
+    def _properties(self, href):
+        if href == self.calendar:
+            return {
+                "d:resourcetype": "<d:collection/><c:calendar/>",
+                "d:displayname": "Home",
+                "cs:getctag": str(self.version),
+                "d:sync-token": str(self.version),
+                "c:supported-calendar-component-set": '<c:comp name="VEVENT"/><c:comp name="VTODO"/>',
+            }
+        properties = {
+            "d:resourcetype": "<d:collection/>",
+            "d:current-user-principal": f"<d:href>{self.principal}</d:href>",
+            "c:calendar-home-set": f"<d:href>{self.home}</d:href>",
+        }
+        if href == self.principal:
+            properties["d:resourcetype"] = "<d:principal/>"
+        return properties
+
+    @staticmethod
+    def _multistatus(responses, sync_token=None):
+        namespaces = " ".join(f'xmlns:{prefix}="{uri}"' for prefix, uri in DAV_NS.items())
+        body = "".join(responses)
+        token = f"<d:sync-token>{sync_token}</d:sync-token>" if sync_token is not None else ""
+        text = f'<?xml version="1.0" encoding="utf-8"?><d:multistatus {namespaces}>{body}{token}</d:multistatus>'
+        return web.Response(status=207, text=text, content_type="application/xml")
+
+    @staticmethod
+    def _response(href, properties=None, status=None):
+        if status is not None:
+            return f"<d:response><d:href>{href}</d:href><d:status>HTTP/1.1 {status}</d:status></d:response>"
+        props = "".join(f"<{name}>{value}</{name}>" for name, value in properties.items())
+        return f"<d:response><d:href>{href}</d:href><d:propstat><d:prop>{props}</d:prop><d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>"
+
+    def _object_response(self, uid, with_data):
+        data = self.objects[uid]
+        properties = {"d:getetag": escape(self._etag(data))}
+        if with_data:
+            properties["c:calendar-data"] = escape(data)
+        return self._response(self._href(uid), properties)
+
+    async def handle(self, request):
+        path = request.path
+        if request.method == "PROPFIND":
+            # Collections are listed with their children, the calendar lists its objects
+            hrefs = [path]
+            if request.headers.get("Depth", "0") == "1":
+                if path == self.home:
+                    hrefs.append(self.calendar)
+                elif path == self.calendar:
+                    return self._multistatus(
+                        [self._response(path, self._properties(path))] + [self._object_response(uid, False) for uid in self.objects]
+                    )
+            return self._multistatus([self._response(href, self._properties(href)) for href in hrefs])
+
+        if request.method == "REPORT":
+            body = await request.read()
+            if b"sync-collection" in body:
+                match = SYNC_TOKEN_PATTERN.search(body)
+                token = match.group(1).decode().strip() if match else ""
+                since = int(token) if token.isdigit() else 0
+                if since == self.version:
+                    return self._multistatus([], sync_token=self.version)
+                responses = [self._object_response(uid, False) for uid in self.objects]
+                responses += [self._response(href, status="404 Not Found") for href, version in self.deleted.items() if version > since]
+                return self._multistatus(responses, sync_token=self.version)
+            component = "VTODO" if b"VTODO" in body else "VEVENT"
+            return self._multistatus([
+                self._object_response(uid, True) for uid, data in self.objects.items() if f"BEGIN:{component}" in data
+            ])
+
+        uid = path[len(self.calendar):].removesuffix(".ics") if path.startswith(self.calendar) else None
+        if request.method == "GET":
+            if uid not in self.objects:
+                raise web.HTTPNotFound()
+            data = self.objects[uid]
+            return web.Response(text=data, content_type="text/calendar", headers={"ETag": self._etag(data)})
+        if request.method == "PUT" and uid:
+            created = uid not in self.objects
+            self.objects[uid] = (await request.read()).decode()
+            self.deleted.pop(self._href(uid), None)
+            self.version += 1
+            return web.Response(status=201 if created else 204, headers={"ETag": self._etag(self.objects[uid])})
+        if request.method == "DELETE" and uid in self.objects:
+            del self.objects[uid]
+            self.version += 1
+            self.deleted[self._href(uid)] = self.version
+            return web.Response(status=204)
+        if request.method == "OPTIONS":
+            return web.Response(headers={"DAV": "1, 2, 3, calendar-access", "Allow": "OPTIONS, GET, PUT, DELETE, PROPFIND, REPORT"})
+        raise web.HTTPNotFound()
+
+
+class FakeUpstreams:
+    def __init__(self, llm_latency=0.8, llm_jitter=0.2, api_latency=0.05, calendar_events=200, host="127.0.0.1", port=0):
+        self.llm_latency = llm_latency
+        self.llm_jitter = llm_jitter
+        self.api_latency = api_latency
+        self.host = host
+        self.port = port
+        self.requests = Counter()  # Requests served, by service
+        self.caldav = FakeCalDAV("/caldav", calendar_events)
+        self.hue = {
+            "lights": {
+                light_id: {"name": name, "state": {"on": False, "bri": 254, "colormode": "ct", "ct": 300, "reachable": True}}
+                for light_id, name in HUE_LIGHTS.items()
+            },
+            "groups": {
+                group_id: {"name": name, "lights": lights, "type": "Room", "action": {"on": False}, "state": {"any_on": False, "all_on": False}}
+                for group_id, (name, lights) in HUE_GROUPS.items()
+            },
+            "scenes": {},
+        }
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._started = threading.Event()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def environment(self, openweather=False):
+        """Variables pointing the assistant at the stand-ins. OpenWeather is used only when asked for."""
+        environment = {
+            "OPENAI_API_BASE": f"{self.url}/v1",
+            "OPENAI_API_KEY": "benchmark",
+            "OPENWEATHER_URL": f"{self.url}/openweather",
+            "OPEN_METEO_URL": f"{self.url}/open-meteo",
+            "NOMINATIM_URL": f"{self.url}/nominatim",
+            "IPINFO_URL": f"{self.url}/ipinfo",
+            "PHILIPS_HUE_BRIDGE_IP": f"{self.host}:{self.port}",
+            "PHILIPS_HUE_USERNAME": HUE_USERNAME,
+            "CALDAV_URL": f"{self.url}/caldav/",
+            "CALDAV_USERNAME": CALDAV_USERNAME,
+            "CALDAV_PASSWORD": CALDAV_PASSWORD,
+        }
+        if openweather:
+            environment["OPEN_WEATHER_API_KEY"] = "benchmark"
+        return environment
+
+    ## Lifecycle ##
+
+    def start(self):
+        """Serves on a thread of its own so the stand-ins don't compete with the assistant's event loop."""
+        self._thread = threading.Thread(target=self._serve, name="fake-upstreams", daemon=True)
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def _serve(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._runner = web.AppRunner(self._app(), access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, self.host, self.port)
+        self._loop.run_until_complete(site.start())
+        self.port = self._runner.addresses[0][1]
+        self._started.set()
+        self._loop.run_forever()
+
+    def _app(self):
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_get("/openweather/data/3.0/onecall", self.openweather_onecall)
+        app.router.add_get("/openweather/geo/1.0/direct", self.openweather_direct)
+        app.router.add_get("/openweather/geo/1.0/zip", self.openweather_zip)
+        app.router.add_get("/open-meteo/v1/forecast", self.open_meteo_forecast)
+        app.router.add_get("/nominatim/search", self.nominatim_search)
+        app.router.add_get("/ipinfo/json", self.ipinfo)
+        app.router.add_get("/api/{username}", self.hue_state)
+        app.router.add_put("/api/{username}/groups/{group_id}/action", self.hue_group_action)
+        app.router.add_put("/api/{username}/lights/{light_id}/state", self.hue_light_state)
+        app.router.add_route("*", "/caldav/{path:.*}", self.caldav_request)
+        return app
+
+    async def _delay(self, service, latency):
+        self.requests[service] += 1
+        if latency:
+            await asyncio.sleep(latency)
+
+    ## LLM ##
+
+    async def chat_completions(self, request):
+        body = await request.json()
+        await self._delay("llm", max(0.0, random.gauss(self.llm_latency, self.llm_jitter)))
+        question = body["messages"][-1]["content"]
+        answer = f"This is a benchmark answer to: {question[:60]}"
+        prompt_tokens = sum(len(message["content"].split()) for message in body["messages"])
+        return web.json_response({
+            "id": f"chatcmpl-{self.requests['llm']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "benchmark"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(answer.split()), "total_tokens": prompt_tokens + len(answer.split())},
+        })
+
+    ## Weather and geocoding ##
+
+    async def openweather_onecall(self, request):
+        await self._delay("openweather", self.api_latency)
+        now = int(time.time())
+        return web.json_response({
+            "timezone_offset": 0,
+            "current": {"dt": now, "sunrise": now - 6 * 3600, "sunset": now + 6 * 3600, "temp": 68.4, "weather": [{"id": 803, "main": "Clouds"}]},
+            "daily": [
+                {"dt": now + day * 86400, "temp": {"min": 55 + day, "max": 72 + day}, "weather": [{"main": "Rain" if day % 3 == 1 else "Clear"}], "pop": 0.6 if day % 3 == 1 else 0.1}
+                for day in range(8)
+            ],
+        })
+
+    async def openweather_direct(self, request):
+        await self._delay("openweather", self.api_latency)
+        return web.json_response([HOME_COORDS])
+
+    async def openweather_zip(self, request):
+        await self._delay("openweather", self.api_latency)
+        return web.json_response({"name": HOME_CITY, **HOME_COORDS})
+
+    async def open_meteo_forecast(self, request):
+        await self._delay("open-meteo", self.api_latency)
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        if request.query.get("current_weather") == "true":
+            return web.json_response({
+                "current_weather": {"temperature": 68.4, "weathercode": 3, "is_day": 1},
+                "daily": {"sunrise": [int((today + timedelta(hours=6)).timestamp())], "sunset": [int((today + timedelta(hours=19)).timestamp())]},
+            })
+        days = [today + timedelta(days=day) for day in range(7)]
+        return web.json_response({"daily": {
+            "time": [day.strftime("%Y-%m-%d") for day in days],
+            "weathercode": [61 if i % 3 == 1 else 1 for i in range(7)],
+            "temperature_2m_max": [72 + i for i in range(7)],
+            "temperature_2m_min": [55 + i for i in range(7)],
+            "precipitation_probability_max": [60 if i % 3 == 1 else 10 for i in range(7)],
+        }})
+
+    async def nominatim_search(self, request):
+        await self._delay("nominatim", self.api_latency)
+        return web.json_response([{"lat": str(HOME_COORDS["lat"]), "lon": str(HOME_COORDS["lon"]), "display_name": request.query.get("q")}])
+
+    async def ipinfo(self, request):
+        await self._delay("ipinfo", self.api_latency)
+        return web.json_response({"city": HOME_CITY, "region": "Illinois", "country": "US"})
+
+    ## Hue bridge ##
+
+    async def hue_state(self, request):
+        await self._delay("hue", self.api_latency)
+        return web.json_response(self.hue)
+
+    async def hue_group_action(self, request):
+        await self._delay("hue", self.api_latency)
+        state = await request.json()
+        group_id = request.match_info["group_id"]
+        light_ids = list(self.hue["lights"]) if group_id == "0" else self.hue["groups"].get(group_id, {}).get("lights", [])
+        for light_id in light_ids:
+            self.hue["lights"][light_id]["state"].update({key: value for key, value in state.items() if not key.endswith("_inc")})
+        return web.json_response([{"success": {f"/groups/{group_id}/action/{key}": value}} for key, value in state.items()])
+
+    async def hue_light_state(self, request):
+        await self._delay("hue", self.api_latency)
+        state = await request.json()
+        light_id = request.match_info["light_id"]
+        self.hue["lights"].get(light_id, {}).setdefault("state", {}).update({key: value for key, value in state.items() if not key.endswith("_inc")})
+        return web.json_response([{"success": {f"/lights/{light_id}/state/{key}": value}} for key, value in state.items()])
+
+    ## CalDAV ##
+
+    async def caldav_request(self, request):
+        await self._delay("caldav", self.api_latency)
+        return await self.caldav.handle(request)
@@ -0,0 +1,112 @@
+"""
+Profiles what the assistant and the backend import at startup. Each module
+is imported in a fresh interpreter with `python -X importtime`, the report
+shows the import's wall time, the slowest imports and the time spent per
+top-level package:
+
+    cd src && python -m benchmarks.import_time
+    cd src && python -m benchmarks.import_time app --routes --top 25
+
+Route modules are loaded on first use or in the background after boot,
+--routes profiles each of them on its own. Like the pipeline benchmark,
+--json and --baseline track the results over time.
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+SOURCE_DIR = Path(__file__).resolve().parent.parent
+IMPORT_SCRIPT = "import time; start = time.perf_counter(); import {module}; print(f'WALL {{time.perf_counter() - start}}')"
+
+
+def profile(module):
+    """Imports `module` in a fresh interpreter, returns its wall time and [(name, depth, self_us, cumulative_us)]."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_SCRIPT.format(module=module)],
+        cwd=SOURCE_DIR, capture_output=True, text=True
+    )
+    wall = next((float(line.split()[1]) for line in result.stdout.splitlines() if line.startswith("WALL ")), None)
+    if result.returncode != 0 or wall is None:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return wall, imports
+
+
+def summarize(module, repeat, top):
+    # The fastest run, the others paid for a cold disk cache
+    wall, imports = min((profile(module) for _ in range(repeat)), key=lambda run: run[0])
+    packages = {}
+    for name, _, self_us, _ in imports:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    # Only the imports the module pulls in directly or through the project's own modules
+    slowest = sorted(((name, cumulative_us) for name, depth, _, cumulative_us in imports if depth <= 2), key=lambda i: -i[1])
+    return {
+        "wall_ms": wall * 1000,
+        "modules": len(imports),
+        "slowest_ms": {name: cumulative_us / 1000 for name, cumulative_us in slowest[:top]},
+        "packages_ms": {package: self_us / 1000 for package, self_us in sorted(packages.items(), key=lambda p: -p[1])[:top]},
+    }
+
+
+def print_report(report):
+    for module, result in report.items():
+        print(f"\n{module}: {result['wall_ms']:.0f} ms, {result['modules']} modules")
+        print(f"  {'slowest imports (cumulative)':<48} {'ms':>8}    {'packages (self)':<24} {'ms':>8}")
+        slowest = list(result["slowest_ms"].items())
+        packages = list(result["packages_ms"].items())
+        for i in range(max(len(slowest), len(packages))):
+            left = f"{slowest[i][0]:<48} {slowest[i][1]:>8.1f}" if i < len(slowest) else " " * 57
+            right = f"{packages[i][0]:<24} {packages[i][1]:>8.1f}" if i < len(packages) else ""
+            print(f"  {left}    {right}")
+
+
+def compare(report, baseline, tolerance):
+    """Modules whose import got slower by more than `tolerance` against the baseline."""
+    regressions = []
+    for module, result in report.items():
+        previous = baseline.get("modules", {}).get(module)
+        if previous and result["wall_ms"] > previous["wall_ms"] * (1 + tolerance):
+            regressions.append(f"{module}: {previous['wall_ms']:.0f} ms -> {result['wall_ms']:.0f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=["app", "backend"], help="Modules to import")
+    parser.add_argument("--routes", action="store_true", help="Also profile each route module")
+    parser.add_argument("--top", type=int, default=15, help="Imports and packages to list")
+    parser.add_argument("--repeat", type=int, default=3, help="Imports per module, the fastest is kept")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Fail when an import got slower than in this earlier --json output")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    modules = list(args.modules)
+    if args.routes:
+        from routes import ROUTES
+        modules += [f"routes.{spec.module}" for spec in ROUTES]
+
+    report = {module: summarize(module, args.repeat, args.top) for module in modules}
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps({"args": vars(args), "modules": report}, indent=2))
+    if args.baseline:
+        regressions = compare(report, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
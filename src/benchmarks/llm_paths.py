@@ -0,0 +1,112 @@
+"""
+Compares how fast general questions are answered by the LLM provider and by
+the local model the assistant falls back to offline. Both go through
+GeneralRoute with the model settings from settings.json:
+
+    cd src && python -m benchmarks.llm_paths --iterations 5
+
+The local model is the llama.cpp-compatible server set with
+"local_llm_api_base" in settings.json, or --local-api-base. With --fake
+both paths are served by local stand-ins with the given latencies, to check
+the benchmark itself without a provider or a local server.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fakes import FakeUpstreams
+from benchmarks.pipeline import summarize
+
+SOURCE_DIR = Path(__file__).resolve().parent.parent
+QUESTIONS = [
+    "Tell me a joke",
+    "What is the largest mammal?",
+    "What is the capital of France?",
+    "How many legs does a spider have?",
+    "Give me a synonym for happy",
+]
+PATHS = ["remote", "local"]
+
+
+async def run_path(path, questions, iterations):
+    """Latencies of the answers, and how many came from the path rather than an error message."""
+    from routes import routes_dict
+    from routes.general import LLM_ANSWERS
+    route = routes_dict["GeneralRoute"].load()
+    latencies = []
+    answered_before = LLM_ANSWERS.value(path=path) or 0
+    for _ in range(iterations):
+        for question in questions:
+            start = time.perf_counter()
+            await route().run(question)
+            latencies.append(time.perf_counter() - start)
+    return latencies, (LLM_ANSWERS.value(path=path) or 0) - answered_before
+
+
+def print_report(report):
+    print(f"\n{'path':<8} {'n':>4} {'answered':>8} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for path, result in report.items():
+        print(
+            f"{path:<8} {result['count']:>4} {result['answered']:>8} {result['mean_ms']:>9.1f} "
+            f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['max_ms']:>9.1f}"
+        )
+    if len(report) == 2 and report["remote"]["answered"] and report["local"]["answered"]:
+        print(f"\nLocal p50 is {report['local']['p50_ms'] / report['remote']['p50_ms']:.2f}x the remote p50")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=3, help="Passes over the questions, per path")
+    parser.add_argument("--paths", nargs="*", choices=PATHS, default=PATHS)
+    parser.add_argument("--local-api-base", help="The local server, instead of local_llm_api_base from settings.json")
+    parser.add_argument("--local-model", help="The local model, instead of local_llm_model from settings.json")
+    parser.add_argument("--fake", action="store_true", help="Serve both paths from local stand-ins")
+    parser.add_argument("--remote-latency", type=float, default=0.8, help="With --fake, seconds per provider completion")
+    parser.add_argument("--local-latency", type=float, default=1.5, help="With --fake, seconds per local completion")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    with open(os.getenv("GPT_HOME_SETTINGS", SOURCE_DIR / "settings.json"), "r") as f:
+        settings = json.load(f)
+    upstreams = []
+    if args.fake:
+        remote, local = FakeUpstreams(args.remote_latency, 0.1).start(), FakeUpstreams(args.local_latency, 0.1).start()
+        upstreams = [remote, local]
+        os.environ.update({"OPENAI_API_BASE": f"{remote.url}/v1", "OPENAI_API_KEY": "benchmark"})
+        settings.update({"model": "gpt-4o-mini", "litellm_api_key": "benchmark", "local_llm_api_base": f"{local.url}/v1"})
+    if args.local_api_base:
+        settings["local_llm_api_base"] = args.local_api_base
+    if args.local_model:
+        settings["local_llm_model"] = args.local_model
+    if "local" in args.paths and not settings.get("local_llm_api_base"):
+        raise SystemExit("No local model: set local_llm_api_base in settings.json or pass --local-api-base")
+
+    report = {}
+    with tempfile.TemporaryDirectory(prefix="gpt-home-benchmark-") as work_dir:
+        # Settings are read on each question, each path rewrites them
+        settings_path = Path(work_dir) / "settings.json"
+        settings_path.write_text(json.dumps(settings))
+        os.environ["GPT_HOME_SETTINGS"] = str(settings_path)
+        try:
+            for path in args.paths:
+                settings_path.write_text(json.dumps({**settings, "llm_mode": path}))
+                latencies, answered = asyncio.run(run_path(path, QUESTIONS, args.iterations))
+                report[path] = {**summarize(latencies), "answered": answered}
+        finally:
+            for upstream in upstreams:
+                upstream.stop()
+
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps({"args": vars(args), "paths": report}, indent=2))
+    if any(result["answered"] < result["count"] for result in report.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
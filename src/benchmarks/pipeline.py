@@ -0,0 +1,296 @@
+"""
+End-to-end benchmark of the assistant, offline. Questions go through
+AssistantApp._process_text (or, with --audio, through the speech front end
+from WAV recordings) against local stand-ins for the LLM, the weather and
+geocoding APIs, CalDAV and the Hue bridge, with a null audio sink and a
+virtual display.
+
+Each route is run in its own phase and reported with its throughput, its
+latency distribution and the median of each pipeline stage:
+
+    cd src && python -m benchmarks.pipeline --iterations 5 --concurrency 2
+
+Startup is reported too: importing the app, building the router and
+loading the route modules in the background warmup. So are the callbacks
+that held the event loop longer than --loop-threshold, by where they
+blocked, as with GPT_HOME_DEBUG_LOOP on the assistant.
+
+For CI, save a run with --json and compare later runs against it:
+
+    python -m benchmarks.pipeline --json baseline.json
+    python -m benchmarks.pipeline --baseline baseline.json --tolerance 0.25
+
+A place blocking the loop that the baseline didn't have is a regression,
+--fail-on-stalls fails on any.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fakes import FakeUpstreams
+
+KEYWORD = "computer"
+# (route, question), alarms and Spotify are left out: they need crontab and a Spotify account
+SCENARIOS = [
+    ("WeatherRoute", "What's the temperature?"),
+    ("WeatherRoute", "Is it going to rain tomorrow?"),
+    ("WeatherRoute", "What's the weather forecast for the week?"),
+    ("WeatherRoute", "Should I wear a jacket today?"),
+    ("CalendarRoute", "What's my next event?"),
+    ("CalendarRoute", "What's on my calendar?"),
+    ("CalendarRoute", "What is left to do today?"),
+    ("LightsRoute", "Turn on the kitchen lights"),
+    ("LightsRoute", "Set the living room to blue at 40%"),
+    ("LightsRoute", "Are the lights on?"),
+    ("GeneralRoute", "Tell me a joke"),
+    ("GeneralRoute", "What is the largest mammal?"),
+]
+STAGES = ["route_resolve", "handler", "http", "llm", "tts", "lcd"]
+
+
+def benchmark_settings(args):
+    return {
+        "keyword": KEYWORD,
+        "model": "gpt-4o-mini",
+        "max_tokens": 100,
+        "temperature": 0.7,
+        "custom_instructions": "",
+        "sayHeard": args.say_heard,
+        "litellm_api_key": "benchmark",
+        "calendar_mode": "first",
+    }
+
+
+def summarize(latencies):
+    # Imported on use, config reads GPT_HOME_SETTINGS when first imported
+    from tracing import percentile
+    return {
+        "count": len(latencies),
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+
+
+class PipelineBenchmark:
+    def __init__(self, args, app, tracer, recordings=None):
+        self.args = args
+        self.app = app
+        self.tracer = tracer
+        self.recordings = recordings or {}
+
+    async def _utterance(self, text):
+        """Processes one question, returns its latency and spans."""
+        spoken = f"{KEYWORD} {text}"
+        start = time.perf_counter()
+        if self.args.audio:
+            trace_id = await self.app._speaker.hear(self.recordings[text], spoken)
+        else:
+            trace_id = self.tracer.new_trace()
+            await self.app._process_text(spoken)
+        latency = time.perf_counter() - start
+        # Collected right away, long runs outgrow the tracer's ring buffer
+        return latency, self.tracer.spans(trace_id)
+
+    async def run_phase(self, questions):
+        queue = asyncio.Queue()
+        for question in questions:
+            queue.put_nowait(question)
+        results = []
+
+        async def worker():
+            while not queue.empty():
+                results.append(await self._utterance(queue.get_nowait()))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+        return results, time.perf_counter() - start
+
+    @staticmethod
+    def _stages(spans):
+        durations = {}
+        for span in spans:
+            durations.setdefault(span.name, []).append(span.duration)
+        return {stage: statistics.median(values) * 1000 for stage, values in durations.items()}
+
+    @staticmethod
+    def _misroutes(route, spans):
+        return sum(1 for span in spans if span.name == "route_resolve" and span.attributes.get("route") != route)
+
+    async def run(self):
+        report = {}
+        routes = [route for route in dict.fromkeys(route for route, _ in SCENARIOS) if not self.args.routes or route in self.args.routes]
+        for route in routes:
+            questions = [text for name, text in SCENARIOS if name == route]
+            if self.args.warmup:
+                await self.run_phase(questions)  # Connections, caches and mirrors as after boot
+            results, elapsed = await self.run_phase(questions * self.args.iterations)
+            spans = [span for _, utterance_spans in results for span in utterance_spans]
+            report[route] = {
+                **summarize([latency for latency, _ in results]),
+                "throughput_per_s": len(results) / elapsed,
+                "misrouted": PipelineBenchmark._misroutes(route, spans),
+                "stages_p50_ms": PipelineBenchmark._stages(spans),
+            }
+        return report
+
+
+def print_report(report, startup, stalls, upstream_requests):
+    print("\nStartup (ms): " + ", ".join(f"{stage.removesuffix('_ms')} {value:.0f}" for stage, value in startup.items()))
+    if stalls:
+        print("\nEvent loop held by")
+        for location, stall in stalls.items():
+            print(f"  {location}: {stall['count']}x, max {stall['max_ms']:.0f} ms")
+    print(f"\n{'route':<14} {'n':>4} {'req/s':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'misrouted':>9}")
+    for route, result in report.items():
+        print(
+            f"{route:<14} {result['count']:>4} {result['throughput_per_s']:>7.2f} {result['p50_ms']:>9.1f} "
+            f"{result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['max_ms']:>9.1f} {result['misrouted']:>9}"
+        )
+    print(f"\nMedian per stage (ms)\n{'route':<14} " + " ".join(f"{stage:>13}" for stage in STAGES))
+    for route, result in report.items():
+        stages = result["stages_p50_ms"]
+        print(f"{route:<14} " + " ".join(f"{stages[stage]:>13.1f}" if stage in stages else f"{'-':>13}" for stage in STAGES))
+    print(f"\nUpstream requests: {dict(upstream_requests)}")
+
+
+def compare(report, startup, stalls, baseline, tolerance):
+    """
+    Routes whose p95 latency, or startup stages, regressed by more than
+    `tolerance` against the baseline, and new places blocking the loop.
+    """
+    regressions = []
+    for location, stall in stalls.items():
+        if location not in baseline.get("loop_stalls", {}):
+            regressions.append(f"event loop held at {location}: {stall['count']}x, max {stall['max_ms']:.0f} ms")
+    for stage, value in startup.items():
+        previous = baseline.get("startup", {}).get(stage)
+        if previous and value > previous * (1 + tolerance):
+            regressions.append(f"startup {stage.removesuffix('_ms')}: {previous:.0f} ms -> {value:.0f} ms")
+    for route, result in report.items():
+        previous = baseline.get("routes", {}).get(route)
+        if previous and result["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{route}: p95 {previous['p95_ms']:.1f} ms -> {result['p95_ms']:.1f} ms")
+    return regressions
+
+
+async def run(args, work_dir):
+    # Imported once the environment points at the stand-ins, routes read it at import
+    start = time.perf_counter()
+    from app import AssistantApp
+    startup = {"import_ms": (time.perf_counter() - start) * 1000}
+    from benchmarks.devices import NullAudio, ScriptedRouter, VirtualDisplay, load_recordings, synthetic_recordings
+    from cache import PersistentCache
+    from calendar_service import calendar_service
+    from http_session import close_session
+    from hue import hue_bridge
+    from loop_monitor import BlockingDetector
+    from tracing import tracer
+    import routes.weather as weather
+
+    tracer.export_path = work_dir / "traces.json"
+    # Geocoding results are cached on disk, keep the benchmark's out of the real cache
+    weather.geocode_cache = PersistentCache(work_dir / "geocode_cache.json", ttl=weather.GEOCODE_CACHE_TTL)
+
+    detector = BlockingDetector("assistant", threshold=args.loop_threshold / 1000).start()
+    app = AssistantApp()
+    app._event_loop = asyncio.get_running_loop()
+    app._speaker = NullAudio(tts_latency=args.tts_latency, stt_latency=args.stt_latency)
+    app._speaker.start_listening(app._on_heard_sentence)
+    app._display = VirtualDisplay()
+    start = time.perf_counter()
+    if args.router == "semantic":
+        from router import AssistantRouter
+        app._router = AssistantRouter("all-MiniLM-L6-v2")
+    else:
+        app._router = ScriptedRouter(SCENARIOS)
+    startup["router_ms"] = (time.perf_counter() - start) * 1000
+
+    recordings = None
+    if args.audio:
+        directory = Path(args.audio) if args.audio != "synthetic" else synthetic_recordings(work_dir / "recordings", [text for _, text in SCENARIOS])
+        loaded = load_recordings(directory)
+        # Recordings are matched to the scenarios by their transcript
+        recordings = {transcript.removeprefix(f"{KEYWORD} "): audio for audio, transcript in loaded}
+        missing = [text for _, text in SCENARIOS if text not in recordings]
+        if missing:
+            raise SystemExit(f"No recording for: {', '.join(missing)}")
+
+    try:
+        if args.warmup:
+            start = time.perf_counter()
+            await app._warmup_routes()
+            startup["warmup_ms"] = (time.perf_counter() - start) * 1000
+        report = await PipelineBenchmark(args, app, tracer, recordings).run()
+        return report, startup, detector.summary()
+    finally:
+        detector.stop()
+        await hue_bridge.stop()
+        await calendar_service.stop()
+        if weather.WeatherRoute._prefetch_task is not None:
+            weather.WeatherRoute._prefetch_task.cancel()
+        await close_session()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=3, help="Passes over each route's questions")
+    parser.add_argument("--concurrency", type=int, default=1, help="Questions in flight at once")
+    parser.add_argument("--routes", nargs="*", help="Only benchmark these routes")
+    parser.add_argument("--router", choices=["scripted", "semantic"], default="scripted",
+                        help="scripted resolves each question to its route, semantic loads the encoder model")
+    parser.add_argument("--audio", nargs="?", const="synthetic",
+                        help="Go through the speech front end, from synthetic WAVs or a directory of <name>.wav + <name>.txt")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds per LLM completion")
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--api-latency", type=float, default=0.05, help="Seconds per weather, CalDAV or Hue request")
+    parser.add_argument("--stt-latency", type=float, default=0.3)
+    parser.add_argument("--tts-latency", type=float, default=0.0)
+    parser.add_argument("--calendar-events", type=int, default=200)
+    parser.add_argument("--openweather", action="store_true", help="Use OpenWeather instead of Open-Meteo")
+    parser.add_argument("--say-heard", action="store_true", help="Say \"I'm on it\" before answering, as the default settings do")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false", help="Measure cold caches and connections")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Fail when a route's p95 or startup regressed against this earlier --json output")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--loop-threshold", type=float, default=50, help="Milliseconds a callback may hold the event loop before it's reported")
+    parser.add_argument("--fail-on-stalls", action="store_true", help="Fail when any callback held the event loop past --loop-threshold")
+    args = parser.parse_args()
+
+    upstreams = FakeUpstreams(args.llm_latency, args.llm_jitter, args.api_latency, args.calendar_events).start()
+    with tempfile.TemporaryDirectory(prefix="gpt-home-benchmark-") as work_dir:
+        work_dir = Path(work_dir)
+        settings_path = work_dir / "settings.json"
+        settings_path.write_text(json.dumps(benchmark_settings(args)))
+        os.environ.update(upstreams.environment(openweather=args.openweather))
+        os.environ["GPT_HOME_SETTINGS"] = str(settings_path)
+        try:
+            report, startup, stalls = asyncio.run(run(args, work_dir))
+        finally:
+            upstreams.stop()
+
+    print_report(report, startup, stalls, upstreams.requests)
+    if args.json:
+        Path(args.json).write_text(json.dumps({"args": vars(args), "startup": startup, "routes": report, "loop_stalls": stalls}, indent=2))
+    if args.baseline:
+        regressions = compare(report, startup, stalls, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+    if args.fail_on_stalls and stalls:
+        for location, stall in stalls.items():
+            print(f"STALL {location}: {stall['count']}x, max {stall['max_ms']:.0f} ms\n{stall['stack']}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Compares weather answer latency with the templates against always asking
+the LLM.
+
+The weather data is seeded in the caches so only the answering step is
+measured. The LLM calls go to the model configured in settings.json.
+
+    cd src && python -m benchmarks.weather_answers --iterations 5
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import routes.weather as weather_route
+from cache import PersistentCache
+from config import load_settings
+from routes.weather import WeatherRoute
+
+QUESTIONS = [
+    "what is the temperature",
+    "how's the weather today?",
+    "is it raining right now",
+    "is it going to rain",
+    "will it rain tomorrow",
+    "what is the weather tomorrow",
+    "what is the forecast for the week",
+    "should I wear a jacket today",
+]
+CITY = "Springfield"
+COORDS = {"lat": 39.78, "lon": -89.65}
+
+
+def seed_caches(cache_dir):
+    weather_route.geocode_cache = PersistentCache(Path(cache_dir) / "geocode_cache.json", ttl=weather_route.GEOCODE_CACHE_TTL)
+    weather_route.geocode_cache.set(f"city:{CITY.lower()}", COORDS)
+    WeatherRoute._home_city = CITY
+    WeatherRoute._home_zip_code = load_settings().get('default_zip_code')
+
+    now = time.time()
+    key = (round(COORDS["lat"], 2), round(COORDS["lon"], 2), "imperial")
+    weather_route.weather_cache[key + ("current",)] = {
+        "source": "benchmark",
+        "temp": 68.4,
+        "description": "Partly Cloudy",
+        "precipitation": False,
+        "raw": {"temp": 68.4, "weathercode": 2},
+        "fetched_at": now,
+    }
+    days = []
+    for offset, (low, high, description, chance) in enumerate([
+        (55, 70, "Partly Cloudy", 10), (52, 64, "Rain", 80), (50, 66, "Cloudy", 30),
+        (58, 75, "Sunny", 0), (60, 77, "Sunny", 5), (57, 69, "Showers", 60), (54, 67, "Cloudy", 20),
+    ]):
+        date = datetime.now() + timedelta(days=offset)
+        days.append({
+            "date": date.strftime("%Y-%m-%d"),
+            "weekday": date.strftime("%A"),
+            "temp_min": low,
+            "temp_max": high,
+            "description": description,
+            "precipitation_chance": chance,
+        })
+    weather_route.weather_cache[key + ("daily",)] = {"source": "benchmark", "days": days, "fetched_at": now}
+
+
+async def run(iterations):
+    route = WeatherRoute()
+    results = {}
+    for mode, always_use_llm in (("templates", False), ("always LLM", True)):
+        for question in QUESTIONS:
+            timings = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                answer = await route.handle(question, always_use_llm=always_use_llm)
+                timings.append(time.perf_counter() - start)
+            results[(mode, question)] = (timings, answer)
+
+    print(f"{'question':<36} {'templates (ms)':>16} {'always LLM (ms)':>16}  intent")
+    totals = {"templates": [], "always LLM": []}
+    for question in QUESTIONS:
+        row = []
+        for mode in ("templates", "always LLM"):
+            timings = results[(mode, question)][0]
+            totals[mode].extend(timings)
+            row.append(statistics.median(timings) * 1000)
+        print(f"{question:<36} {row[0]:>16.1f} {row[1]:>16.1f}  {WeatherRoute.classify(question) or 'LLM'}")
+    print(f"{'median over all questions':<36} {statistics.median(totals['templates']) * 1000:>16.1f} {statistics.median(totals['always LLM']) * 1000:>16.1f}")
+
+    print("\nAnswers with templates:")
+    for question in QUESTIONS:
+        print(f"  {question}: {results[('templates', question)][1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=3)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        seed_caches(cache_dir)
+        asyncio.run(run(args.iterations))
+
+
+if __name__ == "__main__":
+    main()
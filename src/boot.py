@@ -0,0 +1,113 @@
+import asyncio
+import time
+import traceback
+
+from config import logger
+from metrics import metrics
+
+BOOT_STAGE_DURATION = metrics.gauge("gpt_home_boot_stage_seconds", "Time each boot stage took, from its start once its dependencies were ready.", labels=("stage",))
+BOOT_STAGE_FAILURES = metrics.counter("gpt_home_boot_stage_failures_total", "Boot stages that failed.", labels=("stage",))
+BOOT_READY_DURATION = metrics.gauge("gpt_home_boot_ready_seconds", "Time from boot until the required stages were ready.")
+
+
+class BootStage:
+    def __init__(self, name, run, after=(), required=True):
+        self.name = name
+        self.run = run
+        self.after = tuple(after)
+        self.required = required
+        self.task = None
+        self.duration = None
+        self.error = None
+
+    @property
+    def done(self):
+        return self.duration is not None
+
+
+class BootOrchestrator:
+    """
+    Runs the assistant's boot stages concurrently, each one as soon as the
+    stages it depends on are ready.
+
+    `run` returns once the required stages are ready, so the assistant can
+    start listening while optional ones (prewarming route connections)
+    carry on in the background. Progress is reported through `on_progress`
+    and each stage's duration is logged and exported as a metric.
+    """
+    def __init__(self, on_progress=None):
+        self._stages = {}
+        self._on_progress = on_progress
+        self._started_at = None
+        self._ready = False
+
+    def add(self, name, run, after=(), required=True):
+        """`run` is a coroutine function, started once the `after` stages succeeded."""
+        unknown = [dependency for dependency in after if dependency not in self._stages]
+        if unknown:
+            raise ValueError(f"Boot stage {name} depends on unknown stages: {', '.join(unknown)}")
+        self._stages[name] = BootStage(name, run, after, required)
+
+    def timings(self):
+        """Seconds each finished stage took."""
+        return {stage.name: stage.duration for stage in self._stages.values() if stage.done}
+
+    async def run(self):
+        """Starts every stage, returns once the required ones are ready. Raises the first required stage's error."""
+        self._started_at = time.perf_counter()
+        for stage in self._stages.values():
+            stage.task = asyncio.create_task(self._run_stage(stage))
+        self._report_progress()
+
+        required = [stage for stage in self._stages.values() if stage.required]
+        await asyncio.gather(*(stage.task for stage in required))
+        failed = [stage for stage in required if stage.error is not None]
+        if failed:
+            self.cancel()
+            raise RuntimeError(f"Boot stage {failed[0].name} failed: {failed[0].error}") from failed[0].error
+
+        self._ready = True
+        ready = time.perf_counter() - self._started_at
+        BOOT_READY_DURATION.set(ready)
+        logger.success(f"Ready in {ready * 1000:.0f} ms: " + ", ".join(f"{name} {duration * 1000:.0f} ms" for name, duration in self.timings().items()))
+        return self.timings()
+
+    def cancel(self):
+        for stage in self._stages.values():
+            if stage.task is not None and not stage.task.done():
+                stage.task.cancel()
+
+    async def _run_stage(self, stage):
+        for name in stage.after:
+            dependency = self._stages[name]
+            await asyncio.shield(dependency.task)
+            if dependency.error is not None:
+                stage.error = RuntimeError(f"{name} failed")
+                logger.warning(f"Skipping boot stage {stage.name}, {name} failed")
+                return
+
+        logger.info(f"Boot stage {stage.name} started")
+        start = time.perf_counter()
+        try:
+            await stage.run()
+        except Exception as e:
+            stage.error = e
+            BOOT_STAGE_FAILURES.inc(stage=stage.name)
+            logger.error(f"Boot stage {stage.name} failed: {e}")
+            logger.debug(f"Boot stage {stage.name} failed: {traceback.format_exc()}")
+            return
+        stage.duration = time.perf_counter() - start
+        BOOT_STAGE_DURATION.set(stage.duration, stage=stage.name)
+        logger.info(f"Boot stage {stage.name} ready in {stage.duration * 1000:.0f} ms")
+        self._report_progress()
+
+    def _report_progress(self):
+        # Optional stages finish after boot, the display has moved on by then
+        if self._on_progress is None or self._ready:
+            return
+        required = [stage for stage in self._stages.values() if stage.required]
+        pending = [stage.name for stage in required if not stage.done]
+        try:
+            self._on_progress(len(required) - len(pending), len(required), pending)
+        except Exception as e:
+            logger.debug(f"Failed to report boot progress: {e}")
@@ -0,0 +1,56 @@
+import json
+import os
+import threading
+import time
+import traceback
+
+from config import logger
+
+
+class PersistentCache:
+    """
+    Small key/value cache kept in memory and mirrored to a JSON file so it
+    survives restarts. Each entry expires after its own TTL.
+    """
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, "r") as f:
+                    self._entries = json.load(f)
+            except FileNotFoundError:
+                self._entries = {}
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable cache {self.path}: {e}")
+                self._entries = {}
+
+    def get(self, key, default=None):
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is None or entry["expires_at"] < time.time():
+                return default
+            return entry["value"]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._load()
+            now = time.time()
+            self._entries = {k: e for k, e in self._entries.items() if e["expires_at"] >= now}
+            self._entries[key] = {"value": value, "expires_at": now + (ttl or self.ttl)}
+            self._save()
+
+    def _save(self):
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Failed to save cache {self.path}: {e}")
+            logger.debug(f"Failed to save cache {self.path}: {traceback.format_exc()}")
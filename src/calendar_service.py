@@ -0,0 +1,394 @@
+import asyncio
+import heapq
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from operator import itemgetter
+
+import caldav
+from caldav.elements.base import BaseElement
+from caldav.lib import error
+
+from config import logger, load_settings
+from event_index import EventIndex, NameIndex, INDEX_PAST
+
+CALENDAR_SYNC_INTERVAL = 5 * 60
+CALENDAR_SYNC_RETRY = 60
+CALENDAR_REQUEST_TIMEOUT = 10
+CALENDAR_SYNC_TIMEOUT = 15  # A slow calendar is left out of the answer rather than delaying it
+CALENDAR_MAX_WORKERS = 4
+
+
+class GetCTag(BaseElement):
+    tag = "{http://calendarserver.org/ns/}getctag"
+
+
+class CalendarUnavailable(Exception):
+    """Raised with a message meant for the user when the calendar can't be reached."""
+
+
+def to_local(value):
+    """Dates and aware datetimes from the server as naive local datetimes."""
+    if not isinstance(value, datetime):
+        return datetime.combine(value, datetime.min.time())
+    if value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
+class CalendarItem:
+    """
+    An event or a todo from the mirror, parsed once when it's synced. The
+    caldav object is kept to save or delete it on the server.
+
+    Moved or renamed instances of a recurring event (RECURRENCE-ID) are
+    kept as overrides of the master event.
+    """
+    def __init__(self, resource, component=None):
+        self.resource = resource
+        self.url = str(resource.url)
+        self.overrides = []
+        if component is None:
+            instance = resource.vobject_instance
+            if hasattr(instance, 'vevent'):
+                components = instance.vevent_list
+                component = next((c for c in components if not hasattr(c, 'recurrence_id')), components[0])
+                self.overrides = [CalendarItem(resource, c) for c in components if hasattr(c, 'recurrence_id')]
+            elif hasattr(instance, 'vtodo'):
+                component = instance.vtodo
+        self.component = component
+        self.kind = {"VEVENT": "event", "VTODO": "todo"}.get(component.name) if component is not None else None
+        if self.kind is None:
+            return
+
+        self.summary = component.summary.value if hasattr(component, 'summary') else ""
+        self.status = component.status.value if hasattr(component, 'status') else None
+        self.start = to_local(component.dtstart.value) if hasattr(component, 'dtstart') else None
+        if hasattr(component, 'dtend'):
+            self.end = to_local(component.dtend.value)
+        elif hasattr(component, 'duration') and self.start is not None:
+            self.end = self.start + component.duration.value
+        else:
+            self.end = self.start
+        self.recurrence_id = to_local(component.recurrence_id.value) if hasattr(component, 'recurrence_id') else None
+        self.recurring = self.recurrence_id is None and (hasattr(component, 'rrule') or hasattr(component, 'rdate'))
+
+    def occurrences(self, start, end):
+        """(start, item) for each occurrence between start and end, recurrences and overrides included."""
+        occurrences = [
+            occurrence for override in self.overrides for occurrence in override.occurrences(start, end)
+        ]
+        if self.start is None:
+            return occurrences
+        if not self.recurring:
+            if start <= self.start < end:
+                occurrences.append((self.start, self))
+            return occurrences
+
+        raw_start = self.component.dtstart.value
+        aware = isinstance(raw_start, datetime) and raw_start.tzinfo is not None
+        ruleset = self.component.getrruleset(addRDate=True)
+        after, before = (start.astimezone(), end.astimezone()) if aware else (start, end)
+        overridden = {override.recurrence_id for override in self.overrides}
+        for occurrence in ruleset.between(after, before, inc=True):
+            occurrence = to_local(occurrence)
+            if occurrence < end and occurrence not in overridden:
+                occurrences.append((occurrence, self))
+        return occurrences
+
+
+class CalendarMirror:
+    """
+    Local copy of one calendar's events and todos. It's kept up to date with
+    WebDAV sync-collection reports, so a sync only downloads what changed.
+    Servers without sync tokens fall back to a full reload whenever the
+    calendar's ctag changes.
+    """
+    def __init__(self, calendar):
+        self.calendar = calendar
+        self.name = getattr(calendar, 'name', None) or str(calendar.url)
+        self.items = {}
+        self.synced_at = 0
+        self.index = None
+        self.todo_names = None
+        self._indexed_items = None
+        self._collection = None
+        self._sync_tokens = True
+        self._ctag = None
+        self._lock = threading.Lock()
+
+    def sync(self):
+        # A sync that outlived its timeout may still be running, don't start another one
+        if not self._lock.acquire(blocking=False):
+            logger.debug(f"Calendar {self.name} is still syncing")
+            return
+        try:
+            self._sync()
+            self.synced_at = time.time()
+            self._update_index()
+        finally:
+            self._lock.release()
+
+    def _sync(self):
+        if self._sync_tokens:
+            try:
+                self._sync_collection()
+                return
+            except error.DAVError as e:
+                logger.info(f"Calendar {self.name} doesn't support sync tokens, falling back to ctag checks: {e}")
+                self._sync_tokens = False
+                self._collection = None
+
+        ctag = self._get_ctag()
+        if ctag is None or ctag != self._ctag:
+            resources = self.calendar.search(event=True) + self.calendar.todos(include_completed=True)
+            self.items = self._parse(resources)
+            self._ctag = ctag
+            logger.debug(f"Reloaded calendar {self.name}, {len(self.items)} items")
+
+    def _sync_collection(self):
+        if self._collection is None:
+            self._collection = self.calendar.objects(load_objects=True)
+            self.items = self._parse(self._collection)
+            logger.debug(f"Loaded calendar {self.name}, {len(self.items)} items")
+            return
+
+        updated, deleted = self._collection.sync()
+        if not updated and not deleted:
+            return
+        # Readers keep using the previous dict until the new one is swapped in
+        items = dict(self.items)
+        for resource in deleted:
+            items.pop(str(resource.url), None)
+        items.update(self._parse(updated))
+        self.items = items
+        logger.debug(f"Synced calendar {self.name}: {len(updated)} updated, {len(deleted)} deleted")
+
+    def _update_index(self):
+        # Rebuilt in the sync thread when the mirror changed, and daily so
+        # the expanded recurrences keep moving forward
+        if self.items is self._indexed_items and self.index.start >= datetime.now() - 2 * INDEX_PAST:
+            return
+        items = list(self.items.values())
+        self.index = EventIndex([item for item in items if item.kind == "event"])
+        self.todo_names = NameIndex([item for item in items if item.kind == "todo"])
+        self._indexed_items = self.items
+        logger.debug(f"Indexed {len(self.index)} event occurrences from {self.name}")
+
+    def _get_ctag(self):
+        try:
+            return self.calendar.get_property(GetCTag())
+        except error.DAVError:
+            return None
+
+    @staticmethod
+    def _parse(resources):
+        items = {}
+        for resource in resources:
+            if resource.data is None:
+                continue
+            try:
+                item = CalendarItem(resource)
+            except Exception as e:
+                logger.warning(f"Skipping unreadable calendar item {resource.url}: {e}")
+                continue
+            if item.kind is not None:
+                items[item.url] = item
+        return items
+
+    ## Reads ##
+
+    def events(self, start, end):
+        if self.index.covers(start, end):
+            return self.index.between(start, end)
+        occurrences = [
+            occurrence for item in self.items.values() if item.kind == "event"
+            for occurrence in item.occurrences(start, end)
+        ]
+        occurrences.sort(key=itemgetter(0))
+        return occurrences
+
+    def todos(self):
+        return [item for item in self.items.values() if item.kind == "todo"]
+
+    def find(self, kind, name):
+        return (self.index.names if kind == "event" else self.todo_names).find(name)
+
+
+class CalendarService:
+    """
+    One authenticated CalDAV client for the process, with a local mirror
+    of each calendar that's synced in the background. Questions are answered
+    from the mirrors; changes are sent to the server and then synced back.
+
+    By default only the first calendar is used. With the `calendar_mode`
+    setting set to "all", every calendar is mirrored, synced concurrently
+    and answers merge them by start time.
+    """
+    def __init__(self, sync_interval=CALENDAR_SYNC_INTERVAL):
+        self.sync_interval = sync_interval
+        self._client = None
+        self._credentials = None
+        self._mode = None
+        self._mirrors = []
+        self._executor = None
+        self._sync_lock = threading.Lock()
+        self._sync_task = None
+
+    @staticmethod
+    def credentials():
+        url = os.getenv('CALDAV_URL')
+        username = os.getenv('CALDAV_USERNAME')
+        password = os.getenv('CALDAV_PASSWORD')
+        if not url or not username or not password:
+            raise CalendarUnavailable("CalDAV server credentials are not properly set in environment variables.")
+        return url, username, password
+
+    @staticmethod
+    def mode():
+        return "all" if load_settings().get("calendar_mode") == "all" else "first"
+
+    def _connect(self):
+        credentials = self.credentials()
+        mode = self.mode()
+        if self._client is None or credentials != self._credentials:
+            url, username, password = credentials
+            self._client = caldav.DAVClient(url, username=username, password=password, timeout=CALENDAR_REQUEST_TIMEOUT)
+            self._credentials = credentials
+            self._mirrors = []
+        if not self._mirrors or mode != self._mode:
+            calendars = self._client.principal().calendars()
+            if not calendars:
+                raise CalendarUnavailable("No calendars found.")
+            if mode == "first":
+                calendars = calendars[:1]  # Use the first found calendar
+            # Keep the mirrors we already have when switching modes
+            mirrors = {str(mirror.calendar.url): mirror for mirror in self._mirrors}
+            self._mirrors = [mirrors.get(str(calendar.url)) or CalendarMirror(calendar) for calendar in calendars]
+            self._mode = mode
+        return self._mirrors
+
+    def sync(self):
+        with self._sync_lock:
+            mirrors = self._connect()
+            if len(mirrors) == 1:
+                mirrors[0].sync()
+                return
+
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=CALENDAR_MAX_WORKERS, thread_name_prefix="caldav")
+            futures = {self._executor.submit(mirror.sync): mirror for mirror in mirrors}
+            done, pending = wait(futures, timeout=CALENDAR_SYNC_TIMEOUT)
+            for future in pending:
+                logger.warning(f"Calendar {futures[future].name} didn't sync within {CALENDAR_SYNC_TIMEOUT}s, answering without its latest changes")
+            failures = [future for future in done if future.exception() is not None]
+            for future in failures:
+                logger.warning(f"Failed to sync calendar {futures[future].name}: {future.exception()}")
+            if failures and len(failures) == len(futures):
+                raise failures[0].exception()
+
+    def ensure_synced(self):
+        """Syncs now only if no mirror was ever loaded, otherwise serves them as they are."""
+        if self.credentials() != self._credentials or self.mode() != self._mode or not self._ready():
+            self.sync()
+
+    def _ready(self):
+        return [mirror for mirror in self._mirrors if mirror.index is not None]
+
+    def start(self):
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self):
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            try:
+                await self._sync_task
+            except asyncio.CancelledError:
+                pass
+
+    async def _sync_loop(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.sync)
+                delay = self.sync_interval
+            except CalendarUnavailable as e:
+                logger.debug(f"Calendar not synced: {e}")
+                delay = self.sync_interval
+            except Exception as e:
+                logger.warning(f"Failed to sync the calendar: {e}")
+                logger.debug(f"Failed to sync the calendar: {traceback.format_exc()}")
+                delay = CALENDAR_SYNC_RETRY
+            await asyncio.sleep(delay)
+
+    ## Reads, from the mirrors ##
+
+    def events(self, start, end):
+        """(start, item) for every occurrence between start and end, sorted by start."""
+        # Each mirror is already sorted, a k-way merge keeps the result sorted
+        return list(heapq.merge(*(mirror.events(start, end) for mirror in self._ready()), key=itemgetter(0)))
+
+    def next_event(self, now=None):
+        now = datetime.now() if now is None else now
+        candidates = [mirror.index.next(now) for mirror in self._ready()]
+        return min((candidate for candidate in candidates if candidate is not None), key=itemgetter(0), default=None)
+
+    def todos(self, completed=False):
+        return [
+            item for mirror in self._ready() for item in mirror.todos()
+            if (item.status == "COMPLETED") == completed
+        ]
+
+    def find(self, kind, name):
+        for mirror in self._ready():
+            item = mirror.find(kind, name)
+            if item is not None:
+                return item
+        return None
+
+    ## Writes, to the server then synced back ##
+
+    def _first_calendar(self):
+        # New events and todos go to the first calendar. _connect can replace
+        # the client and mirrors, not while a sync is going through them
+        with self._sync_lock:
+            return self._connect()[0].calendar
+
+    def add_event(self, summary, start, duration=timedelta(hours=1)):
+        calendar = self._first_calendar()
+        calendar.save_event(dtstart=start, dtend=start + duration, summary=summary)
+        self.sync()
+
+    def add_todo(self, summary):
+        calendar = self._first_calendar()
+        calendar.save_todo(summary=summary, status="NEEDS-ACTION")
+        self.sync()
+
+    def update(self, item, summary=None, start=None, duration=timedelta(hours=1)):
+        # The resource saves the mirrored component itself, so the edit is
+        # made in place and undone if the server doesn't take it
+        component = item.component
+        previous = {name: getattr(component, name).value for name in ("summary", "dtstart", "dtend") if hasattr(component, name)}
+        if summary is not None:
+            component.summary.value = summary
+        if start is not None:
+            component.dtstart.value = start
+            if hasattr(component, 'dtend'):
+                component.dtend.value = start + duration
+        try:
+            item.resource.save()
+        except Exception:
+            for name, value in previous.items():
+                getattr(component, name).value = value
+            raise
+        self.sync()
+
+    def delete(self, item):
+        item.resource.delete()
+        self.sync()
+
+
+calendar_service = CalendarService()
@@ -1,12 +1,25 @@
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from dotenv import load_dotenv
+from datetime import datetime
 from pathlib import Path
-import litellm
+from queue import Queue
 import logging
+import atexit
 import json
+import sys
+import os
+import re
 
 
 SOURCE_DIR = Path(__file__).parent
+# Overridable so benchmarks can run against their own settings
+SETTINGS_PATH = Path(os.getenv("GPT_HOME_SETTINGS", SOURCE_DIR / "settings.json"))
 log_file_path = SOURCE_DIR / "events.log"
+json_log_file_path = SOURCE_DIR / "events.jsonl"
+LOG_FORMAT = '%(levelname)s:[%(asctime)s]: %(message)s'
+LOG_MAX_BYTES = 2 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+PROCESS_NAME = Path(sys.argv[0]).stem or "python"
 
 # Load .env file
 load_dotenv(dotenv_path='frontend/.env')
@@ -21,22 +34,154 @@ def success(self, message, *args, **kws):
 
 logging.Logger.success = success
 
-logging.basicConfig(
-    filename=log_file_path,
-    level=logging.DEBUG,
-    format='%(levelname)s:[%(asctime)s]: %(message)s'
-)
-logger = logging.getLogger(__name__)
 
+## Logging pipeline ##
+# Records are only put on a queue by the calling thread, a listener thread
+# does the formatting and file I/O so logging never blocks the event loop.
 
-# Initialize the LiteLLM API key
-with open("settings.json", "r") as f:
-    settings = json.load(f)
-    litellm.api_key = settings["litellm_api_key"]
+SECRET_PATTERNS = [
+    re.compile(r"\b(sk-[A-Za-z0-9_\-]{4})[A-Za-z0-9_\-]{8,}"),
+    re.compile(r"((?:api[_\-]?key|access_token|refresh_token|client_secret|password|secret)[\"']?\s*[:=]\s*[\"']?)[^\s\"',}]+", re.IGNORECASE),
+]
+SECRET_ENV_PATTERN = re.compile(r"(KEY|SECRET|PASSWORD|TOKEN)")
+
+def mask_secret(value):
+    if not value:
+        return "<not set>"
+    return f"{value[:4]}...{value[-2:]}" if len(value) > 12 else "***"
+
+class RedactingFilter(logging.Filter):
+    """
+    Masks API keys, tokens and passwords, whether they are known values from
+    settings.json and the environment or look like `api_key=...`.
+    """
+    def __init__(self, secrets=()):
+        super().__init__()
+        # Short values would mask too many unrelated words
+        self.secrets = sorted({s for s in secrets if s and len(s) >= 8}, key=len, reverse=True)
+
+    def redact(self, text):
+        for secret in self.secrets:
+            text = text.replace(secret, mask_secret(secret))
+        for pattern in SECRET_PATTERNS:
+            text = pattern.sub(r"\1***", text)
+        return text
+
+    def filter(self, record):
+        message = record.getMessage()
+        redacted = self.redact(message)
+        if redacted != message:
+            record.msg, record.args = redacted, None
+        if record.exc_info:
+            record.exc_text = self.redact(logging.Formatter().formatException(record.exc_info))
+            record.exc_info = None
+        return True
+
+class ModuleLevelFilter(logging.Filter):
+    """
+    Every module logs through the same `config` logger, so per-module levels
+    are matched on the source module name, e.g. {"weather": "WARNING"}.
+    """
+    def __init__(self, levels):
+        super().__init__()
+        self.levels, self.invalid = {}, {}
+        for module, level in levels.items():
+            parsed = ModuleLevelFilter.parse_level(level)
+            if parsed is None:
+                self.invalid[module] = level  # Warned about once the logger is set up
+            else:
+                self.levels[module] = parsed
+
+    @staticmethod
+    def parse_level(level):
+        """A level name ("warning") or number (30), None for anything else."""
+        if isinstance(level, int) and not isinstance(level, bool):
+            return level
+        if isinstance(level, str):
+            return logging._nameToLevel.get(level.strip().upper())
+        return None
+
+    def filter(self, record):
+        level = self.levels.get(record.module)
+        return level is None or record.levelno >= level
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "module": record.module,
+            "process": PROCESS_NAME,
+            "message": record.getMessage(),
+        }
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry)
+
+class SharedRotatingFileHandler(RotatingFileHandler):
+    """
+    The assistant and the backend write the same log file, reopen it when
+    the other process rotated it so records don't go to the old file.
+    """
+    def emit(self, record):
+        if self.stream is not None:
+            try:
+                stat = os.stat(self.baseFilename)
+                changed = stat.st_ino != os.fstat(self.stream.fileno()).st_ino
+            except FileNotFoundError:
+                changed = True
+            if changed:
+                self.stream.close()
+                self.stream = None
+        super().emit(record)
+
+def _read_settings():
+    try:
+        with open(SETTINGS_PATH, "r") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _setup_logging():
+    settings = _read_settings()
+    secrets = [v for k, v in settings.items() if "key" in k.lower() and isinstance(v, str)]
+    secrets += [v for k, v in os.environ.items() if SECRET_ENV_PATTERN.search(k)]
+    level_filter = ModuleLevelFilter(settings.get("log_levels", {}))
+    filters = [RedactingFilter(secrets), level_filter]
+
+    max_bytes = settings.get("log_max_bytes", LOG_MAX_BYTES)
+    backup_count = settings.get("log_backup_count", LOG_BACKUP_COUNT)
+    file_handler = SharedRotatingFileHandler(log_file_path, maxBytes=max_bytes, backupCount=backup_count)
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handlers = [file_handler]
+    if settings.get("log_json", False):
+        json_handler = SharedRotatingFileHandler(json_log_file_path, maxBytes=max_bytes, backupCount=backup_count)
+        json_handler.setFormatter(JsonFormatter())
+        handlers.append(json_handler)
+
+    queue_handler = QueueHandler(Queue(-1))
+    for log_filter in filters:
+        queue_handler.addFilter(log_filter)
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    root.setLevel(logging.DEBUG)
+    root.addHandler(queue_handler)
+
+    # Also filter at the logger so in-process handlers (live log stream) get the same records
+    app_logger = logging.getLogger(__name__)
+    for log_filter in filters:
+        app_logger.addFilter(log_filter)
+    for module, level in level_filter.invalid.items():
+        app_logger.warning(f"Ignoring log level {level!r} for {module}: not a logging level")
+    return app_logger
+
+logger = _setup_logging()
 
 
 def load_settings():
-    settings_path = SOURCE_DIR / "settings.json"
-    with open(settings_path, "r") as f:
+    with open(SETTINGS_PATH, "r") as f:
         settings = json.load(f)
         return settings
@@ -0,0 +1,163 @@
+import asyncio
+import time
+import traceback
+from collections import deque
+
+from config import logger
+from metrics import metrics
+
+CONVERSATION_EXPIRY = 5 * 60  # Seconds of silence before the next question starts a new conversation
+CONVERSATION_MAX_EXCHANGES = 10  # Kept word for word, older ones are folded into the summary
+CONVERSATION_TOKEN_BUDGET = 2000  # History sent with a question, however large the context window
+DEFAULT_CONTEXT_WINDOW = 4096  # Models LiteLLM doesn't know, like a local llama.cpp server
+PROMPT_MARGIN = 64  # Tokens of message framing the counts don't see
+
+CONVERSATIONS = metrics.counter("gpt_home_conversations_total", "Conversations started, a new one after each period of inactivity.")
+HISTORY_TOKENS = metrics.histogram(
+    "gpt_home_conversation_history_tokens", "Tokens of conversation history sent with a question.",
+    buckets=(0, 100, 250, 500, 1000, 2000, 4000, 8000)
+)
+SUMMARIES = metrics.counter("gpt_home_conversation_summaries_total", "Summaries of older exchanges, by outcome.", labels=("outcome",))
+
+
+## Model information, from LiteLLM's model map ##
+# LiteLLM is imported on use, the route that needs these has loaded it already
+
+def context_window(model):
+    import litellm
+    try:
+        info = litellm.get_model_info(model)
+        return info.get("max_input_tokens") or info.get("max_tokens") or DEFAULT_CONTEXT_WINDOW
+    except Exception:
+        return DEFAULT_CONTEXT_WINDOW
+
+
+def count_tokens(model, text):
+    import litellm
+    try:
+        return litellm.token_counter(model=model, text=text)
+    except Exception:
+        return len(text) // 4 + 1
+
+
+def supports_prompt_caching(model):
+    import litellm
+    try:
+        return litellm.supports_prompt_caching(model=model)
+    except Exception:
+        return False
+
+
+class Exchange:
+    def __init__(self, question, answer):
+        self.question = question
+        self.answer = answer
+        self.tokens = {}  # By model, the auto mode switches between the provider's and the local one
+
+    def messages(self):
+        return [{"role": "user", "content": self.question}, {"role": "assistant", "content": self.answer}]
+
+
+class Conversation:
+    """
+    The recent questions and answers, so follow-up questions keep their
+    context.
+
+    Exchanges are kept in a bounded buffer. When they no longer fit the
+    token budget, or the buffer is full, the oldest ones are folded into a
+    running summary in the background. A question after CONVERSATION_EXPIRY
+    seconds of silence starts over.
+    """
+    def __init__(self, max_exchanges=CONVERSATION_MAX_EXCHANGES, expiry=CONVERSATION_EXPIRY):
+        self.max_exchanges = max_exchanges
+        self.expiry = expiry
+        self.exchanges = deque()
+        self.summary = None
+        self._evicted = []  # Waiting to be summarized
+        self._last_active = 0
+        self._generation = 0
+        self._summary_task = None
+
+    def clear(self):
+        self.exchanges.clear()
+        self.summary = None
+        self._evicted = []
+        self._generation += 1
+
+    def _expire(self):
+        if time.time() - self._last_active > self.expiry and (self.exchanges or self.summary or self._evicted):
+            logger.debug("Conversation expired, starting over")
+            self.clear()
+
+    def record(self, question, answer):
+        self._expire()
+        if not self.exchanges and not self.summary:
+            CONVERSATIONS.inc()
+        self.exchanges.append(Exchange(question, answer))
+        while len(self.exchanges) > self.max_exchanges:
+            self._evicted.append(self.exchanges.popleft())
+        # Without an LLM to summarize them, the oldest are let go
+        del self._evicted[:-self.max_exchanges]
+        self._last_active = time.time()
+
+    def messages(self, system_prompt, question, model, max_tokens=None, token_budget=CONVERSATION_TOKEN_BUDGET):
+        """
+        The prompt for `question`: the system prompt, the summary and the
+        most recent exchanges that fit the model's context window.
+        """
+        self._expire()
+        budget = min(token_budget, context_window(model) - (max_tokens or 0) - PROMPT_MARGIN
+                     - count_tokens(model, system_prompt) - count_tokens(model, question))
+
+        # The system prompt and summary come first and change least, the prefix providers cache
+        messages = [{"role": "system", "content": system_prompt}]
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"})
+            budget -= count_tokens(model, self.summary)
+
+        history, used = [], 0
+        for exchange in reversed(self.exchanges):
+            if model not in exchange.tokens:
+                exchange.tokens[model] = count_tokens(model, exchange.question) + count_tokens(model, exchange.answer)
+            tokens = exchange.tokens[model]
+            if used + tokens > budget:
+                break
+            history.insert(0, exchange)
+            used += tokens
+        # What no longer fits is summarized instead
+        while len(self.exchanges) > len(history):
+            self._evicted.append(self.exchanges.popleft())
+        HISTORY_TOKENS.observe(used)
+
+        for exchange in history:
+            messages.extend(exchange.messages())
+        if history and supports_prompt_caching(model):
+            # Everything up to the last answer was sent with the previous question, mark it for the provider's cache
+            messages[-1]["content"] = [{"type": "text", "text": messages[-1]["content"], "cache_control": {"type": "ephemeral"}}]
+        messages.append({"role": "user", "content": question})
+        return messages
+
+    def summarize_in_background(self, summarize):
+        """Folds the evicted exchanges into the summary with `await summarize(summary, exchanges)`, off the answer's path."""
+        if not self._evicted or (self._summary_task is not None and not self._summary_task.done()):
+            return
+        self._summary_task = asyncio.create_task(self._summarize(summarize))
+
+    async def _summarize(self, summarize):
+        evicted, generation = list(self._evicted), self._generation
+        try:
+            summary = await summarize(self.summary, evicted)
+        except Exception as e:
+            SUMMARIES.inc(outcome="failed")
+            logger.warning(f"Failed to summarize the conversation: {e}")
+            logger.debug(f"Failed to summarize the conversation: {traceback.format_exc()}")
+            return
+        if generation != self._generation:
+            return  # The conversation expired meanwhile
+        self.summary = summary
+        del self._evicted[:len(evicted)]
+        SUMMARIES.inc(outcome="ok")
+        logger.debug(f"Conversation summary: {summary}")
+
+
+conversation = Conversation()
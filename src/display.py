@@ -7,17 +7,23 @@ import textwrap
 import traceback
 
 from config import logger
+from metrics import metrics
+from tracing import tracer
 
 try:
     from board import SCL, SDA
-except ImportError  as e:
-    logger.debug("Board not detected. Skipping... \n    Reason: {e}\n{traceback.format_exc()}")
+except (ImportError, NotImplementedError) as e:
+    # Blinka raises NotImplementedError on hosts that aren't a supported board
+    logger.debug(f"Board not detected. Skipping... \n    Reason: {e}\n{traceback.format_exc()}")
 
 try:
     import adafruit_ssd1306
 except ImportError as e:
     logger.debug(f"Failed to import adafruit_ssd1306. Skipping...\n    Reason: {e}\n{traceback.format_exc()}")
 
+LCD_UPDATES = metrics.counter("gpt_home_lcd_updates_total", "Texts shown on the LCD.")
+LCD_UPDATE_DURATION = metrics.histogram("gpt_home_lcd_update_seconds", "Time to draw the header (IP address and CPU temperature) before a text scrolls in.")
+
 
 class LCDScreen:
     def __init__(self):
@@ -71,57 +77,60 @@ class LCDScreen:
         
         delay = LCDScreen.calculate_delay(text)
 
-        async with self._display_lock:
-            if stop_event is None:
-                stop_event = asyncio.Event()
-
-            async def display_text(delay):
-                i = 0
-                while not (stop_event and stop_event.is_set()) and i < line_count:
-                    if line_count > 2:
-                        await display_lines(i, min(i + 2, line_count), delay)
-                        i += 2
-                    else:
-                        await display_lines(0, line_count, delay)
-                        break  # Exit the loop if less than or equal to 2 lines
-                    await asyncio.sleep(0.02)  # Delay between pages
-
-            async def display_lines(start, end, delay):
-                self._display.fill_rect(0, 10, 128, 22, 0)
-                # type out the text
-                for i, line_index in enumerate(range(start, end)):
-                    for j, char in enumerate(lines[line_index]):
-                        if stop_event.is_set():
-                            break
-                        try:
-                            self._display.text(char, j * 6, 10 + i * 10, 1)
-                        except struct.error as e:
-                            logger.error(f"Struct Error: {e}, skipping character {char}")
-                            continue  # Skip the current character and continue with the next
-                        self._display.show()
-                        await asyncio.sleep(delay)
-
-            # Clear the display
-            self._display.fill(0)
-            # Display IP address
-            ip_address = subprocess.check_output(["hostname", "-I"]).decode("utf-8").split(" ")[0]
-            self._display.text(f"{ip_address}", 0, 0, 1)
-            # Display CPU temperature in Celsius (e.g., 39°)
-            cpu_temp = int(float(subprocess.check_output(["vcgencmd", "measure_temp"]).decode("utf-8").split("=")[1].split("'")[0]))
-            temp_text_x = 100
-            self._display.text(f"{cpu_temp}", temp_text_x, 0, 1)
-            # degree symbol
-            degree_x = 100 + len(f"{cpu_temp}") * 7 # Assuming each character is 7 pixels wide
-            degree_y = 2
-            LCDScreen.degree_symbol(self._display, degree_x, degree_y, 2, 1)
-            c_x = degree_x + 7 # Assuming each character is 7 pixels wide
-            self._display.text("C", c_x, 0, 1)
-            # Show the updated display with the text.
-            self._display.show()
-            # Line wrap the text
-            lines = textwrap.fill(text, 21).split('\n')
-            line_count = len(lines)
-            display_task = asyncio.create_task(display_text(delay))
+        # Covers drawing the header, the text itself is typed out by a background task
+        LCD_UPDATES.inc()
+        with tracer.span("lcd", characters=len(text)), LCD_UPDATE_DURATION.time():
+            async with self._display_lock:
+                if stop_event is None:
+                    stop_event = asyncio.Event()
+
+                async def display_text(delay):
+                    i = 0
+                    while not (stop_event and stop_event.is_set()) and i < line_count:
+                        if line_count > 2:
+                            await display_lines(i, min(i + 2, line_count), delay)
+                            i += 2
+                        else:
+                            await display_lines(0, line_count, delay)
+                            break  # Exit the loop if less than or equal to 2 lines
+                        await asyncio.sleep(0.02)  # Delay between pages
+
+                async def display_lines(start, end, delay):
+                    self._display.fill_rect(0, 10, 128, 22, 0)
+                    # type out the text
+                    for i, line_index in enumerate(range(start, end)):
+                        for j, char in enumerate(lines[line_index]):
+                            if stop_event.is_set():
+                                break
+                            try:
+                                self._display.text(char, j * 6, 10 + i * 10, 1)
+                            except struct.error as e:
+                                logger.error(f"Struct Error: {e}, skipping character {char}")
+                                continue  # Skip the current character and continue with the next
+                            self._display.show()
+                            await asyncio.sleep(delay)
+
+                # Clear the display
+                self._display.fill(0)
+                # Display IP address
+                ip_address = subprocess.check_output(["hostname", "-I"]).decode("utf-8").split(" ")[0]
+                self._display.text(f"{ip_address}", 0, 0, 1)
+                # Display CPU temperature in Celsius (e.g., 39°)
+                cpu_temp = int(float(subprocess.check_output(["vcgencmd", "measure_temp"]).decode("utf-8").split("=")[1].split("'")[0]))
+                temp_text_x = 100
+                self._display.text(f"{cpu_temp}", temp_text_x, 0, 1)
+                # degree symbol
+                degree_x = 100 + len(f"{cpu_temp}") * 7 # Assuming each character is 7 pixels wide
+                degree_y = 2
+                LCDScreen.degree_symbol(self._display, degree_x, degree_y, 2, 1)
+                c_x = degree_x + 7 # Assuming each character is 7 pixels wide
+                self._display.text("C", c_x, 0, 1)
+                # Show the updated display with the text.
+                self._display.show()
+                # Line wrap the text
+                lines = textwrap.fill(text, 21).split('\n')
+                line_count = len(lines)
+                display_task = asyncio.create_task(display_text(delay))
 
 
 
@@ -153,6 +162,15 @@ class LCDScreen:
                     self._display.show()
                     await asyncio.sleep(0.5)
     
+    def display_boot_progress(self, ready, total, pending):
+        if self._display is None:
+            return
+        self._display.fill(0)
+        self._display.text(f"Booting {ready}/{total}", 0, 0, 1)
+        if pending:
+            self._display.text(", ".join(pending)[:21], 0, 20, 1)
+        self._display.show()
+
     def display_no_api_key(self):
         self._display.fill(0)
         ip_address = subprocess.check_output(["hostname", "-I"]).decode("utf-8").split(" ")[0].strip()
@@ -0,0 +1,75 @@
+import re
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from difflib import get_close_matches
+
+INDEX_PAST = timedelta(days=1)
+INDEX_HORIZON = timedelta(days=365)  # Recurring events are expanded this far ahead
+NAME_MATCH_CUTOFF = 0.6
+
+
+def normalize_name(name):
+    return " ".join(re.findall(r"\w+", name.lower()))
+
+
+class NameIndex:
+    """
+    Items by normalized name: exact matches are a dict lookup, prefixes a
+    bisect over the sorted names. Fuzzy matching only runs over the unique
+    names when neither finds anything.
+    """
+    def __init__(self, items):
+        self._by_name = {}
+        for item in items:
+            self._by_name.setdefault(normalize_name(item.summary), []).append(item)
+        self._names = sorted(self._by_name)
+
+    def find(self, name):
+        name = normalize_name(name)
+        if not name:
+            return None
+        if name in self._by_name:
+            return self._by_name[name][0]
+
+        i = bisect_left(self._names, name)
+        if i < len(self._names) and self._names[i].startswith(name):
+            return self._by_name[self._names[i]][0]
+
+        for candidate in self._names:
+            # Matches a word inside a longer name, as "dentist" in "call the dentist"
+            if re.search(rf"\b{re.escape(name)}\b", candidate):
+                return self._by_name[candidate][0]
+
+        matches = get_close_matches(name, self._names, n=1, cutoff=NAME_MATCH_CUTOFF)
+        return self._by_name[matches[0]][0] if matches else None
+
+
+class EventIndex:
+    """
+    Every occurrence of every event between `start` and `end`, recurring
+    events expanded, sorted by start time. Next-event and range queries are
+    a bisect over the start times.
+    """
+    def __init__(self, events, start=None, end=None):
+        now = datetime.now()
+        self.start = now - INDEX_PAST if start is None else start
+        self.end = now + INDEX_HORIZON if end is None else end
+        occurrences = [occurrence for event in events for occurrence in event.occurrences(self.start, self.end)]
+        occurrences.sort(key=lambda occurrence: occurrence[0])
+        self._starts = [occurrence[0] for occurrence in occurrences]
+        self._occurrences = occurrences
+        self.names = NameIndex(events)
+
+    def __len__(self):
+        return len(self._occurrences)
+
+    def covers(self, start, end):
+        return self.start <= start and end <= self.end
+
+    def next(self, after):
+        i = bisect_left(self._starts, after)
+        return self._occurrences[i] if i < len(self._occurrences) else None
+
+    def between(self, start, end):
+        """(start, item) for every occurrence starting in [start, end)."""
+        return self._occurrences[bisect_left(self._starts, start):bisect_left(self._starts, end)]
@@ -1,4 +1,4 @@
-import React, { useEffect, useState, useRef } from 'react';
+import React, { useCallback, useEffect, useState, useRef } from 'react';
 import '../css/EventLogs.css';
 import axios from 'axios';
 
@@ -15,6 +15,8 @@ const EventLogs: React.FC = () => {
   const [currentLogLength, setCurrentLogLength] = useState<number | null>(null);
   const logContainerRef = useRef<HTMLPreElement>(null);
   const [userHasScrolled, setUserHasScrolled] = useState(false);
+  const userHasScrolledRef = useRef(false);
+  const [streamFailed, setStreamFailed] = useState(false);
   const [lastLineNumber, setLastLineNumber] = useState<number>(0);
   const [activeFilters, setActiveFilters] = useState<{ [key: string]: boolean }>({
     warning: true,
@@ -54,7 +56,52 @@ const EventLogs: React.FC = () => {
     fetchAllLogs();
   }, []);
   
+  const appendLogs = useCallback((newLogs: string[]) => {
+    const formattedNewLogs = newLogs.map((log: string) => ({
+      content: log,
+      isNew: true,
+      type: log.split(":")[0].toLowerCase(),
+    }));
+    setLogs(prevLogs => [...prevLogs, ...formattedNewLogs]);
+
+    if (logContainerRef.current && !userHasScrolledRef.current) {
+      logContainerRef.current.scrollTop = logContainerRef.current.scrollHeight;
+    }
+
+    setTimeout(() => {
+      setLogs(prevLogs => prevLogs.map(log => ({ ...log, isNew: false })));
+    }, 2000);
+  }, []);
+
+  useEffect(() => {
+    userHasScrolledRef.current = userHasScrolled;
+  }, [userHasScrolled]);
+
+  // Live logs are pushed by the backend, polling is only a fallback
   useEffect(() => {
+    const source = new EventSource('/logs/stream');
+    source.onmessage = (event) => {
+      const entry = JSON.parse(event.data);
+      appendLogs([entry.content]);
+    };
+    // Sent as a named event, which onmessage doesn't receive
+    source.addEventListener('dropped', (event) => {
+      const entry = JSON.parse((event as MessageEvent).data);
+      appendLogs([entry.content]);
+    });
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED) {
+        setStreamFailed(true);
+      }
+    };
+    return () => source.close();
+  }, [appendLogs]);
+
+  useEffect(() => {
+    if (!streamFailed) {
+      return;
+    }
+
     const fetchLastLog = async () => {
       try {
         const response = await fetch(`/new-logs?last_line_number=${lastLineNumber}`, { method: 'POST' });
@@ -63,21 +110,8 @@ const EventLogs: React.FC = () => {
         const newLastLineNumber = data.new_last_line_number;
     
         if (newLogs.length > 0) {
-          const formattedNewLogs = newLogs.map((log: string) => ({
-            content: log,
-            isNew: true,
-            type: log.split(":")[0].toLowerCase(),
-          }));
-          setLogs(prevLogs => [...prevLogs, ...formattedNewLogs]);
+          appendLogs(newLogs);
           setLastLineNumber(newLastLineNumber);
-    
-          if (logContainerRef.current && !userHasScrolled) {
-            logContainerRef.current.scrollTop = logContainerRef.current.scrollHeight;
-          }
-    
-          setTimeout(() => {
-            setLogs(prevLogs => prevLogs.map(log => ({ ...log, isNew: false })));
-          }, 2000);
         }
       } catch (error) {
         console.error('Error fetching last log:', error);
@@ -86,7 +120,7 @@ const EventLogs: React.FC = () => {
   
     const intervalId = setInterval(fetchLastLog, 1500);
     return () => clearInterval(intervalId);
-  }, [logs, lastLineNumber, userHasScrolled]);
+  }, [streamFailed, lastLineNumber, appendLogs]);
   
   useEffect(() => {
     const handleScroll = () => {
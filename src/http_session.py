@@ -0,0 +1,30 @@
+import asyncio
+
+import aiohttp
+
+from tracing import aiohttp_trace_config
+
+HTTP_TIMEOUT = aiohttp.ClientTimeout(total=15)
+
+_session = None
+_session_loop = None
+
+
+def get_session():
+    """
+    One pooled aiohttp session for the process so routes reuse connections
+    (and TLS sessions) instead of opening a new session per request.
+    """
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        _session = aiohttp.ClientSession(timeout=HTTP_TIMEOUT, trace_configs=[aiohttp_trace_config()])
+        _session_loop = loop
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
@@ -0,0 +1,152 @@
+import asyncio
+import os
+import time
+import traceback
+
+from config import logger
+from http_session import get_session
+
+HUE_STATE_TTL = 60  # The cached state is refreshed at least this often
+HUE_REFRESH_RETRY = 30
+# Attributes of a group action that also apply to each of its lights
+LIGHT_STATE_KEYS = {"on", "bri", "hue", "sat", "xy", "ct", "effect", "alert"}
+COLOR_MODES = {"hue": "hs", "sat": "hs", "xy": "xy", "ct": "ct"}
+
+
+class HueUnavailable(Exception):
+    """Raised with a message meant for the user when the bridge can't be used."""
+
+
+class HueBridge:
+    """
+    Long-lived client for the Hue bridge REST API, over the process-wide
+    aiohttp session so connections are reused.
+
+    The whole bridge state (lights, groups, scenes) is cached from one
+    GET /api/<username> and refreshed in the background. A command sends
+    every attribute in one PUT and updates the cache optimistically, so
+    state questions never wait on the bridge.
+    """
+    def __init__(self, ttl=HUE_STATE_TTL):
+        self.ttl = ttl
+        self._credentials = None
+        self._state = None
+        self._fetched_at = 0
+        self._refresh_lock = None
+        self._refresh_task = None
+
+    @staticmethod
+    def credentials():
+        bridge_ip = os.getenv('PHILIPS_HUE_BRIDGE_IP')
+        username = os.getenv('PHILIPS_HUE_USERNAME')
+        if not bridge_ip or not username:
+            raise HueUnavailable("No philips hue bridge IP found. Please enter your bridge IP for Phillips Hue in the web interface or try reconnecting the service.")
+        return bridge_ip, username
+
+    async def request(self, method, path="", json=None):
+        bridge_ip, username = self.credentials()
+        async with get_session().request(method, f"http://{bridge_ip}/api/{username}{path}", json=json) as response:
+            response.raise_for_status()
+            result = await response.json(content_type=None)
+        errors = [item["error"] for item in result if "error" in item] if isinstance(result, list) else []
+        if errors:
+            raise HueUnavailable(f"The Hue bridge refused the command: {errors[0].get('description')}")
+        return result
+
+    ## State ##
+
+    async def refresh(self):
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            credentials = self.credentials()
+            state = await self.request("GET")
+            self._state, self._credentials, self._fetched_at = state, credentials, time.time()
+            logger.debug(f"Hue state refreshed: {len(state.get('lights', {}))} lights, {len(state.get('groups', {}))} groups")
+
+    async def state(self):
+        if self._state is None or self.credentials() != self._credentials or time.time() - self._fetched_at > self.ttl:
+            await self.refresh()
+        return self._state
+
+    async def lights(self):
+        return (await self.state()).get("lights", {})
+
+    async def groups(self):
+        return (await self.state()).get("groups", {})
+
+    async def scenes(self):
+        return (await self.state()).get("scenes", {})
+
+    async def lights_on(self, group_id=0):
+        """(lights on, lights in the group), from the cache."""
+        lights = await self.lights()
+        light_ids = list(lights) if str(group_id) == "0" else (await self.groups()).get(str(group_id), {}).get("lights", [])
+        on = sum(1 for light_id in light_ids if lights.get(light_id, {}).get("state", {}).get("on"))
+        return on, len(light_ids)
+
+    def start(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+                delay = self.ttl / 2
+            except HueUnavailable as e:
+                logger.debug(f"Hue state not refreshed: {e}")
+                delay = self.ttl
+            except Exception as e:
+                logger.warning(f"Failed to refresh the Hue state: {e}")
+                logger.debug(f"Failed to refresh the Hue state: {traceback.format_exc()}")
+                delay = HUE_REFRESH_RETRY
+            await asyncio.sleep(delay)
+
+    ## Commands ##
+
+    async def set_group(self, group_id, **state):
+        """Sets every attribute of the group's lights in one request."""
+        await self.request("PUT", f"/groups/{group_id}/action", json=state)
+        await self._apply(group_id, None, state)
+
+    async def set_light(self, light_id, **state):
+        await self.request("PUT", f"/lights/{light_id}/state", json=state)
+        await self._apply(None, light_id, state)
+
+    async def _apply(self, group_id, light_id, state):
+        # Optimistic update, the next refresh brings back the bridge's own view
+        if self._state is None:
+            return
+        lights = self._state.get("lights", {})
+        groups = self._state.get("groups", {})
+        light_state = {key: value for key, value in state.items() if key in LIGHT_STATE_KEYS}
+        color_mode = next((COLOR_MODES[key] for key in state if key in COLOR_MODES), None)
+        if color_mode:
+            light_state["colormode"] = color_mode
+
+        if light_id is not None:
+            light_ids = [str(light_id)]
+        elif str(group_id) == "0":
+            light_ids = list(lights)
+        else:
+            group = groups.get(str(group_id), {})
+            group.setdefault("action", {}).update(light_state)
+            light_ids = group.get("lights", [])
+        for light_id in light_ids:
+            lights.get(light_id, {}).setdefault("state", {}).update(light_state)
+
+        for group in groups.values():
+            on = [lights.get(light_id, {}).get("state", {}).get("on", False) for light_id in group.get("lights", [])]
+            group["state"] = {"any_on": any(on), "all_on": bool(on) and all(on)}
+
+
+hue_bridge = HueBridge()
@@ -0,0 +1,197 @@
+import re
+
+ALL_LIGHTS = ("group", "0", "all lights")
+# Only an explicit "all (the) lights" or "the whole house" overrides the rooms named,
+# "all the lights in the kitchen" is the kitchen's
+ALL_LIGHTS_PATTERN = re.compile(
+    r"\b(?:all|every)\s+(?:of\s+)?(?:the\s+)?lights?\b(?!\s+(?:in|of)\b)|\b(?:whole|entire)\s+(?:house|home)\b|\beverywhere\b",
+    re.IGNORECASE
+)
+BRIGHTNESS_STEP = 25  # Percent, for "dim" and "brighten"
+
+# Mireds, the bridge accepts 153 (6500K) to 500 (2000K)
+COLOR_TEMPERATURES = {
+    "candle": 500,
+    "warm white": 454,
+    "soft white": 370,
+    "white": 300,
+    "neutral white": 250,
+    "cool white": 200,
+    "daylight": 153,
+}
+COLORS = {
+    "red": (255, 0, 0),
+    "crimson": (220, 20, 60),
+    "coral": (255, 127, 80),
+    "orange": (255, 140, 0),
+    "amber": (255, 191, 0),
+    "gold": (255, 215, 0),
+    "yellow": (255, 255, 0),
+    "lime": (191, 255, 0),
+    "green": (0, 255, 0),
+    "teal": (0, 128, 128),
+    "turquoise": (64, 224, 208),
+    "cyan": (0, 255, 255),
+    "blue": (0, 0, 255),
+    "indigo": (75, 0, 130),
+    "violet": (238, 130, 238),
+    "purple": (128, 0, 128),
+    "magenta": (255, 0, 255),
+    "pink": (255, 105, 180),
+    "lavender": (181, 126, 220),
+}
+
+# A command verb or "lights on/off", a bare trailing "on" is as likely a question ("what is on")
+ON_OFF_PATTERN = re.compile(r"\b(?:turn|switch|shut|put|cut)\b.*?\b(on|off)\b|\blights?\s+(on|off)\b", re.IGNORECASE)
+BLACK_PATTERN = re.compile(r"\bblack\b", re.IGNORECASE)
+BRIGHTNESS_PATTERN = re.compile(r"\b(\d{1,3})\s*(?:%|percent\b)|\bto\s+(\d{1,3})\b(?!\s*:)", re.IGNORECASE)
+DIM_PATTERN = re.compile(r"\b(dim|darker|lower)\b", re.IGNORECASE)
+BRIGHTEN_PATTERN = re.compile(r"\b(brighten|brighter|raise)\b", re.IGNORECASE)
+FULL_BRIGHTNESS_PATTERN = re.compile(r"\b(full|max(imum)?)\s+brightness\b", re.IGNORECASE)
+COLOR_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted(map(re.escape, list(COLOR_TEMPERATURES) + list(COLORS)), key=len, reverse=True)) + r")\b",
+    re.IGNORECASE
+)
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def rgb_to_xy(r, g, b):
+    """sRGB (0-255) to CIE xy, as the Hue bridge expects colors."""
+    def linear(channel):
+        channel /= 255
+        return ((channel + 0.055) / 1.055) ** 2.4 if channel > 0.04045 else channel / 12.92
+
+    r, g, b = linear(r), linear(g), linear(b)
+    # Wide gamut RGB D65 conversion from the Hue developer documentation
+    x = r * 0.664511 + g * 0.154324 + b * 0.162028
+    y = r * 0.283881 + g * 0.668433 + b * 0.047685
+    z = r * 0.000088 + g * 0.072310 + b * 0.986039
+    total = x + y + z
+    if total == 0:
+        return [0.3227, 0.329]  # White point
+    return [round(x / total, 4), round(y / total, 4)]
+
+
+def percent_to_bri(percent):
+    return max(1, min(254, round(percent * 254 / 100)))
+
+
+class NameTrie:
+    """
+    Word-level trie over the room and light names. Scanning the question
+    finds every name it mentions in one pass, preferring the longest match
+    ("living room lamp" over "living room").
+    """
+    def __init__(self):
+        self._root = {}
+
+    def add(self, name, target):
+        node = self._root
+        for word in WORD_PATTERN.findall(name.lower()):
+            node = node.setdefault(word, {})
+        if node is not self._root:
+            node.setdefault(None, target)
+
+    def scan(self, text):
+        words = WORD_PATTERN.findall(text.lower())
+        matches = []
+        i = 0
+        while i < len(words):
+            node, longest = self._root, None
+            for j in range(i, len(words)):
+                node = node.get(words[j])
+                if node is None:
+                    break
+                if None in node:
+                    longest = (j, node[None])
+            if longest is not None:
+                matches.append(longest[1])
+                i = longest[0] + 1
+            else:
+                i += 1
+        return matches
+
+
+class LightCommand:
+    def __init__(self, targets, state, action):
+        self.targets = targets
+        self.state = state
+        self.action = action  # Spoken back, with {where} for the targets
+
+    def describe(self):
+        names = [name if target_id == "0" else f"the {name}" for _, target_id, name in self.targets]
+        where = names[0] if len(names) == 1 else f"{', '.join(names[:-1])} and {names[-1]}"
+        return self.action.format(where=where)
+
+
+class LightCommandParser:
+    """
+    Compiled from the bridge's groups and lights. Turns a question into the
+    targets it names (all lights when none) and the one state update to
+    send to each of them.
+    """
+    def __init__(self, groups, lights):
+        self.trie = NameTrie()
+        # Rooms first so a light sharing a room's name doesn't shadow it
+        for group_id, group in groups.items():
+            self.trie.add(group.get("name", ""), ("group", str(group_id), group.get("name", "")))
+        for light_id, light in lights.items():
+            self.trie.add(light.get("name", ""), ("light", str(light_id), light.get("name", "")))
+        self.topology = LightCommandParser.topology_key(groups, lights)
+
+    @staticmethod
+    def topology_key(groups, lights):
+        return (
+            tuple(sorted((group_id, group.get("name")) for group_id, group in groups.items())),
+            tuple(sorted((light_id, light.get("name")) for light_id, light in lights.items())),
+        )
+
+    def targets(self, text):
+        """The rooms and lights named, all lights when none is or when asked for all of them."""
+        targets = list(dict.fromkeys(self.trie.scan(text)))
+        if not targets or ALL_LIGHTS_PATTERN.search(text):
+            return [ALL_LIGHTS]
+        return targets
+
+    def parse(self, text):
+        """A LightCommand, or None when the text isn't a light command."""
+        targets = self.targets(text)
+
+        color = COLOR_PATTERN.search(text)
+        brightness = BRIGHTNESS_PATTERN.search(text)
+        state = {}
+        settings = []
+        if color:
+            name = color.group(1).lower()
+            if name in COLOR_TEMPERATURES:
+                state["ct"] = COLOR_TEMPERATURES[name]
+            else:
+                state["xy"] = rgb_to_xy(*COLORS[name])
+            settings.append(name)
+        if brightness:
+            percent = min(int(brightness.group(1) or brightness.group(2)), 100)
+            if percent == 0:
+                return LightCommand(targets, {"on": False}, "Turning off {where}.")
+            state["bri"] = percent_to_bri(percent)
+            settings.append(f"{percent}% brightness")
+        elif FULL_BRIGHTNESS_PATTERN.search(text):
+            state["bri"] = 254
+            settings.append("full brightness")
+
+        if settings:
+            state["on"] = True
+            return LightCommand(targets, state, f"Setting {{where}} to {' at '.join(settings)}.")
+
+        # Relative changes are left to the bridge, each light keeps its own level
+        if BRIGHTEN_PATTERN.search(text):
+            return LightCommand(targets, {"on": True, "bri_inc": percent_to_bri(BRIGHTNESS_STEP)}, "Brightening {where}.")
+        if DIM_PATTERN.search(text):
+            return LightCommand(targets, {"bri_inc": -percent_to_bri(BRIGHTNESS_STEP)}, "Dimming {where}.")
+
+        if BLACK_PATTERN.search(text):
+            return LightCommand(targets, {"on": False}, "Turning off {where}.")
+        on_off = ON_OFF_PATTERN.search(text)
+        if on_off:
+            on = (on_off.group(1) or on_off.group(2)).lower() == "on"
+            return LightCommand(targets, {"on": on}, "Turning on {where}." if on else "Turning off {where}.")
+        return None
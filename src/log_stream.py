@@ -0,0 +1,295 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import traceback
+from bisect import bisect_left
+from collections import deque
+
+from config import logger, log_file_path, LOG_FORMAT
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError as e:
+    INotify = None
+    logger.debug(f"inotify_simple not available, log follower will poll the log file instead.\n    Reason: {e}")
+
+
+LOG_LEVELS = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "SUCCESS": logging.SUCCESS,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+    "CRITICAL": logging.CRITICAL,
+}
+ENTRY_START_PATTERN = re.compile(r"^(INFO|SUCCESS|DEBUG|ERROR|WARNING|CRITICAL):")
+ENTRY_HEADER_PATTERN = re.compile(rb"^(INFO|SUCCESS|DEBUG|ERROR|WARNING|CRITICAL):\[([^\]]+)\]")
+CLIENT_QUEUE_SIZE = 500  # Entries buffered per client before the oldest ones are dropped
+RECENT_LOCAL_ENTRIES = 256  # Entries published in-process, skipped when the follower reads them back
+FOLLOW_POLL_INTERVAL = 0.1  # Seconds between file checks when inotify isn't available
+
+
+class LogSubscriber:
+    """
+    One connected client. Entries below `min_level` are ignored and the
+    queue is bounded so a slow client can never make the backend buffer
+    the whole log: the oldest entries are dropped and counted instead.
+    """
+    def __init__(self, min_level=logging.DEBUG, maxsize=CLIENT_QUEUE_SIZE):
+        self.min_level = min_level
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def push(self, entry):
+        if entry["levelno"] < self.min_level:
+            return
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(entry)
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class LogBroadcaster:
+    """
+    Fans log entries out to every subscribed client.
+
+    Entries come from two sources: `BroadcastHandler`, attached to the
+    in-process logger, and a follower on `events.log` that picks up what
+    other processes (the assistant app) write. Entries already published
+    in-process are skipped by the follower so clients don't see them twice.
+    """
+    def __init__(self, file_path=log_file_path):
+        self.file_path = file_path
+        self._subscribers = set()
+        self._recent_local = deque(maxlen=RECENT_LOCAL_ENTRIES)
+        self._loop = None
+        self._follower_task = None
+
+    def subscribe(self, min_level=logging.DEBUG, maxsize=CLIENT_QUEUE_SIZE):
+        self._loop = asyncio.get_running_loop()
+        if self._follower_task is None or self._follower_task.done():
+            self._follower_task = asyncio.create_task(self._follow())
+
+        subscriber = LogSubscriber(min_level, maxsize)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish_local(self, levelname, text):
+        # Called from whichever thread logged the record
+        loop = self._loop
+        if loop is None or not self._subscribers:
+            return
+        entry = LogBroadcaster._make_entry(levelname, text)
+        self._recent_local.append(entry["content"])
+        try:
+            loop.call_soon_threadsafe(self._publish, entry)
+        except RuntimeError:
+            pass  # Loop already closed
+
+    def _publish(self, entry):
+        for subscriber in list(self._subscribers):
+            subscriber.push(entry)
+
+    def _publish_from_file(self, content):
+        if content in self._recent_local:
+            self._recent_local.remove(content)
+            return
+        match = ENTRY_START_PATTERN.match(content)
+        self._publish(LogBroadcaster._make_entry(match.group(1) if match else "INFO", content))
+
+    async def _follow(self):
+        inotify = None
+        changed = asyncio.Event()
+        if INotify is not None:
+            try:
+                inotify = INotify()
+                # Watch the directory so truncation and rotation don't lose the watch
+                inotify.add_watch(str(self.file_path.parent), flags.MODIFY | flags.CREATE | flags.MOVED_TO)
+                self._loop.add_reader(inotify.fileno(), changed.set)
+            except Exception as e:
+                logger.debug(f"Failed to set up inotify on {self.file_path}, polling instead: {e}")
+                inotify = None
+
+        f = None
+        inode = None
+        partial = ""
+        from_start = not self.file_path.exists()
+        try:
+            while True:
+                if f is None and self.file_path.exists():
+                    f = self.file_path.open("r")
+                    inode = os.fstat(f.fileno()).st_ino
+                    if not from_start:
+                        # Only stream what's written from now on, /logs serves the history
+                        f.seek(0, os.SEEK_END)
+
+                if f is not None:
+                    try:
+                        stat = os.stat(self.file_path)
+                    except FileNotFoundError:
+                        stat = None
+                    if stat is None or stat.st_ino != inode:
+                        # Rotated: drain the old file then switch to the new one
+                        partial = self._read_entries(f, partial)
+                        f.close()
+                        f = None
+                        from_start = True
+                        continue
+                    if stat.st_size < f.tell():
+                        # Truncated by /clear-logs
+                        f.seek(0)
+                        partial = ""
+                    partial = self._read_entries(f, partial)
+
+                if inotify is not None:
+                    await changed.wait()
+                    changed.clear()
+                    inotify.read(timeout=0)
+                else:
+                    await asyncio.sleep(FOLLOW_POLL_INTERVAL)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Log follower stopped: {e}")
+            logger.debug(f"Log follower stopped: {traceback.format_exc()}")
+        finally:
+            if inotify is not None:
+                self._loop.remove_reader(inotify.fileno())
+                inotify.close()
+            if f is not None:
+                f.close()
+
+    def _read_entries(self, f, partial):
+        data = partial + f.read()
+        if not data:
+            return ""
+        lines = data.splitlines(keepends=True)
+        # Keep an unfinished last line for the next read
+        partial = lines.pop() if not lines[-1].endswith("\n") else ""
+
+        entry = []
+        for line in lines:
+            if ENTRY_START_PATTERN.match(line) and entry:
+                self._publish_from_file("".join(entry).rstrip("\n"))
+                entry = []
+            entry.append(line)
+
+        # Writers flush whole records, so the last entry of a read is complete
+        if entry:
+            self._publish_from_file("".join(entry).rstrip("\n"))
+        return partial
+
+    @staticmethod
+    def _make_entry(levelname, text):
+        return {
+            "level": levelname,
+            "levelno": LOG_LEVELS.get(levelname, logging.INFO),
+            "content": text.replace("`", ""),
+        }
+
+
+class BroadcastHandler(logging.Handler):
+    def __init__(self, broadcaster):
+        super().__init__()
+        self.broadcaster = broadcaster
+        self.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    def emit(self, record):
+        try:
+            self.broadcaster.publish_local(record.levelname, self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+def log_time(moment):
+    """A datetime as the index keeps times, in local time like the log's asctime."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return f"{moment:%Y-%m-%d %H:%M:%S},{moment.microsecond // 1000:03d}"
+
+
+class LogIndex:
+    """
+    Byte offset, level and time of every entry in `events.log`, updated from
+    the last indexed byte so the log endpoints never rescan the whole file.
+    Rebuilt from scratch when the file is truncated or rotated.
+    """
+    def __init__(self, file_path=log_file_path):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, inode):
+        self._inode = inode
+        self._indexed_bytes = 0
+        self.offsets = []
+        self.levels = []
+        self.times = []  # "YYYY-MM-DD HH:MM:SS,mmm" strings sort chronologically
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def refresh(self):
+        with self._lock:
+            try:
+                stat = os.stat(self.file_path)
+            except FileNotFoundError:
+                self._reset(None)
+                return
+            if stat.st_ino != self._inode or stat.st_size < self._indexed_bytes:
+                self._reset(stat.st_ino)
+            if stat.st_size == self._indexed_bytes:
+                return
+
+            with self.file_path.open("rb") as f:
+                f.seek(self._indexed_bytes)
+                offset = self._indexed_bytes
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # Still being written
+                    match = ENTRY_HEADER_PATTERN.match(line)
+                    if match:
+                        self.offsets.append(offset)
+                        self.levels.append(LOG_LEVELS[match.group(1).decode()])
+                        self.times.append(match.group(2).decode())
+                    offset += len(line)
+                self._indexed_bytes = offset
+
+    def entries(self, start=0, min_level=logging.DEBUG, since=None, last=None):
+        self.refresh()
+        with self._lock:
+            end = len(self.offsets)
+            if since is not None:
+                start = max(start, bisect_left(self.times, log_time(since)))
+            selected = [i for i in range(start, end) if self.levels[i] >= min_level]
+            if last is not None:
+                # The last entries at that level, not those among the last lines
+                selected = selected[-last:] if last > 0 else []
+            spans = [(self.offsets[i], (self.offsets[i + 1] if i + 1 < end else self._indexed_bytes)) for i in selected]
+
+        entries = []
+        with self.file_path.open("rb") as f:
+            for begin, finish in spans:
+                f.seek(begin)
+                entries.append(f.read(finish - begin).decode("utf-8", errors="replace").replace("`", "").rstrip("\n"))
+        return entries
+
+
+def format_sse(entry, event=None):
+    data = json.dumps({"level": entry["level"], "content": entry["content"]})
+    if event:
+        return f"event: {event}\ndata: {data}\n\n"
+    return f"data: {data}\n\n"
+
+
+log_broadcaster = LogBroadcaster()
+log_index = LogIndex()
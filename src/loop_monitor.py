@@ -0,0 +1,163 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from pathlib import Path
+
+from config import logger
+from metrics import metrics
+
+LOOP_BLOCK_THRESHOLD = 0.1  # Seconds a callback may hold the loop before it's reported
+LOOP_HEARTBEAT_INTERVAL = 0.02  # Seconds between heartbeats, and between the watchdog's checks
+LOOP_HUNG_AFTER = 5  # Seconds before a callback that still holds the loop is reported, without waiting for it to return
+LOOP_STALLS_KEPT = 100
+
+
+def debug_loop_threshold():
+    """
+    The threshold set with GPT_HOME_DEBUG_LOOP, in milliseconds (any other
+    value uses LOOP_BLOCK_THRESHOLD), None when the debug mode is off.
+    """
+    value = os.getenv("GPT_HOME_DEBUG_LOOP", "").strip().lower()
+    if value in ("", "0", "false", "no", "off"):
+        return None
+    try:
+        return float(value) / 1000
+    except ValueError:
+        return LOOP_BLOCK_THRESHOLD
+
+
+class LoopStall:
+    def __init__(self, started, duration, stack):
+        self.started = started
+        self.duration = duration
+        self.stack = stack  # traceback.StackSummary of the loop's thread, empty when it returned before the watchdog looked
+
+    @property
+    def location(self):
+        """
+        Where the loop was held: the innermost function outside the Python
+        installation and its packages. Without the line number, so it stays
+        the same across edits for the benchmark's baseline.
+        """
+        frames = [frame for frame in self.stack if not frame.filename.startswith((sys.prefix, sys.base_prefix))] or list(self.stack)
+        return f"{Path(frames[-1].filename).name} in {frames[-1].name}" if frames else "unknown"
+
+
+class BlockingDetector:
+    """
+    Reports callbacks that hold the event loop longer than `threshold`.
+
+    A heartbeat on the loop notes when it last ran. A watchdog thread checks
+    on it and, when the heartbeat is late past the threshold, takes the stack
+    of the loop's thread: the code still holding the loop. Once the loop gets
+    back to the heartbeat, the stall is logged with that stack and counted
+    in the metrics. Stalls over LOOP_HUNG_AFTER seconds are logged right away.
+
+    Meant for debugging: it costs a heartbeat every LOOP_HEARTBEAT_INTERVAL.
+    """
+    def __init__(self, process, threshold=LOOP_BLOCK_THRESHOLD, interval=LOOP_HEARTBEAT_INTERVAL):
+        self.process = process
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = deque(maxlen=LOOP_STALLS_KEPT)
+        # Named per process, both end up on the backend's /metrics
+        self._stall_count = metrics.counter(
+            f"gpt_home_{process}_event_loop_stalls_total", "Callbacks that held the event loop past the debug threshold.", labels=("location",)
+        )
+        self._stall_duration = metrics.histogram(
+            f"gpt_home_{process}_event_loop_stall_seconds", "How long callbacks held the event loop past the debug threshold.",
+            buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+        )
+        self._loop = None
+        self._thread_id = None
+        self._beat = None
+        self._stack = None  # Taken by the watchdog for the current stall
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._watchdog = None
+        self._heartbeat = None
+
+    def start(self):
+        """Starts watching the running loop."""
+        self._loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._heartbeat = self._loop.call_later(self.interval, self._on_heartbeat)
+        self._watchdog = threading.Thread(target=self._watch, name=f"{self.process}-loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Reporting callbacks that hold the {self.process} event loop for more than {self.threshold * 1000:.0f} ms")
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+
+    def _on_heartbeat(self):
+        now = time.monotonic()
+        with self._lock:
+            late = now - self._beat - self.interval
+            stack, self._stack = self._stack, None
+            self._beat = now
+        if late >= self.threshold:
+            self._record(LoopStall(now - late, late, stack or traceback.StackSummary()))
+        if not self._stopped.is_set():
+            self._heartbeat = self._loop.call_later(self.interval, self._on_heartbeat)
+
+    def _record(self, stall):
+        self.stalls.append(stall)
+        self._stall_count.inc(location=stall.location)
+        self._stall_duration.observe(stall.duration)
+        logger.warning(
+            f"{self.process} event loop held for {stall.duration * 1000:.0f} ms at {stall.location}:\n"
+            f"{''.join(stall.stack.format())}"
+        )
+
+    def _watch(self):
+        hung_reported = None
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                beat, taken = self._beat, self._stack is not None
+            late = time.monotonic() - beat - self.interval
+            if late < self.threshold:
+                continue
+            if not taken:
+                frame = sys._current_frames().get(self._thread_id)
+                if frame is None:
+                    continue
+                stack = traceback.extract_stack(frame)
+                with self._lock:
+                    if self._beat == beat:  # Still the same stall
+                        self._stack = stack
+            elif late >= LOOP_HUNG_AFTER and hung_reported != beat:
+                hung_reported = beat
+                with self._lock:
+                    stack = self._stack
+                if stack is not None:
+                    logger.error(
+                        f"{self.process} event loop held for {late:.1f} s and counting at {LoopStall(beat, late, stack).location}:\n"
+                        f"{''.join(stack.format())}"
+                    )
+
+    def summary(self):
+        """Stalls by location, the longest first, for reports."""
+        locations = {}
+        for stall in self.stalls:
+            entry = locations.setdefault(stall.location, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "stack": "".join(stall.stack.format())})
+            entry["count"] += 1
+            entry["total_ms"] += stall.duration * 1000
+            entry["max_ms"] = max(entry["max_ms"], stall.duration * 1000)
+        return dict(sorted(locations.items(), key=lambda item: item[1]["max_ms"], reverse=True))
+
+
+def start_debug_loop_monitor(process):
+    """Starts a BlockingDetector on the running loop when GPT_HOME_DEBUG_LOOP is set, returns it or None."""
+    threshold = debug_loop_threshold()
+    if threshold is None:
+        return None
+    return BlockingDetector(process, threshold=threshold).start()
@@ -0,0 +1,220 @@
+import asyncio
+import contextlib
+import math
+import os
+import threading
+import time
+import traceback
+from pathlib import Path
+
+from config import logger
+
+# Shared with the backend, which runs as another process
+METRICS_EXPORT_PATH = Path("/dev/shm" if os.path.isdir("/dev/shm") else "/tmp") / "gpt-home-metrics.prom"
+METRICS_EXPORT_INTERVAL = 5  # Seconds between exports of the assistant's metrics
+METRICS_STALE_AFTER = 60  # An export older than this is from a stopped assistant
+LOOP_LAG_INTERVAL = 0.5  # Seconds between event-loop lag samples
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        unknown = set(labels) - set(self.label_names)
+        if unknown:
+            raise ValueError(f"Unknown labels for {self.name}: {', '.join(sorted(unknown))}")
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def value(self, **labels):
+        """The current value for these labels, None when never recorded."""
+        with self._lock:
+            return self._values.get(self._key(labels))
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self, key, value):
+        counts, total = value
+        samples = [
+            f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', _format_value(bound))])} {count}"
+            for bound, count in zip(self.buckets, counts)
+        ]
+        samples.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+        samples.append(f"{self.name}_count{_format_labels(self.label_names, key)} {counts[-1]}")
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Metrics of one process, rendered in the Prometheus text format.
+
+    The assistant and the backend are separate programs: the assistant
+    writes its metrics to a shared-memory file every few seconds, and the
+    backend's /metrics serves that file along with its own.
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._exporter = None
+
+    def _get(self, cls, name, help, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name} is already registered as a {metric.type}")
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._get(Counter, name, help, labels=labels)
+
+    def gauge(self, name, help, labels=()):
+        return self._get(Gauge, name, help, labels=labels)
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help, labels=labels, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+    ## Export ##
+
+    def write(self, path=METRICS_EXPORT_PATH):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def start_export(self, path=METRICS_EXPORT_PATH, interval=METRICS_EXPORT_INTERVAL):
+        if self._exporter is not None and self._exporter.is_alive():
+            return
+        self._exporter = threading.Thread(target=self._export_loop, args=(path, interval), name="metrics-exporter", daemon=True)
+        self._exporter.start()
+
+    def _export_loop(self, path, interval):
+        while True:
+            try:
+                self.write(path)
+            except Exception as e:
+                logger.warning(f"Failed to export metrics: {e}")
+                logger.debug(f"Failed to export metrics: {traceback.format_exc()}")
+            time.sleep(interval)
+
+
+def load_exported_metrics(path=METRICS_EXPORT_PATH):
+    """The assistant's latest export, for the backend. Empty once it's stale."""
+    try:
+        if time.time() - os.path.getmtime(path) > METRICS_STALE_AFTER:
+            return ""
+        with open(path, "r") as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
+
+
+async def monitor_loop_lag(registry, process, interval=LOOP_LAG_INTERVAL):
+    """
+    Samples how late the event loop wakes up from a sleep. Anything blocking
+    the loop (synchronous I/O, heavy CPU work) shows up as lag.
+    """
+    # Named per process, both end up on the backend's /metrics
+    lag_gauge = registry.gauge(f"gpt_home_{process}_event_loop_lag_seconds", "Latest event-loop wake-up delay.")
+    lag_histogram = registry.histogram(
+        f"gpt_home_{process}_event_loop_lag_distribution_seconds", "Event-loop wake-up delays.",
+        buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+    )
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        lag_gauge.set(lag)
+        lag_histogram.observe(lag)
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import os
+import time
+import traceback
+
+import httpx
+
+from config import logger, SOURCE_DIR
+
+MODEL_CATALOG_URL = "https://raw.githubusercontent.com/BerriAI/litellm/main/model_prices_and_context_window.json"
+MODEL_CATALOG_CACHE_PATH = SOURCE_DIR / "model_catalog.json"
+MODEL_CATALOG_TTL = 24 * 60 * 60  # Refresh the catalog once a day
+MODEL_CATALOG_RETRY = 15 * 60  # Retry sooner when offline or GitHub fails
+NOT_A_MODEL = {"sample_spec"}
+
+
+class ModelCatalog:
+    """
+    The list of models LiteLLM supports, served from memory.
+
+    It's loaded from the on-disk cache (or LiteLLM's bundled model map when
+    there is none) and refreshed in the background with conditional
+    requests, so the catalog is only downloaded again when it changed.
+    """
+    def __init__(self, url=MODEL_CATALOG_URL, cache_path=MODEL_CATALOG_CACHE_PATH, ttl=MODEL_CATALOG_TTL):
+        self.url = url
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self._models = frozenset()
+        self._sorted_models = []
+        self._etag = None
+        self._fetched_at = 0
+        self._refresh_task = None
+
+    def __contains__(self, model_id):
+        return model_id in self._models
+
+    def models(self):
+        return self._sorted_models
+
+    def is_stale(self):
+        return time.time() - self._fetched_at > self.ttl
+
+    @staticmethod
+    def _bundled_models():
+        # LiteLLM takes seconds to import, only pay for it without a cache
+        import litellm
+        return litellm.model_cost.keys()
+
+    def load(self):
+        try:
+            with open(self.cache_path, "r") as f:
+                cache = json.load(f)
+            self._set_models(cache["models"])
+            self._etag = cache.get("etag")
+            self._fetched_at = cache.get("fetched_at", 0)
+            logger.debug(f"Loaded {len(self._models)} models from {self.cache_path}")
+        except FileNotFoundError:
+            self._set_models(ModelCatalog._bundled_models())
+            logger.debug(f"No model catalog cache, using LiteLLM's bundled model map ({len(self._models)} models)")
+        except Exception as e:
+            self._set_models(ModelCatalog._bundled_models())
+            logger.warning(f"Model catalog cache unreadable, using LiteLLM's bundled model map: {e}")
+
+    def start(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+
+    async def refresh(self):
+        headers = {"If-None-Match": self._etag} if self._etag else {}
+        async with httpx.AsyncClient(timeout=10) as client:
+            response = await client.get(self.url, headers=headers)
+
+        if response.status_code == 304:
+            logger.debug("Model catalog unchanged")
+        else:
+            response.raise_for_status()
+            self._set_models(response.json().keys())
+            self._etag = response.headers.get("ETag")
+            logger.info(f"Model catalog updated, {len(self._models)} models available")
+        self._fetched_at = time.time()
+        await asyncio.to_thread(self._save)
+
+    async def _refresh_loop(self):
+        while True:
+            delay = max(0, self._fetched_at + self.ttl - time.time())
+            if delay:
+                await asyncio.sleep(delay)
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Failed to refresh the model catalog, retrying in {MODEL_CATALOG_RETRY // 60} minutes: {e}")
+                logger.debug(f"Failed to refresh the model catalog: {traceback.format_exc()}")
+                await asyncio.sleep(MODEL_CATALOG_RETRY)
+
+    def _set_models(self, model_ids):
+        self._models = frozenset(model_ids) - NOT_A_MODEL
+        self._sorted_models = sorted(self._models)
+
+    def _save(self):
+        tmp_path = self.cache_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"etag": self._etag, "fetched_at": self._fetched_at, "models": self._sorted_models}, f)
+        os.replace(tmp_path, self.cache_path)
+
+
+model_catalog = ModelCatalog()
@@ -0,0 +1,205 @@
+import asyncio
+import os
+import time
+import traceback
+from urllib.parse import urlparse
+
+from config import logger, load_settings
+from metrics import metrics
+
+NETWORK_PROBE_INTERVAL = 30  # Seconds between probes while online
+NETWORK_PROBE_INTERVAL_OFFLINE = 5  # Probe more often to notice the network coming back
+NETWORK_PROBE_TIMEOUT = 3
+# host:port pairs, the internet is up when any of them accepts a connection.
+# Overridable with "network_probe_endpoints" in settings.json
+DEFAULT_PROBE_ENDPOINTS = ["www.google.com:443", "1.1.1.1:443", "8.8.8.8:53"]
+# API hosts of the providers LiteLLM routes to by model prefix
+LLM_PROVIDER_HOSTS = {
+    "openai": "api.openai.com",
+    "gpt-": "api.openai.com",
+    "o1": "api.openai.com",
+    "o3": "api.openai.com",
+    "o4": "api.openai.com",
+    "chatgpt": "api.openai.com",
+    "anthropic": "api.anthropic.com",
+    "claude": "api.anthropic.com",
+    "gemini": "generativelanguage.googleapis.com",
+    "groq": "api.groq.com",
+    "mistral": "api.mistral.ai",
+    "cohere": "api.cohere.ai",
+    "command": "api.cohere.ai",
+    "deepseek": "api.deepseek.com",
+    "together_ai": "api.together.xyz",
+    "openrouter": "openrouter.ai",
+    "perplexity": "api.perplexity.ai",
+    "xai": "api.x.ai",
+}
+
+NETWORK_ONLINE = metrics.gauge("gpt_home_network_online", "1 while the probes reach the internet.")
+LLM_REACHABLE = metrics.gauge("gpt_home_llm_reachable", "1 while the LLM provider's host accepts connections.")
+PROBE_DURATION = metrics.histogram(
+    "gpt_home_network_probe_seconds", "Time to connect to each probe endpoint.", labels=("endpoint",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 3)
+)
+PROBE_FAILURES = metrics.counter("gpt_home_network_probe_failures_total", "Probes that couldn't connect, by endpoint.", labels=("endpoint",))
+NETWORK_TRANSITIONS = metrics.counter("gpt_home_network_transitions_total", "Changes between online and offline.", labels=("state",))
+
+
+def parse_endpoint(endpoint, default_port=443):
+    """(host, port) from "host:port", a bare host or a URL."""
+    if "://" in endpoint:
+        url = urlparse(endpoint)
+        return url.hostname, url.port or (443 if url.scheme == "https" else 80)
+    host, separator, port = endpoint.rpartition(":")
+    if not separator:
+        return endpoint, default_port
+    return host, int(port)
+
+
+def llm_endpoint(settings):
+    """The (host, port) the configured model is served from, None when it's unknown."""
+    if settings.get("api_base"):
+        return parse_endpoint(settings["api_base"])
+    model = settings.get("model", "").lower()
+    for prefix, host in LLM_PROVIDER_HOSTS.items():
+        if model.startswith(prefix):
+            # LiteLLM sends OpenAI models to OPENAI_API_BASE when it's set
+            if host == "api.openai.com" and os.getenv("OPENAI_API_BASE"):
+                return parse_endpoint(os.getenv("OPENAI_API_BASE"))
+            return host, 443
+    return None
+
+
+class ConnectivityMonitor:
+    """
+    Knows whether the internet and the LLM provider are reachable, from
+    TCP connections (which resolve the host first) to a few endpoints in
+    the background.
+
+    Probes run on the event loop and never block it. Routes that need the
+    network check `online` or `llm_online` to answer right away during an
+    outage instead of waiting for their requests to time out. Listeners
+    added with `subscribe` are called on each change.
+    """
+    def __init__(self, timeout=NETWORK_PROBE_TIMEOUT):
+        self.timeout = timeout
+        self._online = None
+        self._llm_online = None
+        self._online_event = None
+        self._listeners = []
+        self._probe_task = None
+
+    @property
+    def online(self):
+        # Unknown until the first probe, routes shouldn't give up before then
+        return self._online is not False
+
+    @property
+    def llm_online(self):
+        return self.online and self._llm_online is not False
+
+    def subscribe(self, listener):
+        """`listener(online, llm_online)` is called whenever either changes."""
+        self._listeners.append(listener)
+
+    def endpoints(self):
+        settings = load_settings()
+        return [parse_endpoint(endpoint) for endpoint in settings.get("network_probe_endpoints", DEFAULT_PROBE_ENDPOINTS)]
+
+    ## Probes ##
+
+    async def _connect(self, host, port):
+        """Seconds to connect, None when the endpoint can't be reached."""
+        endpoint = f"{host}:{port}"
+        start = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            PROBE_FAILURES.inc(endpoint=endpoint)
+            logger.debug(f"Network probe to {endpoint} failed: {type(e).__name__} {e}")
+            return None
+        elapsed = time.perf_counter() - start
+        writer.close()
+        PROBE_DURATION.observe(elapsed, endpoint=endpoint)
+        return elapsed
+
+    async def check(self):
+        """Probes now, returns whether the internet is reachable."""
+        endpoints = self.endpoints()
+        llm = llm_endpoint(load_settings())
+        results = await asyncio.gather(*(self._connect(host, port) for host, port in endpoints + ([llm] if llm else [])))
+        online = any(result is not None for result in results[:len(endpoints)])
+        # Without a known host the LLM is assumed reachable with the internet
+        llm_online = results[-1] is not None if llm else online
+        self._update(online, llm_online)
+        return online
+
+    def _update(self, online, llm_online):
+        changed = (online, llm_online) != (self._online, self._llm_online)
+        if online != self._online:
+            NETWORK_TRANSITIONS.inc(state="online" if online else "offline")
+            if online:
+                logger.success("Network is online")
+            else:
+                logger.warning("Network is offline")
+        elif llm_online != self._llm_online:
+            if llm_online:
+                logger.success("LLM provider is reachable")
+            else:
+                logger.warning("LLM provider is unreachable")
+        self._online, self._llm_online = online, llm_online
+        NETWORK_ONLINE.set(int(online))
+        LLM_REACHABLE.set(int(llm_online))
+
+        if self._online_event is None:
+            self._online_event = asyncio.Event()
+        if online:
+            self._online_event.set()
+        else:
+            self._online_event.clear()
+
+        if changed:
+            for listener in self._listeners:
+                try:
+                    listener(online, llm_online)
+                except Exception as e:
+                    logger.warning(f"Network listener failed: {e}")
+                    logger.debug(f"Network listener failed: {traceback.format_exc()}")
+
+    async def wait_online(self, timeout=None):
+        """Waits for the internet, returns False if it's still down after `timeout` seconds."""
+        if self._online:
+            return True
+        if self._online_event is None:
+            self._online_event = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._online_event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    ## Background probing ##
+
+    def start(self):
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.create_task(self._probe_loop())
+
+    async def stop(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+
+    async def _probe_loop(self):
+        while True:
+            try:
+                await self.check()
+            except Exception as e:
+                logger.warning(f"Network probe failed: {e}")
+                logger.debug(f"Network probe failed: {traceback.format_exc()}")
+            await asyncio.sleep(NETWORK_PROBE_INTERVAL if self._online else NETWORK_PROBE_INTERVAL_OFFLINE)
+
+
+network_monitor = ConnectivityMonitor()
@@ -0,0 +1,120 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import logger, load_settings
+from metrics import metrics
+
+ROUTE_THREADS = 4  # Threads for the routes' blocking calls
+
+ROUTE_IN_FLIGHT = metrics.gauge("gpt_home_route_in_flight", "Questions a route is handling.", labels=("route",))
+ROUTE_QUEUED = metrics.gauge("gpt_home_route_queued", "Questions waiting for one of the route's slots.", labels=("route",))
+ROUTE_QUEUE_WAIT = metrics.histogram(
+    "gpt_home_route_queue_wait_seconds", "Time questions waited for a slot, by route.", labels=("route",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 15)
+)
+ROUTE_SATURATION = metrics.gauge("gpt_home_route_saturation", "Share of a route's slots in use.", labels=("route",))
+ROUTE_TIMEOUTS = metrics.counter("gpt_home_route_timeouts_total", "Questions a route didn't answer within its deadline.", labels=("route",))
+ROUTE_THREADS_BUSY = metrics.gauge("gpt_home_route_threads_busy", "Route threads running a blocking call.")
+
+
+class RouteTimeout(Exception):
+    """Raised with a message meant for the user when a route misses its deadline."""
+
+
+class RouteExecutor:
+    """
+    Runs route handlers with a deadline and a concurrency limit per route.
+
+    A route sets `timeout` (seconds, overridable per route with
+    "route_timeouts" in settings.json) and `max_concurrency`. Questions over
+    the limit wait for a slot, and the wait counts towards the deadline. A
+    route that misses it is cancelled and RouteTimeout is raised, so the
+    assistant can answer right away.
+
+    Blocking calls go to a bounded pool of route threads, apart from the
+    default executor speech uses, with run_in_thread(). Routes with
+    `blocking = True` run their whole handler there, on an event loop of
+    its own. A thread can't be interrupted: on timeout the answer is
+    dropped but the call finishes in the background.
+    """
+    def __init__(self, threads=ROUTE_THREADS):
+        self.threads = threads
+        self._semaphores = {}
+        self._loop = None
+        self._pool = None
+        self._threads_busy = 0
+        self._threads_lock = threading.Lock()
+
+    def _semaphore(self, route):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Semaphores belong to a loop, the benchmarks start a new one per run
+            self._loop, self._semaphores = loop, {}
+        name = route.__class__.__name__
+        if name not in self._semaphores:
+            self._semaphores[name] = asyncio.Semaphore(route.max_concurrency)
+        return self._semaphores[name]
+
+    @staticmethod
+    def timeout(route):
+        return load_settings().get("route_timeouts", {}).get(route.__class__.__name__, route.timeout)
+
+    async def execute(self, route, text, **kwargs):
+        name = route.__class__.__name__
+        timeout = RouteExecutor.timeout(route)
+        try:
+            return await asyncio.wait_for(self._run(route, text, **kwargs), timeout)
+        except asyncio.TimeoutError:
+            ROUTE_TIMEOUTS.inc(route=name)
+            logger.warning(f"{name} didn't answer within {timeout}s")
+            raise RouteTimeout(route.timeout_answer())
+
+    async def _run(self, route, text, **kwargs):
+        name = route.__class__.__name__
+        semaphore = self._semaphore(route)
+        queued_at = time.perf_counter()
+        ROUTE_QUEUED.inc(route=name)
+        try:
+            await semaphore.acquire()
+        finally:
+            ROUTE_QUEUED.dec(route=name)
+        ROUTE_QUEUE_WAIT.observe(time.perf_counter() - queued_at, route=name)
+
+        ROUTE_IN_FLIGHT.inc(route=name)
+        ROUTE_SATURATION.set(ROUTE_IN_FLIGHT.value(route=name) / route.max_concurrency, route=name)
+        try:
+            return await route.run(text, **kwargs)
+        finally:
+            ROUTE_IN_FLIGHT.dec(route=name)
+            ROUTE_SATURATION.set(ROUTE_IN_FLIGHT.value(route=name) / route.max_concurrency, route=name)
+            semaphore.release()
+
+    def _count_busy(self, delta):
+        with self._threads_lock:
+            self._threads_busy += delta
+            ROUTE_THREADS_BUSY.set(self._threads_busy)
+
+    async def run_in_thread(self, func, *args, **kwargs):
+        """Runs the blocking call in a route thread, with the caller's context."""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="route")
+        context = contextvars.copy_context()
+
+        def run():
+            self._count_busy(1)
+            try:
+                return context.run(func, *args, **kwargs)
+            finally:
+                self._count_busy(-1)
+
+        return await asyncio.get_running_loop().run_in_executor(self._pool, run)
+
+    async def run_blocking(self, coroutine_function, *args, **kwargs):
+        """Runs the coroutine on its own event loop in a route thread."""
+        return await self.run_in_thread(lambda: asyncio.run(coroutine_function(*args, **kwargs)))
+
+
+route_executor = RouteExecutor()
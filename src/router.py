@@ -1,12 +1,21 @@
 import logging
 from config import logger
+from metrics import metrics
+from tracing import tracer
 
-from routes import routes_dict, GeneralRoute # import all routes from the package
+from routes import routes_dict # route specs, their modules are loaded on first use
 
 from semantic_router.layer import RouteLayer
 import semantic_router.encoders as encoders
 from semantic_router.encoders import HuggingFaceEncoder
 
+ROUTE_RESOLUTIONS = metrics.counter("gpt_home_route_resolutions_total", "Questions resolved to each route.", labels=("route",))
+ROUTE_RESOLVE_FAILURES = metrics.counter("gpt_home_route_resolve_failures_total", "Questions no route matched, answered by the LLM.")
+ROUTE_RESOLVE_DURATION = metrics.histogram("gpt_home_route_resolve_seconds", "Time to resolve a question's route.")
+ROUTE_FAST_PATH = metrics.counter("gpt_home_route_fast_path_total", "Questions resolved by a route's patterns, without the encoder.", labels=("route",))
+
+FALLBACK_ROUTE = "GeneralRoute"
+
 class Router:
     encoder = None
     route_layer = None
@@ -19,7 +28,7 @@ class Router:
         self._initEncoder(encoderModelName)
         
         # Initialize RouteLayer with the encoder and routes
-        available_routes = [r.route() for c, r in routes_dict.items()]
+        available_routes = [spec.route() for spec in routes_dict.values()]
         logger.debug(f"Routes available: {available_routes}")
 
         print(self.encoder)
@@ -49,21 +58,45 @@ class Router:
         return self.encoder is not None and self.route_layer is not None
     
     def resolveRoute(self, text):
+        """
+        The RouteSpec for the text. Its module may not be imported yet, load it
+        off the loop (see AssistantApp._respond).
+        """
         if not self.isReady():
             raise ValueError("Router is not ready. Encoder or route layer is not initialized.")
 
-        try:
-            r = self.route_layer(text)
-            if r is None:
-                raise ValueError("No route found for the given text.")
-    
-            logger.info(f"Resolved route: {r}, {self.routes_dict[r.name]}")
-            
-        except Exception as e:
-            logger.error(f"Error resolving text, defaulting to GenericLLM: {e}")
-            return GeneralRoute()
+        with tracer.span("route_resolve") as span, ROUTE_RESOLVE_DURATION.time():
+            spec = self._match_patterns(text)
+            if spec is not None:
+                logger.info(f"Resolved route by pattern: {spec.name}")
+                span.attributes["route"] = spec.name
+                span.attributes["fast_path"] = True
+                ROUTE_FAST_PATH.inc(route=spec.name)
+                ROUTE_RESOLUTIONS.inc(route=spec.name)
+                return spec
+
+            try:
+                r = self.route_layer(text)
+                if r is None:
+                    raise ValueError("No route found for the given text.")
+        
+                logger.info(f"Resolved route: {r}, {self.routes_dict[r.name]}")
+                
+            except Exception as e:
+                logger.error(f"Error resolving text, defaulting to GenericLLM: {e}")
+                span.attributes["route"] = FALLBACK_ROUTE
+                ROUTE_RESOLVE_FAILURES.inc()
+                ROUTE_RESOLUTIONS.inc(route=FALLBACK_ROUTE)
+                return self.routes_dict[FALLBACK_ROUTE]
+
+            span.attributes["route"] = r.name
+            ROUTE_RESOLUTIONS.inc(route=r.name)
+            return self.routes_dict[r.name]
 
-        return self.routes_dict[r.name]()
+    def _match_patterns(self, text):
+        """The one route whose fast-path patterns match, None when none or several do."""
+        matches = [spec for spec in self.routes_dict.values() if spec.matches(text)]
+        return matches[0] if len(matches) == 1 else None
 
 class AssistantRouter(Router):
     def __init__(self, encoderModelName):
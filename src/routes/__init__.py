@@ -1,26 +1,9 @@
-import importlib
-import inspect
-import pkgutil
-import sys
-
 from .base import AssistantRoute
+from .manifest import ROUTES, RouteSpec
 
-# --- Auto-discover route classes ---
-__all__ = []
-routes_dict = {}
-
-for _, module_name, _ in pkgutil.iter_modules(__path__):
-    if module_name in ("__init__"):
-        continue
-
-    module = importlib.import_module(f"{__name__}.{module_name}")
-    for name, cls in inspect.getmembers(module, inspect.isclass):
-        if issubclass(cls, AssistantRoute):
-            setattr(sys.modules[__name__], name, cls)
-            __all__.append(name)
-
-            if cls is not AssistantRoute:
-                routes_dict[name] = cls
+# --- Route registry ---
+# Route modules are only imported when first dispatched to or warmed up,
+# see RouteSpec.load
+routes_dict = {spec.name: spec for spec in ROUTES}
 
-routes = [cls for _, cls in routes_dict.items() if cls is not AssistantRoute]
-__all__ = list(set(__all__))
\ No newline at end of file
+__all__ = ["AssistantRoute", "RouteSpec", "ROUTES", "routes_dict"]
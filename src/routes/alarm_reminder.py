@@ -10,16 +10,10 @@ import subprocess
 from .base import AssistantRoute
 
 class AlarmRoute(AssistantRoute):
+    blocking = True  # Converting number words is slow
+    timeout = 5
     alarms = {}
 
-    @classmethod
-    def utterances(cls):
-        return [
-            "set an alarm",
-            "wake me up",
-            "remind me in"
-        ]
-
     async def handle(self, text, **kwargs):
         converter = text2digits.Text2Digits()
         text = converter.convert(text)
@@ -1,29 +1,87 @@
-from semantic_router import Route
+import contextvars
+
+from conversation import conversation
+from metrics import metrics
+from network import network_monitor
+from route_executor import route_executor
+from tracing import tracer
+
+ROUTE_REQUESTS = metrics.counter("gpt_home_route_requests_total", "Questions handled, by route.", labels=("route",))
+ROUTE_ERRORS = metrics.counter("gpt_home_route_errors_total", "Questions a route failed to answer, by route and error.", labels=("route", "error"))
+ROUTE_DURATION = metrics.histogram("gpt_home_route_duration_seconds", "Time to answer a question, by route.", labels=("route",))
+# Errors recorded while answering the current question, its error answers aren't kept in the conversation
+_question_errors = contextvars.ContextVar("question_errors", default=None)
 
 class AssistantRoute:
     """
     Base class for all assistant routes.
-    Each route should define its own utterances.
+    Each route's utterances are declared in routes/manifest.py.
     """
+    # Routes that need the internet answer right away while it's down
+    # instead of waiting for their requests to time out
+    requires_network = False
+    # Seconds before the assistant gives up on an answer, and questions
+    # the route handles at once (see route_executor.py)
+    timeout = 15
+    max_concurrency = 2
+    # Routes whose handler blocks run it in a route thread, off the loop
+    blocking = False
+
     def __init__(self, *args, **kwargs):
         self.args = args
         self.kwargs = kwargs
 
     @classmethod
-    def route(cls):
-        return Route(
-            name=cls.__name__,
-            utterances=cls.utterances()
-        )
+    async def warmup(cls):
+        """
+        Called in the background once the assistant is up, for routes to open
+        connections or resolve data ahead of the first question.
+        """
+        pass
+
+    @classmethod
+    def network_available(cls):
+        return network_monitor.online
+
+    async def offline_answer(self, text):
+        return "I can't reach the internet right now, please try again later."
+
+    def timeout_answer(self):
+        return "Sorry, that's taking too long. Please try again in a moment."
 
     @classmethod
-    def utterances(cls):
-        return [
-                "schedule a meeting",
-                "what's on my calendar",
-                "add an event",
-                "what is left to do today"
-            ]
+    def record_error(cls, error):
+        """For routes that answer their own errors instead of raising them."""
+        ROUTE_ERRORS.inc(route=cls.__name__, error=type(error).__name__)
+        errors = _question_errors.get()
+        if errors is not None:
+            errors.append(error)
+
+    async def run(self, text, **kwargs):
+        """Handles the question, timed and counted per route."""
+        route = self.__class__.__name__
+        ROUTE_REQUESTS.inc(route=route)
+        with tracer.span("handler", route=route) as span, ROUTE_DURATION.time(route=route):
+            if self.requires_network and not self.network_available():
+                span.attributes["offline"] = True
+                ROUTE_ERRORS.inc(route=route, error="Offline")
+                return await self.offline_answer(text)
+            errors = []
+            token = _question_errors.set(errors)
+            try:
+                if self.blocking:
+                    answer = await route_executor.run_blocking(self.handle, text, **kwargs)
+                else:
+                    answer = await self.handle(text, **kwargs)
+            except Exception as e:
+                self.record_error(e)
+                raise
+            finally:
+                _question_errors.reset(token)
+            if isinstance(answer, str) and answer and not errors:
+                # Whichever route answered, follow-up questions to the LLM can refer to it
+                conversation.record(text, answer)
+            return answer
 
     async def handle(self, text, **kwargs):
         raise NotImplementedError("Subclasses must implement this method.")
\ No newline at end of file
@@ -1,37 +1,27 @@
 import caldav
-from caldav.elements import dav, cdav
 from datetime import datetime, timedelta
-import os
 import re
 
+from calendar_service import calendar_service, CalendarUnavailable
+from route_executor import route_executor
+
 from .base import AssistantRoute
 
 class CalendarRoute(AssistantRoute):
-    @classmethod
-    def utterances(self):
-        return [
-            "schedule a meeting",
-            "what's on my calendar",
-            "add an event",
-            "what is left to do today"
-        ]
+    timeout = 20  # The first question waits for a sync
+    max_concurrency = 1
 
-    async def handle(self, text, **kwargs):
-        url = os.getenv('CALDAV_URL')
-        username = os.getenv('CALDAV_USERNAME')
-        password = os.getenv('CALDAV_PASSWORD')
+    def timeout_answer(self):
+        return "Your calendar server is taking too long to answer, please try again later."
 
-        if not url or not username or not password:
-            return "CalDAV server credentials are not properly set in environment variables."
+    @classmethod
+    async def warmup(cls):
+        calendar_service.start()
 
+    async def handle(self, text, **kwargs):
         try:
-            client = caldav.DAVClient(url, username=username, password=password)
-            principal = client.principal()
-            calendars = principal.calendars()
-            if not calendars:
-                return "No calendars found."
-
-            calendar = calendars[0]  # Use the first found calendar
+            # Reads are served from the local mirror, only the first question waits for a sync
+            await route_executor.run_in_thread(calendar_service.ensure_synced)
 
             task_create_match = re.search(r'\b(?:add|create)\s+a?\s+task\s+called\s+(.+)', text, re.IGNORECASE)
             task_delete_match = re.search(r'\b(?:delete|remove)\s+(a )?task\s+called\s+(\w+)', text, re.IGNORECASE)
@@ -41,54 +31,33 @@ class CalendarRoute(AssistantRoute):
 
             if task_create_match:
                 task_name = task_create_match.group(1).strip()
-                task = calendar.add_todo(f"""BEGIN:VCALENDAR
-VERSION:2.0
-BEGIN:VTODO
-SUMMARY:{task_name}
-STATUS:NEEDS-ACTION
-END:VTODO
-END:VCALENDAR
-""")
+                await route_executor.run_in_thread(calendar_service.add_todo, task_name)
                 return f"Task '{task_name}' created successfully."
 
             elif task_update_match:
                 task_name = task_update_match.group(2)
                 new_task_name = task_update_match.group(3)
-                tasks = calendar.todos()
-                for task in tasks:
-                    if task_name.lower() in task.instance.vtodo.summary.value.lower():
-                        task.instance.vtodo.summary.value = new_task_name
-                        task.save()
-                        return f"Task '{task_name}' updated to '{new_task_name}' successfully."
+                task = calendar_service.find("todo", task_name)
+                if task is not None:
+                    await route_executor.run_in_thread(calendar_service.update, task, summary=new_task_name)
+                    return f"Task '{task_name}' updated to '{new_task_name}' successfully."
 
             elif task_delete_match:
-                task_name = task_delete_match.group(1)
-                tasks = calendar.todos()
-                for task in tasks:
-                    if task_name.lower() in task.instance.vtodo.summary.value.lower():
-                        task.delete()
-                        return f"Task '{task_name}' deleted successfully."
+                task_name = task_delete_match.group(2)
+                task = calendar_service.find("todo", task_name)
+                if task is not None:
+                    await route_executor.run_in_thread(calendar_service.delete, task)
+                    return f"Task '{task_name}' deleted successfully."
 
             if tasks_query_match:
-                tasks = calendar.todos()
-                pending_task_details = []
-                for task in tasks:
-                    if task.vobject_instance.vtodo.status.value != "COMPLETED":
-                        summary = task.vobject_instance.vtodo.summary.value
-                        status = task.vobject_instance.vtodo.status.value
-                        pending_task_details.append(f"'{summary}' (Status: {status})")
+                pending_task_details = [f"'{task.summary}' (Status: {task.status})" for task in calendar_service.todos()]
                 if pending_task_details:
                     return "Your pending tasks are: " + ", ".join(pending_task_details)
                 else:
                     return "You have no pending tasks."
 
             elif completed_tasks_query_match:
-                tasks = calendar.todos()
-                completed_task_details = []
-                for task in tasks:
-                    if task.vobject_instance.vtodo.status.value == "COMPLETED":
-                        summary = task.vobject_instance.vtodo.summary.value
-                        completed_task_details.append(f"'{summary}'")
+                completed_task_details = [f"'{task.summary}'" for task in calendar_service.todos(completed=True)]
                 if completed_task_details:
                     return "Your completed tasks are: " + ", ".join(completed_task_details)
                 else:
@@ -101,74 +70,60 @@ END:VCALENDAR
             calendar_query_match = re.search(r"\bwhat'? ?i?s\s+on\s+my\s+calendar\b", text, re.IGNORECASE)
 
             if create_match:
-                event_name = create_match.group(1)
-                event_time = datetime.strptime(f"{create_match.group(2)} {create_match.group(3)}", "%Y-%m-%d %H:%M")
-                event_start = event_time.strftime("%Y%m%dT%H%M%S")
-                event_end = (event_time + timedelta(hours=1)).strftime("%Y%m%dT%H%M%S")  # Assuming 1 hour duration
-
-                event = calendar.add_event(f"""
-BEGIN:VCALENDAR
-VERSION:2.0
-BEGIN:VEVENT
-SUMMARY:{event_name}
-DTSTART:{event_start}
-DTEND:{event_end}
-END:VEVENT
-END:VCALENDAR
-""")
+                event_name = create_match.group(2)
+                event_time = datetime.strptime(f"{create_match.group(3)} {create_match.group(4)}", "%Y-%m-%d %H:%M")
+                await route_executor.run_in_thread(calendar_service.add_event, event_name, event_time)  # Assuming 1 hour duration
                 return f"Event '{event_name}' created successfully."
 
             elif update_match:
                 event_name = update_match.group(2)
                 new_event_name = update_match.group(3)
                 event_time = datetime.strptime(f"{update_match.group(4)} {update_match.group(5)}", "%Y-%m-%d %H:%M")
-                event_start = event_time.strftime("%Y%m%dT%H%M%S")
-                event_end = (event_time + timedelta(hours=1)).strftime("%Y%m%dT%H%M%S")  # Assuming 1 hour duration
-
-                events = calendar.search(start=datetime.now(), end=datetime.now() + timedelta(days=365), event=True, expand=True)  # Search within the next year
-                for event in events:
-                    if event_name.lower() in event.instance.vevent.summary.value.lower():
-                        event.instance.vevent.summary.value = new_event_name
-                        event.instance.vevent.dtstart.value = event_start
-                        event.instance.vevent.dtend.value = event_end
-                        event.save()
-                        return f"Event '{event_name}' updated to '{new_event_name}' successfully."
+                event = calendar_service.find("event", event_name)
+                if event is not None:
+                    await route_executor.run_in_thread(calendar_service.update, event, summary=new_event_name, start=event_time)
+                    return f"Event '{event_name}' updated to '{new_event_name}' successfully."
 
             elif delete_match:
-                event_name = delete_match.group(1)
-                events = calendar.search(start=datetime.now(), end=datetime.now() + timedelta(days=365), event=True, expand=True)  # Search within the next year
-                for event in events:
-                    if event_name.lower() in event.instance.vevent.summary.value.lower():
-                        event.delete()
-                        return f"Event '{event_name}' deleted successfully."
+                event_name = delete_match.group(2)
+                event = calendar_service.find("event", event_name)
+                if event is not None:
+                    await route_executor.run_in_thread(calendar_service.delete, event)
+                    return f"Event '{event_name}' deleted successfully."
 
             elif next_event_match:
-                events = calendar.search(start=datetime.now(), end=datetime.now() + timedelta(days=30), event=True, expand=True)  # Next 30 days
-                if events:
-                    next_event = events[0]
-                    summary = next_event.vobject_instance.vevent.summary.value
-                    start_time = next_event.vobject_instance.vevent.dtstart.value
-                    return f"Your next event is '{summary}' on {start_time.strftime('%A, %B %d at %I:%M %p').replace(' 0', ' ')}"
+                next_event = calendar_service.next_event()
+                if next_event:
+                    start_time, event = next_event
+                    return f"Your next event is '{event.summary}' on {start_time.strftime('%A, %B %d at %I:%M %p').replace(' 0', ' ')}"
                 else:
                     return "No upcoming events found."
 
             elif calendar_query_match:
-                events = calendar.search(start=datetime.now(), end=datetime.now() + timedelta(days=30), event=True, expand=True)  # Next 30 days
+                events = calendar_service.events(datetime.now(), datetime.now() + timedelta(days=30))  # Next 30 days
                 if events:
                     event_details = []
-                    for event in events:
-                        summary = event.vobject_instance.vevent.summary.value
-                        start_time = event.vobject_instance.vevent.dtstart.value
+                    for start_time, event in events:
                         formatted_start_time = start_time.strftime('%A, %B %d at %I:%M %p').replace(' 0', ' ')
-                        event_details.append(f"'{summary}' on {formatted_start_time}")
+                        event_details.append(f"'{event.summary}' on {formatted_start_time}")
                     return "Your upcoming events are: " + ", ".join(event_details)
                 else:
                     return "No events on your calendar for the next 30 days."
-        except caldav.lib.error.AuthorizationError:
+        except CalendarUnavailable as e:
+            CalendarRoute.record_error(e)
+            return str(e)
+        except caldav.lib.error.AuthorizationError as e:
+            CalendarRoute.record_error(e)
             return "Authorization failure: Please check your username and password."
-        except caldav.lib.error.NotFoundError:
+        except caldav.lib.error.NotFoundError as e:
+            CalendarRoute.record_error(e)
             return "Resource not found: Check the specified CalDAV URL."
+        except OSError as e:
+            # Connection errors, questions are answered from the last sync but changes need the server
+            CalendarRoute.record_error(e)
+            return "I can't reach your calendar server right now, please try again later."
         except Exception as e:
+            CalendarRoute.record_error(e)
             return f"An unexpected error occurred: {str(e)}"
 
-        return "No valid CalDAV command found."
\ No newline at end of file
+        return "No valid CalDAV command found."
@@ -0,0 +1,21 @@
+from datetime import datetime
+import re
+
+from .base import AssistantRoute
+
+DATE_PATTERN = re.compile(r"\b(date|day|today)\b", re.IGNORECASE)
+ELSEWHERE_PATTERN = re.compile(r"\bin\s+\w+", re.IGNORECASE)
+
+class ClockRoute(AssistantRoute):
+    """Answers the time and date from the system clock, the LLM doesn't know them and it works offline."""
+
+    async def handle(self, text, **kwargs):
+        if ELSEWHERE_PATTERN.search(text):
+            # The time somewhere else needs the time zone, left to the LLM
+            from .general import GeneralRoute
+            return await GeneralRoute().handle(f"It is {datetime.now().astimezone().isoformat()} here. {text}", history=False)
+
+        now = datetime.now()
+        if DATE_PATTERN.search(text):
+            return f"Today is {now.strftime('%A, %B %d, %Y').replace(' 0', ' ')}."
+        return f"It is {now.strftime('%I:%M %p').lstrip('0')}."
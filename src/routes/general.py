@@ -1,29 +1,102 @@
-
 import asyncio
 import litellm
-from litellm import completion, check_valid_key
+from litellm import acompletion, check_valid_key
+import time
 import traceback
 
 from config import logger, load_settings
+from conversation import conversation, CONVERSATION_TOKEN_BUDGET
+from metrics import metrics
+from network import network_monitor
+from tracing import tracer
 
 from .base import AssistantRoute
 
+LLM_SLOW_AFTER = 8  # Seconds of average provider latency before answering locally
+LLM_LATENCY_SMOOTHING = 0.3  # Weight of the latest request in the latency average
+LLM_REMOTE_RETRY = 60  # Seconds between tries of a degraded provider
+LLM_REMOTE_TIMEOUT = 10  # Per request, when a local model can answer instead
+LLM_LOCAL_MODEL = "openai/local"  # llama.cpp's server speaks the OpenAI API
+SUMMARY_MAX_TOKENS = 200
+
+LLM_DURATION = metrics.histogram("gpt_home_llm_request_seconds", "LLM completion latency, by model.", labels=("model",))
+LLM_ERRORS = metrics.counter("gpt_home_llm_errors_total", "Failed LLM completions, by model and error.", labels=("model", "error"))
+LLM_ANSWERS = metrics.counter("gpt_home_llm_answers_total", "Questions answered by the provider or the local model.", labels=("path",))
+LLM_LATENCY_AVERAGE = metrics.gauge("gpt_home_llm_provider_latency_average_seconds", "Moving average of the provider's completion latency.")
+
+# Set when the route is first loaded rather than in config, which every process imports
+litellm.api_key = load_settings()["litellm_api_key"]
+
+
+class ProviderHealth:
+    """
+    Moving average of the LLM provider's latency and its consecutive
+    failures. While it's slow or failing, questions go to the local model,
+    and the provider is tried again every LLM_REMOTE_RETRY seconds since
+    its latency is only measured on requests.
+    """
+    def __init__(self, slow_after=LLM_SLOW_AFTER, smoothing=LLM_LATENCY_SMOOTHING, retry_after=LLM_REMOTE_RETRY):
+        self.slow_after = slow_after
+        self.smoothing = smoothing
+        self.retry_after = retry_after
+        self.latency = None
+        self.failures = 0
+        self._tried_at = 0
+
+    @property
+    def degraded(self):
+        return self.failures >= 2 or (self.latency or 0) > self.slow_after
+
+    def should_try(self):
+        return not self.degraded or time.time() - self._tried_at > self.retry_after
+
+    def observe(self, seconds):
+        self._tried_at = time.time()
+        self.latency = seconds if self.latency is None else self.smoothing * seconds + (1 - self.smoothing) * self.latency
+        self.failures = 0
+        LLM_LATENCY_AVERAGE.set(self.latency)
+
+    def fail(self):
+        self._tried_at = time.time()
+        self.failures += 1
+
+
+provider_health = ProviderHealth()
+
+
 class GeneralRoute(AssistantRoute):
+    requires_network = True
+    timeout = 30  # Retries included
 
     @classmethod
-    def utterances(cls):
-        return [
-            "how's it going",
-            "tell me a joke",
-            "what's the time",
-            "how are you",
-            "what is the meaning of life",
-            "what is the capital of France",
-            "what is the difference between Python 2 and Python 3",
-            "what is the best programming language",
-            "who was the first president of the United States",
-            "what is the largest mammal"
-        ]
+    def network_available(cls):
+        return network_monitor.llm_online or GeneralRoute.local_model() is not None
+
+    async def offline_answer(self, text):
+        return "I can't reach the language model right now, please try again later."
+
+    def timeout_answer(self):
+        return "Sorry, the language model is taking too long to answer. Please try again."
+
+    @staticmethod
+    def local_model(settings=None):
+        """
+        The llama.cpp-compatible server set with "local_llm_api_base" (and
+        optionally "local_llm_model"), None without one or when "llm_mode"
+        is "remote".
+        """
+        settings = load_settings() if settings is None else settings
+        if not settings.get("local_llm_api_base") or settings.get("llm_mode", "auto") == "remote":
+            return None
+        return {"model": settings.get("local_llm_model", LLM_LOCAL_MODEL), "api_base": settings.get("local_llm_api_base")}
+
+    @staticmethod
+    def answer_locally(settings, local):
+        if local is None:
+            return False
+        if settings.get("llm_mode", "auto") == "local":
+            return True
+        return not network_monitor.llm_online or not provider_health.should_try()
 
     async def handle(self, text, **kwargs):
         # Load settings from settings.json
@@ -33,28 +106,96 @@ class GeneralRoute(AssistantRoute):
         model = settings.get("model")
         retries = 3
 
+        local = GeneralRoute.local_model(settings)
+        use_local = GeneralRoute.answer_locally(settings, local)
+        system_prompt = f"You are a helpful assistant. {settings.get('custom_instructions')}"
+        if kwargs.get("history", True):
+            # Earlier questions and answers, for follow-ups
+            messages = conversation.messages(
+                system_prompt, text, local["model"] if use_local else model, max_tokens,
+                token_budget=settings.get("conversation_token_budget", CONVERSATION_TOKEN_BUDGET)
+            )
+            conversation.summarize_in_background(
+                lambda summary, exchanges: GeneralRoute.summarize(local if use_local else {"model": model}, summary, exchanges)
+            )
+        else:
+            messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": text}]
+
+        if use_local:
+            return await self.complete_locally(local, messages, max_tokens, temperature)
+
         for i in range(retries):
             try:
-                response = completion(
-                    model=model,
-                    messages=[
-                        {"role": "system", "content": f"You are a helpful assistant. {settings.get('custom_instructions')}"},
-                        {"role": "user", "content": f"Human: {text}\nAI:"}
-                    ],
-                    max_tokens=max_tokens,
-                    temperature=temperature,
-                )
+                start = time.perf_counter()
+                with tracer.span("llm", model=model, attempt=i + 1), LLM_DURATION.time(model=model):
+                    response = await acompletion(
+                        model=model,
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        temperature=temperature,
+                        # A slow provider shouldn't hold the answer when the local model can give it
+                        timeout=LLM_REMOTE_TIMEOUT if local is not None else None,
+                    )
+                provider_health.observe(time.perf_counter() - start)
                 response_content = response.choices[0].message.content.strip()
                 if response_content:  # Check if the response is not empty
+                    LLM_ANSWERS.inc(path="remote")
                     return response_content
                 else:
                     logger.warning(f"Retry {i+1}: Received empty response from LLM.")
             except litellm.exceptions.BadRequestError as e:
                 logger.error(traceback.format_exc())
+                LLM_ERRORS.inc(model=model, error=type(e).__name__)
+                GeneralRoute.record_error(e)
                 return f"The API key you provided for `{model}` is not valid. Double check the API key corresponds to the model/provider you are trying to call."
             except Exception as e:
                 logger.error(f"Error on try {i+1}")
                 logger.debug(f"Error on try {i+1}: {e}")
+                LLM_ERRORS.inc(model=model, error=type(e).__name__)
+                provider_health.fail()
+                if local is not None:
+                    logger.warning(f"{model} failed, answering with the local model")
+                    return await self.complete_locally(local, messages, max_tokens, temperature)
                 if i == retries - 1:  # If this was the last retry
+                    GeneralRoute.record_error(e)
                     return f"Something went wrong after {retries} retries. Please try again."
-            await asyncio.sleep(0.5)  # Wait before retrying
\ No newline at end of file
+            await asyncio.sleep(0.5)  # Wait before retrying
+
+    @staticmethod
+    async def summarize(llm, summary, exchanges):
+        """A few sentences covering the earlier summary and the exchanges, from the model answering questions."""
+        transcript = "\n".join(f"User: {exchange.question}\nAssistant: {exchange.answer}" for exchange in exchanges)
+        earlier = f"Summary so far: {summary}\n\n" if summary else ""
+        response = await acompletion(
+            model=llm["model"],
+            api_base=llm.get("api_base"),
+            api_key="local" if llm.get("api_base") else None,
+            messages=[{"role": "user", "content": (
+                "Summarize this conversation between a user and their voice assistant in a few sentences. "
+                f"Keep names, facts and anything the user may refer back to.\n\n{earlier}{transcript}"
+            )}],
+            max_tokens=SUMMARY_MAX_TOKENS,
+            temperature=0,
+        )
+        return response.choices[0].message.content.strip()
+
+    async def complete_locally(self, local, messages, max_tokens, temperature):
+        model = local["model"]
+        try:
+            with tracer.span("llm", model=model, local=True), LLM_DURATION.time(model=model):
+                response = await acompletion(
+                    model=model,
+                    api_base=local["api_base"],
+                    api_key="local",  # llama.cpp's server doesn't check it, LiteLLM wants one
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                )
+            LLM_ANSWERS.inc(path="local")
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            logger.error(f"Local model failed: {e}")
+            logger.debug(f"Local model failed: {traceback.format_exc()}")
+            LLM_ERRORS.inc(model=model, error=type(e).__name__)
+            GeneralRoute.record_error(e)
+            return await self.offline_answer(None)
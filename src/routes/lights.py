@@ -1,75 +1,72 @@
-from phue import Bridge
-import os
+import asyncio
 import re
 import traceback
 
 from config import logger
+from hue import hue_bridge
+from light_commands import LightCommandParser
 
 from .base import AssistantRoute
 
 class LightsRoute(AssistantRoute):
+    timeout = 8
+    _parser = None
 
     @classmethod
-    def utterances(cls):
-        return [
-            "turn on the lights",
-            "switch off the lights",
-            "dim the lights",
-            "change the color of the lights",
-            "set the lights to red"
-        ]
+    async def warmup(cls):
+        hue_bridge.start()
+        await cls.parser()
 
-    async def handle(self, text, **kwargs):
-        bridge_ip = os.getenv('PHILIPS_HUE_BRIDGE_IP')
-        username = os.getenv('PHILIPS_HUE_USERNAME')
-        
-        if bridge_ip and username:
-            try:
-                b = Bridge(bridge_ip, username)
-                b.connect()
+    @classmethod
+    async def parser(cls):
+        # Recompiled only when rooms or lights are added, removed or renamed
+        groups, lights = await hue_bridge.groups(), await hue_bridge.lights()
+        if cls._parser is None or cls._parser.topology != LightCommandParser.topology_key(groups, lights):
+            cls._parser = LightCommandParser(groups, lights)
+        return cls._parser
 
-                # Turn on or off all lights
-                on_off_pattern = r'(\b(turn|shut|cut|put)\s)?.*(on|off)\b'
-                match = re.search(on_off_pattern, text, re.IGNORECASE)
-                if match:
-                    if 'on' in match.group(0):
-                        b.set_group(0, 'on', True)
-                        return "Turning on all lights."
-                    else:
-                        b.set_group(0, 'on', False)
-                        return "Turning off all lights."
+    @staticmethod
+    async def describe_state(kind, target_id, name):
+        """Whether the room's (or all) lights, or the light, are on, from the cached bridge state."""
+        if kind == "light":
+            on = (await hue_bridge.lights()).get(target_id, {}).get("state", {}).get("on")
+            return f"The {name} is {'on' if on else 'off'}."
+        on, total = await hue_bridge.lights_on(target_id)
+        if target_id == "0":
+            lights, every_light = "lights", "All lights"
+        else:
+            lights, every_light = f"{name} lights", f"All the {name} lights"
+        if total == 0:
+            return f"There are no lights in the {name}."
+        if on == 0:
+            return f"{every_light} are off."
+        if on == total:
+            return f"{every_light} are on."
+        return f"{on} of {total} {lights} are on."
 
-                # Change light color
-                color_pattern = r'\b(red|green|blue|yellow|purple|orange|pink|white|black)\b'
-                match = re.search(color_pattern, text, re.IGNORECASE)
-                if match:
-                    # convert color to hue value
-                    color = {
-                        'red': 0,
-                        'green': 25500,
-                        'blue': 46920,
-                        'yellow': 12750,
-                        'purple': 56100,
-                        'orange': 6000,
-                        'pink': 56100,  # Closest to purple for hue
-                        'white': 15330,  # Closest to a neutral white
-                    }.get(match.group(1).lower())
-                    b.set_group(0, 'on', True)
-                    b.set_group(0, 'hue', color)
-                    return f"Changing lights {match.group(1)}."
+    async def handle(self, text, **kwargs):
+        # Raises the "no bridge IP" message when the bridge isn't connected
+        hue_bridge.credentials()
 
-                # Change light brightness
-                brightness_pattern = r'(\b(dim|brighten)\b)?.*?\s.*?to\s(\d{1,3})\b'
-                match = re.search(brightness_pattern, text, re.IGNORECASE)
-                if match:
-                    brightness = int(match.group(3))
-                    b.set_group(0, 'on', True)
-                    b.set_group(0, 'bri', brightness)
-                    return f"Setting brightness to {brightness}."
+        try:
+            # Answer state questions from the cached bridge state
+            state_pattern = r'\b(are|is)\b.*\blights?\b.*\b(on|off)\b'
+            match = re.search(state_pattern, text, re.IGNORECASE)
+            if match:
+                targets = (await LightsRoute.parser()).targets(text)
+                return " ".join([await LightsRoute.describe_state(*target) for target in targets])
 
+            command = (await LightsRoute.parser()).parse(text)
+            if command is None:
                 raise Exception("I'm sorry, I don't know how to handle that request.")
-            except Exception as e:
-                logger.error(f"Error: {traceback.format_exc()}")
-                return f"Something went wrong: {e}"
-        
-        raise Exception("No philips hue bridge IP found. Please enter your bridge IP for Phillips Hue in the web interface or try reconnecting the service.")
\ No newline at end of file
+
+            # Every room or light named is updated at once
+            await asyncio.gather(*(
+                hue_bridge.set_group(target_id, **command.state) if kind == "group" else hue_bridge.set_light(target_id, **command.state)
+                for kind, target_id, _ in command.targets
+            ))
+            return command.describe()
+        except Exception as e:
+            logger.error(f"Error: {traceback.format_exc()}")
+            LightsRoute.record_error(e)
+            return f"Something went wrong: {e}"
@@ -0,0 +1,161 @@
+import importlib
+import re
+import time
+
+from config import logger
+from metrics import metrics
+
+ROUTE_IMPORT_DURATION = metrics.gauge("gpt_home_route_import_seconds", "Time it took to import each route's module.", labels=("route",))
+
+
+class RouteSpec:
+    """
+    What the router needs to know about a route without importing it: its
+    name, the example utterances for the encoder and fast-path patterns
+    that pick it without the encoder.
+
+    The route's module, and the client libraries it pulls in, is imported
+    on first dispatch, or ahead of it by the assistant's background warmup.
+    A new route needs an entry in ROUTES below.
+    """
+    def __init__(self, name, module, utterances, patterns=()):
+        self.name = name
+        self.module = module
+        self.utterances = utterances
+        self.patterns = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+        self._route_class = None
+
+    def __repr__(self):
+        return f"RouteSpec({self.name}, loaded={self.loaded})"
+
+    @property
+    def loaded(self):
+        return self._route_class is not None
+
+    def load(self):
+        """The route class, importing its module the first time."""
+        if self._route_class is None:
+            start = time.perf_counter()
+            module = importlib.import_module(f"{__package__}.{self.module}")
+            self._route_class = getattr(module, self.name)
+            elapsed = time.perf_counter() - start
+            ROUTE_IMPORT_DURATION.set(elapsed, route=self.name)
+            logger.debug(f"Loaded route {self.name} in {elapsed * 1000:.0f} ms")
+        return self._route_class
+
+    def matches(self, text):
+        return any(pattern.search(text) for pattern in self.patterns)
+
+    def route(self):
+        # Only the router needs semantic_router, it loads it anyway for the encoder
+        from semantic_router import Route
+        return Route(name=self.name, utterances=self.utterances)
+
+
+# Fast-path patterns only cover phrasings that can't mean anything else,
+# everything else goes through the encoder.
+ROUTES = [
+    RouteSpec(
+        "AlarmRoute", "alarm_reminder",
+        utterances=[
+            "set an alarm",
+            "wake me up",
+            "remind me in"
+        ],
+        patterns=[
+            r"\b(set|create|schedule|delete|remove|cancel|snooze)\s+(an?\s+|the\s+|my\s+)?(alarm|reminder)\b",
+            r"\bwake\s+me\s+up\b",
+            r"\bremind\s+me\b",
+        ],
+    ),
+    RouteSpec(
+        "CalendarRoute", "calendar",
+        utterances=[
+            "schedule a meeting",
+            "what's on my calendar",
+            "add an event",
+            "what is left to do today"
+        ],
+        patterns=[
+            r"\b(calendar|agenda)\b",
+            r"\bmy\s+next\s+(event|appointment)\b",
+            r"\b(add|create|schedule|update|change|modify|delete|remove|cancel)\s+(an?\s+|the\s+)?(task|event|appointment)\s+called\b",
+            r"\b(completed|pending)\s+tasks\b",
+        ],
+    ),
+    RouteSpec(
+        "ClockRoute", "clock",
+        utterances=[
+            "what time is it",
+            "what's the time",
+            "what's the date today",
+            "what day is it"
+        ],
+        patterns=[
+            r"\bwhat\s+time\s+is\s+it\b(?!\s+in\b)",
+            r"\bwhat('?s|\s+is)\s+the\s+(time|date)\b(?!\s+in\b)",
+            r"\bwhat\s+(day|date)\s+is\s+(it|today)\b(?!\s+in\b)",
+        ],
+    ),
+    RouteSpec(
+        "GeneralRoute", "general",
+        utterances=[
+            "how's it going",
+            "tell me a joke",
+            "how are you",
+            "what is the meaning of life",
+            "what is the capital of France",
+            "what is the difference between Python 2 and Python 3",
+            "what is the best programming language",
+            "who was the first president of the United States",
+            "what is the largest mammal"
+        ],
+    ),
+    RouteSpec(
+        "LightsRoute", "lights",
+        utterances=[
+            "turn on the lights",
+            "switch off the lights",
+            "dim the lights",
+            "change the color of the lights",
+            "set the lights to red",
+            "turn off the kitchen and living room"
+        ],
+        patterns=[
+            r"\b(turn|switch|shut)\s+(on|off)\b.*\blights?\b",
+            r"\b(turn|switch|shut)\b.*\blights?\s+(on|off)\b",
+            r"\b(dim|brighten)\s+the\b.*\blights?\b",
+            r"\b(are|is)\b.*\blights?\b.*\b(on|off)\b",
+        ],
+    ),
+    RouteSpec(
+        "SpotifyRoute", "spotify",
+        utterances=[
+            "play some music",
+            "next song",
+            "pause the music",
+            "play earth wind and fire on Spotify",
+            "play my playlist"
+        ],
+        patterns=[
+            r"\bspotify\b",
+            r"\b(pause|resume|stop)\s+(the\s+)?(music|song|track|playlist)\b",
+            r"\b(next|previous|skip\s+(the|this))\s+(song|track)\b",
+        ],
+    ),
+    RouteSpec(
+        "WeatherRoute", "weather",
+        utterances=[
+            "how's the weather today?",
+            "tell me the weather",
+            "what is the temperature",
+            "is it going to rain",
+            "what is the weather like in New York"
+        ],
+        patterns=[
+            r"\b(weather|forecast)\b",
+            r"\btemperature\b(?!\s+of\b)",
+            r"\b(is\s+it|will\s+it)\s+(going\s+to\s+)?(rain|snow)",
+        ],
+    ),
+]
@@ -1,40 +1,30 @@
-import aiohttp
 import os
-import subprocess
 import traceback
 
-from config import logger
+from config import logger, load_settings
+from spotify_control import execute_spotify_command, execute_spotify_command_via_ipc, SpotifyUnavailable
 
 from .base import AssistantRoute
 
 class SpotifyRoute(AssistantRoute):
-
-    @classmethod
-    def utterances(cls):
-        return [
-            "play some music",
-            "next song",
-            "pause the music",
-            "play earth wind and fire on Spotify",
-            "play my playlist"
-        ]
+    requires_network = True
+    timeout = 10
 
     async def handle(self, text, **kwargs):
         client_id = os.getenv('SPOTIFY_CLIENT_ID')
         client_secret = os.getenv('SPOTIFY_CLIENT_SECRET')
         if client_id and client_secret:
             try:
-                async with aiohttp.ClientSession() as session:
-                    ip = subprocess.run(["hostname", "-I"], capture_output=True).stdout.decode().split()[0]
-                    response = await session.post(f"http://{ip}/spotify-control", json={"text": text})
-                    if response.status == 200:
-                        data = await response.json()
-                        return data.get("message")
-                    else:
-                        content_text = await response.text()
-                        logger.warning(content_text)
-                        return f"Received a {response.status} status code. {content_text}"
+                # Commands are sent to Spotify from this process unless told
+                # to delegate them to the backend over its Unix socket
+                if load_settings().get("spotify_ipc", False):
+                    return await execute_spotify_command_via_ipc(text)
+                return await execute_spotify_command(text)
+            except SpotifyUnavailable as e:
+                logger.warning(str(e))
+                SpotifyRoute.record_error(e)
+                return str(e)
             except Exception as e:
                 logger.error(f"Error: {traceback.format_exc()}")
                 raise Exception(f"Something went wrong: {e}")
-        raise Exception("No client id or client secret found. Please provide the necessary credentials for Spotify in the web interface.")
\ No newline at end of file
+        raise Exception("No client id or client secret found. Please provide the necessary credentials for Spotify in the web interface.")
@@ -1,236 +1,437 @@
-import aiohttp
+from cachetools import LRUCache
 from datetime import datetime, timedelta
+import asyncio
 import os
 import re
+import time
 import traceback
 
-from weather_codes import weather_codes
-from config import logger, load_settings
+from weather_codes import describe, describe_many, is_daytime, is_precipitation
+from config import logger, load_settings, SOURCE_DIR
+from http_session import get_session
+from cache import PersistentCache
 
 from .base import AssistantRoute
 from .general import GeneralRoute
 
+GEOCODE_CACHE_TTL = 30 * 24 * 60 * 60  # Cities don't move
+IP_LOCATION_TTL = 24 * 60 * 60
+WEATHER_CACHE_TTL = {"current": 10 * 60, "daily": 60 * 60}
+WEATHER_PREFETCH_INTERVAL = 10 * 60
+# Upstream APIs, overridable to point the route at local stand-ins
+OPENWEATHER_URL = os.getenv("OPENWEATHER_URL", "https://api.openweathermap.org")
+OPEN_METEO_URL = os.getenv("OPEN_METEO_URL", "https://api.open-meteo.com")
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org")
+IPINFO_URL = os.getenv("IPINFO_URL", "https://ipinfo.io")
+
+geocode_cache = PersistentCache(SOURCE_DIR / "geocode_cache.json", ttl=GEOCODE_CACHE_TTL)
+# (lat, lon, units, kind) -> normalized weather, stale entries are kept until evicted
+weather_cache = LRUCache(maxsize=64)
+
+# Questions the normalized weather data answers on its own, checked in order.
+# Anything else (or anything open-ended) is left to the LLM.
+RAIN_WORDS = r"(rain|raining|rainy|umbrella|drizzle|showers?|snow|snowing|precipitation)"
+WEATHER_INTENTS = [
+    ("rain_tomorrow", re.compile(rf"\b{RAIN_WORDS}\b.*\btomorrow\b|\btomorrow\b.*\b{RAIN_WORDS}\b", re.IGNORECASE)),
+    # "Is it raining?" asks about right now, "is it going to rain?" about today
+    ("rain_now", re.compile(
+        rf"\b{RAIN_WORDS}\b.*\b(now|currently|outside)\b|\b(now|currently|outside)\b.*\b{RAIN_WORDS}\b"
+        r"|\bis\s+it\s+(raining|snowing|drizzling)\b",
+        re.IGNORECASE
+    )),
+    ("rain_today", re.compile(rf"\b{RAIN_WORDS}\b", re.IGNORECASE)),
+    ("tomorrow", re.compile(r"\btomorrow\b", re.IGNORECASE)),
+    ("week", re.compile(r"\b(week|forecast|next few days|coming days)\b", re.IGNORECASE)),
+    ("current_temp", re.compile(r"\b(temperature|degrees|how (hot|cold|warm) is it)\b", re.IGNORECASE)),
+    ("current_conditions", re.compile(r"\b(weather|outside)\b", re.IGNORECASE)),
+]
+OPEN_ENDED_PATTERN = re.compile(
+    r"\b(should|wear|jacket|coat|why|compare|better|best|good (day|time)|recommend|plan|advice"
+    r"|tonight|weekend|yesterday|monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b",
+    re.IGNORECASE
+)
+DAILY_INTENTS = {"rain_today", "rain_tomorrow", "tomorrow", "week"}
+
 class WeatherRoute(AssistantRoute):
+    requires_network = True
+    timeout = 20
+    _home_city = None
+    _home_zip_code = None
+    _prefetch_task = None
 
-    @classmethod
-    def utterances(cls):
-        return [
-            "how's the weather today?",
-            "tell me the weather",
-            "what is the temperature",
-            "is it going to rain",
-            "what is the weather like in New York"
-        ]
+    async def offline_answer(self, text):
+        # The last weather fetched beats no answer, it's served with its age
+        return await self.handle(text, offline=True)
 
     async def handle(self, text, **kwargs):
+        city = None
+        offline = kwargs.get('offline', False)
         try:
-            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             api_key = os.getenv('OPEN_WEATHER_API_KEY')
-            settings = load_settings()
-            async with aiohttp.ClientSession() as session:
-                if re.search(r'(weather|temperature).*\sin\s', text, re.IGNORECASE):
-                    city_match = re.search(r'in\s([\w\s]+)', text, re.IGNORECASE)
-                    if city_match:
-                        city = city_match.group(1).strip()
-
-                    # Current weather
-                    if not re.search(r'(forecast|future)', text, re.IGNORECASE):
-                        coords = await self.coords_from_city(city, api_key)
-                        if coords is None:
-                            return f"No weather data available for {city}. Please check the city name and try again."
-                        
-                        if api_key:
-                            response = await session.get(f"https://api.openweathermap.org/data/3.0/onecall?lat={coords.get('lat')}&lon={coords.get('lon')}&appid={api_key}&units=metric")
-                            if response.status == 200:
-                                json_response = await response.json()
-                                logger.debug(f"Weather response: {json_response}")
-                                weather = json_response.get('current').get('weather')[0].get('main')
-                                temp = json_response.get('current').get('temp')
-                                combined_response = f"It is currently {round(float(temp))} degrees and {weather.lower()} in {city}."
-                                return await GeneralRoute().handle(
-                                    text=f"""Provide a concise response to the user's question based on the weather data.  Do not summarize or respond to anything other than the question\n
-                                    User's question: {text}\n\nCurrent time: {current_time}\n
-                                    Response: {combined_response}\n\nIf the response is consistent with what the question is asking, return it. Otherwise, use the following weather data to answer the question: {json_response.get('current')}"""
-                                )
-                        
-                        # Fallback to Open-Meteo
-                        response = await session.get(f"https://api.open-meteo.com/v1/forecast?latitude={coords.get('lat')}&longitude={coords.get('lon')}&current_weather=true&temperature_unit=celsius")
-                        if response.status == 200:
-                            json_response = await response.json()
-                            weather_code = json_response.get('current_weather').get('weathercode')
-                            temp = json_response.get('current_weather').get('temperature')
-                            weather_description = weather_codes[str(weather_code)]['day']['description'] if datetime.now().hour < 18 else weather_codes[str(weather_code)]['night']['description']
-                            combined_response = f"It is currently {round(float(temp))} degrees and {weather_description.lower()} in {city}."
-                            return await GeneralRoute().handle(
-                                    text=f"""Provide a concise response to the user's question based on the weather data.  Do not summarize or respond to anything other than the question\n
-                                    User's question: {text}\n\nCurrent time: {current_time}\n
-                                    Response: {combined_response}\n\nIf the response is consistent with what the question is asking, return it. Otherwise, use the following weather data to answer the question: {weather_description}"""
-                            )
-
-                    # Weather forecast
-                    else:
-                        coords = await self.coords_from_city(city, api_key)
-                        tomorrow = datetime.now() + timedelta(days=1)
-                        if coords is None:
-                            return f"No weather data available for {city}. Please check the city name and try again."
-                        
-                        if api_key:
-                            response = await session.get(f"https://api.openweathermap.org/data/3.0/onecall?lat={coords.get('lat')}&lon={coords.get('lon')}&appid={api_key}&units=imperial")
-                            if response.status == 200:
-                                json_response = await response.json()
-                                # next few days
-                                forecast = []
-                                for day in json_response.get('daily'):
-                                    forecast.append({
-                                        'weather': day.get('weather')[0].get('main'),
-                                        'temp': day.get('temp').get('day'),
-                                        'date': datetime.fromtimestamp(day.get('dt')).strftime('%A')
-                                    })
-                                # tomorrow
-                                tomorrow_forecast = list(filter(lambda x: x.get('date') == tomorrow.strftime('%A'), forecast))[0]
-                                speech_responses = []
-                                speech_responses.append(f"Tomorrow, it will be {tomorrow_forecast.get('temp')}\u00B0F and {tomorrow_forecast.get('weather')} in {city}.")
-                                for day in forecast:
-                                    if day.get('date') != tomorrow.strftime('%A'):
-                                        speech_responses.append(f"On {day.get('date')}, it will be {round(float(day.get('temp')))} degrees and {day.get('weather').lower()} in {city}.")
-                                combined_response = ' '.join(speech_responses)
-                                return await GeneralRoute().handle(
-                                    text=f"""Provide a concise response to the user's question based on the weather data.  Do not summarize or respond to anything other than the question\n
-                                    User's question: {text}\n\nCurrent time: {current_time}\n
-                                    Response: {combined_response}\n\nIf the response is consistent with what the question is asking, return it. Otherwise, use the following weather data to answer the question: {json_response.get('current')}"""
-                                )
-                        
-                        # Fallback to Open-Meteo
-                        response = await session.get(f"https://api.open-meteo.com/v1/forecast?latitude={coords.get('lat')}&longitude={coords.get('lon')}&daily=temperature_2m_max,temperature_2m_min&temperature_unit=fahrenheit")
-                        if response.status == 200:
-                            json_response = await response.json()
-                            forecast = []
-                            for day in json_response.get('daily'):
-                                day_weather_code = day.get('weathercode')
-                                day_weather_description = weather_codes[str(day_weather_code)]['day']['description'] if datetime.now().hour < 18 else weather_codes[str(day_weather_code)]['night']['description']
-                                forecast.append({
-                                    'temp_max': day.get('temperature_2m_max'),
-                                    'temp_min': day.get('temperature_2m_min'),
-                                    'weather_description': day_weather_description,
-                                    'date': day.get('time')
-                                })
-                            tomorrow_forecast = list(filter(lambda x: x.get('date') == tomorrow.strftime('%Y-%m-%d'), forecast))[0]
-                            speech_responses = []
-                            speech_responses.append(f"Tomorrow, it will be between {tomorrow_forecast.get('temp_min')}\u00B0F and {tomorrow_forecast.get('temp_max')}\u00B0F and {tomorrow_forecast.get('weather_description').lower()} in {city}.")
-                            for day in forecast:
-                                if day.get('date') != tomorrow.strftime('%Y-%m-%d'):
-                                    speech_responses.append(f"On {day.get('date')}, it will be between {day.get('temp_min')}\u00B0F and {day.get('temp_max')}\u00B0F and {day.get('weather_description').lower()} in {city}.")
-                            combined_response = ' '.join(speech_responses)
-                            return await GeneralRoute().handle(
-                                    text=f"""Provide a concise response to the user's question based on the weather data.  Do not summarize or respond to anything other than the question\n
-                                    User's question: {text}\n\nCurrent time: {current_time}\n
-                                    Response: {combined_response}\n\nIf the response is consistent with what the question is asking, return it. Otherwise, use the following weather data to answer the question: {[day for day in forecast if day.get('weather_description')]}"""
-                            )
+            city_match = re.search(r'(weather|temperature).*\sin\s([\w\s]+)', text, re.IGNORECASE)
+            if city_match:
+                city = city_match.group(2).strip()
+                location = city
+            else:
+                # General weather based on the default zip code or IP address location
+                city = await WeatherRoute.home_city()
+                if city is None:
+                    return f"Could not determine your city based on your IP address. Please provide a city name."
+                location = "your location"
 
-                else:
-                    # General weather based on environment variable zip code or IP address location
-                    zip_code = settings.get('default_zip_code')
-                    if zip_code:
-                        city = await self.city_from_zip(zip_code)
-                    else:
-                        city = await self.city_from_ip()
-
-                    coords = await self.coords_from_city(city, api_key)
-                    if city is None:
-                        return f"Could not determine your city based on your IP address. Please provide a city name."
-                    if coords is None:
-                        return f"No weather data available for {city}."
-                    
-                    if api_key:
-                        response = await session.get(f"http://api.openweathermap.org/data/3.0/onecall?lat={coords.get('lat')}&lon={coords.get('lon')}&appid={api_key}&units=imperial")
-                        if response.status == 200:
-                            json_response = await response.json()
-                            logger.debug(f"Weather response: {json_response}")
-                            weather = json_response.get('current').get('weather')[0].get('main')
-                            temp = json_response.get('current').get('temp')
-                            combined_response = f"It is currently {round(float(temp))} degrees and {weather.lower()} in your location."
-                            return await GeneralRoute().handle(
-                                text=f"""Provide a concise response to the user's question based on the weather data.  Do not summarize or respond to anything other than the question\n
-                                User's question: {text}\n\nCurrent time: {current_time}\n
-                                Response: {combined_response}\n\nIf the response is consistent with what the question is asking, return it. Otherwise, use the following weather data to answer the question: {json_response.get('current')}"""
-                            )
-                    
-                    # Fallback to Open-Meteo
-                    response = await session.get(f"https://api.open-meteo.com/v1/forecast?latitude={coords.get('lat')}&longitude={coords.get('lon')}&current_weather=true&temperature_unit=fahrenheit")
-                    if response.status == 200:
-                        json_response = await response.json()
-                        weather_code = json_response.get('current_weather').get('weathercode')
-                        temp = json_response.get('current_weather').get('temperature')
-                        weather_description = weather_codes[str(weather_code)]['day']['description'] if datetime.now().hour < 18 else weather_codes[str(weather_code)]['night']['description']
-                        combined_response = f"It is currently {round(float(temp))} degrees and {weather_description.lower()} in {city}."
-                        return await GeneralRoute().handle(
-                            text=f"""Provide a concise response to the user's question based on the weather data.  Do not summarize or respond to anything other than the question\n
-                            User's question: {text}\n\nCurrent time: {current_time}\n
-                            Response: {combined_response}\n\nIf the response is consistent with what the question is asking, return it. Otherwise, use the following weather data to answer the question: {weather_description}"""
-                        )
+            coords = await self.coords_from_city(city, api_key)
+            if coords is None:
+                return f"No weather data available for {city}. Please check the city name and try again."
+
+            always_use_llm = kwargs.get('always_use_llm', load_settings().get('weather_always_use_llm', False))
+            intent = None if always_use_llm else WeatherRoute.classify(text)
+            logger.debug(f"Weather intent: {intent}")
+
+            if intent in DAILY_INTENTS or (intent is None and re.search(r'(forecast|future|tomorrow|week)', text, re.IGNORECASE)):
+                weather = await WeatherRoute.fetch_weather(coords, "imperial", "daily", api_key, cached_only=offline)
+                if weather is not None:
+                    answer = WeatherRoute.template_answer(intent, weather, location, city)
+                    if offline:
+                        return WeatherRoute.offline_response(answer or WeatherRoute.forecast_response(weather, city), weather)
+                    if answer is not None:
+                        return answer
+                    combined_response = WeatherRoute.forecast_response(weather, city)
+                    return await self.answer(text, combined_response, weather.get('days'), weather)
+            else:
+                # Asking about a given city answers in metric, the local weather in imperial
+                units = "metric" if city_match else "imperial"
+                weather = await WeatherRoute.fetch_weather(coords, units, "current", api_key, cached_only=offline)
+                if weather is not None:
+                    answer = WeatherRoute.template_answer(intent, weather, location, city)
+                    if offline:
+                        return WeatherRoute.offline_response(answer or WeatherRoute.current_response(weather, location), weather)
+                    if answer is not None:
+                        return answer
+                    combined_response = WeatherRoute.current_response(weather, location)
+                    return await self.answer(text, combined_response, weather.get('raw'), weather)
+
+            if offline:
+                return f"I can't reach the weather service right now and have no recent weather for {city}."
             raise Exception("No Open Weather API key found. Please enter your API key for Open Weather in the web interface or try reconnecting the service.")
 
         except Exception as e:
             if '404' in str(e):
                 return f"Weather information for {city} is not available."
+            elif offline:
+                logger.debug(f"No offline weather: {traceback.format_exc()}")
+                return "I can't reach the weather service right now."
             else:
                 logger.error(f"Error: {traceback.format_exc()}")
+                WeatherRoute.record_error(e)
                 return f"Something went wrong. {e}"
 
-    async def coords_from_city(self, city, api_key=None):
-        async with aiohttp.ClientSession() as session:
-            if api_key:
-                response = await session.get(f"http://api.openweathermap.org/geo/1.0/direct?q={city}&appid={api_key}")
+    async def answer(self, text, combined_response, weather_data, weather):
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        data_age = round((time.time() - weather.get('fetched_at')) / 60)
+        return await GeneralRoute().handle(
+            history=False,
+            text=f"""Provide a concise response to the user's question based on the weather data.  Do not summarize or respond to anything other than the question\n
+            User's question: {text}\n\nCurrent time: {current_time}\nWeather data age: {data_age} minutes\n
+            Response: {combined_response}\n\nIf the response is consistent with what the question is asking, return it. Otherwise, use the following weather data to answer the question: {weather_data}"""
+        )
+
+    @staticmethod
+    def classify(text):
+        if OPEN_ENDED_PATTERN.search(text):
+            return None
+        for intent, pattern in WEATHER_INTENTS:
+            if pattern.search(text):
+                return intent
+        return None
+
+    @staticmethod
+    def template_answer(intent, weather, location, city):
+        """
+        Answers the question straight from the weather data, or returns None
+        when the data can't answer it and the LLM should.
+        """
+        if intent == "current_temp":
+            return f"It is currently {round(float(weather.get('temp')))} degrees in {location}."
+        if intent == "current_conditions":
+            return WeatherRoute.current_response(weather, location)
+        if intent == "rain_now":
+            if weather.get('precipitation'):
+                return f"Yes, it is currently {weather.get('description').lower()} in {location}."
+            return f"No, it is {weather.get('description').lower()} in {location} right now."
+        if intent == "week":
+            return WeatherRoute.forecast_response(weather, city) or None
+        if intent not in ("rain_today", "rain_tomorrow", "tomorrow"):
+            return None
+
+        when = "today" if intent == "rain_today" else "tomorrow"
+        date = datetime.now() + timedelta(days=0 if when == "today" else 1)
+        day = next((d for d in weather.get('days') if d.get('date') == date.strftime('%Y-%m-%d')), None)
+        if day is None:
+            return None
+        if intent == "tomorrow":
+            return f"Tomorrow, it will be between {round(day.get('temp_min'))}\u00B0F and {round(day.get('temp_max'))}\u00B0F and {day.get('description').lower()} in {location}."
+
+        chance = day.get('precipitation_chance')
+        if chance is None:
+            return None
+        if chance >= 50:
+            return f"Yes, there is a {chance}% chance of rain {when} in {location}."
+        if chance >= 20:
+            return f"Maybe, there is a {chance}% chance of rain {when} in {location}."
+        return f"Rain is unlikely {when} in {location}, there is only a {chance}% chance."
+
+    @staticmethod
+    def offline_response(answer, weather):
+        minutes = round((time.time() - weather.get('fetched_at')) / 60)
+        age = f"{minutes} minutes" if minutes < 90 else f"{round(minutes / 60)} hours"
+        return f"I'm offline, as of {age} ago: {answer}"
+
+    @staticmethod
+    def current_response(weather, location):
+        return f"It is currently {round(float(weather.get('temp')))} degrees and {weather.get('description').lower()} in {location}."
+
+    @staticmethod
+    def forecast_response(weather, city):
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        speech_responses = []
+        for day in weather.get('days'):
+            if day.get('date') == tomorrow:
+                speech_responses.insert(0, f"Tomorrow, it will be between {round(day.get('temp_min'))}\u00B0F and {round(day.get('temp_max'))}\u00B0F and {day.get('description').lower()} in {city}.")
+            elif day.get('date') > tomorrow:
+                speech_responses.append(f"On {day.get('weekday')}, it will be between {round(day.get('temp_min'))}\u00B0F and {round(day.get('temp_max'))}\u00B0F and {day.get('description').lower()} in {city}.")
+        return ' '.join(speech_responses)
+
+    ## Weather data ##
+    # Both providers are normalized to the same shape:
+    # current: {"temp", "description", "is_day", "precipitation", "raw"}
+    # daily: {"days": [{"date", "weekday", "temp_min", "temp_max", "description", "precipitation_chance"}]}
+    # plus "source" and "fetched_at".
+
+    @classmethod
+    async def fetch_weather(cls, coords, units, kind, api_key=None, max_age=None, cached_only=False):
+        key = (round(coords.get('lat'), 2), round(coords.get('lon'), 2), units, kind)
+        max_age = WEATHER_CACHE_TTL[kind] if max_age is None else max_age
+        cached = weather_cache.get(key)
+        if cached_only:
+            # Offline, whatever was fetched last however old it is
+            return cached
+        if cached is not None and time.time() - cached.get('fetched_at') < max_age:
+            logger.debug(f"Weather cache hit for {key}")
+            return cached
+
+        fetched = None
+        if api_key:
+            fetched = await cls._fetch_openweather(coords, units, api_key)
+        if fetched is None:
+            # Fallback to Open-Meteo
+            fetched = await cls._fetch_open_meteo(coords, units, kind)
+        if fetched is None:
+            return None
+
+        for fetched_kind, weather in fetched.items():
+            weather['fetched_at'] = time.time()
+            weather_cache[key[:3] + (fetched_kind,)] = weather
+        return fetched.get(kind)
+
+    @staticmethod
+    async def _fetch_openweather(coords, units, api_key):
+        params = {"lat": coords.get('lat'), "lon": coords.get('lon'), "appid": api_key, "units": units}
+        async with get_session().get(f"{OPENWEATHER_URL}/data/3.0/onecall", params=params) as response:
+            if response.status != 200:
+                logger.warning(f"OpenWeather returned {response.status}, falling back to Open-Meteo")
+                return None
+            json_response = await response.json()
+        logger.debug(f"Weather response: {json_response}")
+
+        # One call returns both the current weather and the forecast
+        current = json_response.get('current')
+        offset = timedelta(seconds=json_response.get('timezone_offset', 0))
+        days = []
+        for day in json_response.get('daily', []):
+            date = datetime.utcfromtimestamp(day.get('dt')) + offset
+            days.append({
+                'date': date.strftime('%Y-%m-%d'),
+                'weekday': date.strftime('%A'),
+                'temp_min': day.get('temp').get('min'),
+                'temp_max': day.get('temp').get('max'),
+                'description': day.get('weather')[0].get('main'),
+                'precipitation_chance': round(day.get('pop', 0) * 100),
+            })
+        return {
+            'current': {
+                'source': 'openweather',
+                'temp': current.get('temp'),
+                'description': current.get('weather')[0].get('main'),
+                'is_day': is_daytime(current.get('sunrise'), current.get('sunset'), current.get('dt')),
+                # Condition ids below 700 are thunderstorms, drizzle, rain and snow
+                'precipitation': current.get('weather')[0].get('id') < 700,
+                'raw': current,
+            },
+            'daily': {'source': 'openweather', 'days': days},
+        }
+
+    @staticmethod
+    async def _fetch_open_meteo(coords, units, kind):
+        params = {
+            "latitude": coords.get('lat'),
+            "longitude": coords.get('lon'),
+            "temperature_unit": "fahrenheit" if units == "imperial" else "celsius",
+            "timezone": "auto",
+        }
+        if kind == "current":
+            params["current_weather"] = "true"
+            # Today's sunrise and sunset, in case current_weather has no is_day
+            params["daily"] = "sunrise,sunset"
+            params["forecast_days"] = 1
+            params["timeformat"] = "unixtime"
+        else:
+            params["daily"] = "weathercode,temperature_2m_max,temperature_2m_min,precipitation_probability_max"
+        async with get_session().get(f"{OPEN_METEO_URL}/v1/forecast", params=params) as response:
+            if response.status != 200:
+                logger.warning(f"Open-Meteo returned {response.status}")
+                return None
+            json_response = await response.json()
+
+        if kind == "current":
+            current = json_response.get('current_weather')
+            weather_code = current.get('weathercode')
+            if current.get('is_day') is not None:
+                is_day = bool(current.get('is_day'))
+            else:
+                sun = json_response.get('daily', {})
+                is_day = is_daytime((sun.get('sunrise') or [None])[0], (sun.get('sunset') or [None])[0])
+            return {'current': {
+                'source': 'open-meteo',
+                'temp': current.get('temperature'),
+                'description': describe(weather_code, is_day),
+                'is_day': is_day,
+                'precipitation': is_precipitation(weather_code),
+                'raw': current,
+            }}
+
+        daily = json_response.get('daily')
+        dates = daily.get('time')
+        precipitation_chances = daily.get('precipitation_probability_max') or [None] * len(dates)
+        descriptions = describe_many(daily.get('weathercode'))
+        weekdays = [datetime.strptime(date, '%Y-%m-%d').strftime('%A') for date in dates]
+        days = [
+            {'date': date, 'weekday': weekday, 'temp_min': temp_min, 'temp_max': temp_max, 'description': description, 'precipitation_chance': precipitation_chance}
+            for date, weekday, temp_min, temp_max, description, precipitation_chance
+            in zip(dates, weekdays, daily.get('temperature_2m_min'), daily.get('temperature_2m_max'), descriptions, precipitation_chances)
+        ]
+        return {'daily': {'source': 'open-meteo', 'days': days}}
+
+    @classmethod
+    async def warmup(cls):
+        await cls.home_city()
+        if cls._prefetch_task is None or cls._prefetch_task.done():
+            cls._prefetch_task = asyncio.create_task(cls._prefetch_home_weather())
+
+    @classmethod
+    async def _prefetch_home_weather(cls):
+        # Keeps the local weather fresh so most questions skip the upstream APIs
+        while True:
+            try:
+                api_key = os.getenv('OPEN_WEATHER_API_KEY')
+                city = await cls.home_city()
+                coords = await cls.coords_from_city(city, api_key) if city else None
+                if coords is not None:
+                    for kind in ("current", "daily"):
+                        await cls.fetch_weather(coords, "imperial", kind, api_key, max_age=WEATHER_PREFETCH_INTERVAL / 2)
+                    logger.debug(f"Prefetched the weather for {city}")
+            except Exception as e:
+                logger.warning(f"Failed to prefetch the weather: {e}")
+                logger.debug(f"Failed to prefetch the weather: {traceback.format_exc()}")
+            await asyncio.sleep(WEATHER_PREFETCH_INTERVAL)
+
+    @classmethod
+    async def home_city(cls):
+        # Resolved once, then reused by every question about the local weather
+        zip_code = load_settings().get('default_zip_code')
+        if cls._home_city is None or cls._home_zip_code != zip_code:
+            if zip_code:
+                city = await cls.city_from_zip(zip_code)
+            else:
+                city = await cls.city_from_ip()
+            cls._home_city, cls._home_zip_code = city, zip_code
+        return cls._home_city
+
+    @staticmethod
+    async def coords_from_city(city, api_key=None):
+        cache_key = f"city:{city.lower()}"
+        coords = geocode_cache.get(cache_key)
+        if coords is not None:
+            return coords
+
+        session = get_session()
+        coords = None
+        if api_key:
+            async with session.get(f"{OPENWEATHER_URL}/geo/1.0/direct", params={"q": city, "appid": api_key}) as response:
                 if response.status == 200:
                     json_response = await response.json()
-                    if len(json_response) > 0:
-                        coords = {
-                            "lat": json_response[0].get('lat'),
-                            "lon": json_response[0].get('lon')
-                        }
-                    else:
+                    if len(json_response) == 0:
+                        return None
+                    coords = {
+                        "lat": json_response[0].get('lat'),
+                        "lon": json_response[0].get('lon')
+                    }
+
+        # Fallback to Open-Meteo if no API key or OpenWeather fails
+        if coords is None:
+            async with session.get(f"{NOMINATIM_URL}/search", params={"q": city, "format": "json"}) as response:
+                if response.status == 200:
+                    json_response = await response.json()
+                    if len(json_response) == 0:
                         return None
-                    return coords
-            
-            # Fallback to Open-Meteo if no API key or OpenWeather fails
-            response = await session.get(f"https://nominatim.openstreetmap.org/search?q={city}&format=json")
-            if response.status == 200:
-                json_response = await response.json()
-                if len(json_response) > 0:
                     coords = {
                         "lat": float(json_response[0].get('lat')),
                         "lon": float(json_response[0].get('lon'))
                     }
-                else:
-                    return None
-                return coords
+
+        if coords is not None:
+            geocode_cache.set(cache_key, coords)
+        return coords
         
-    async def city_from_zip(self, zip_code: str, country_code: str = "us"):
+    @staticmethod
+    async def city_from_zip(zip_code: str, country_code: str = "us"):
+        cache_key = f"zip:{zip_code},{country_code}"
+        city = geocode_cache.get(cache_key)
+        if city is not None:
+            return city
+
         api_key = os.getenv('OPEN_WEATHER_API_KEY')
         if not api_key:
             logger.error("No API key provided for OpenWeatherMap.")
             return None
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                response = await session.get(
-                    f"http://api.openweathermap.org/geo/1.0/zip?zip={zip_code},{country_code}&appid={api_key}"
-                )
+        try:
+            async with get_session().get(
+                f"{OPENWEATHER_URL}/geo/1.0/zip?zip={zip_code},{country_code}&appid={api_key}"
+            ) as response:
                 if response.status == 200:
                     json_response = await response.json()
                     city = json_response.get('name')
+                    if city:
+                        geocode_cache.set(cache_key, city)
                     return city
                 else:
                     logger.error(f"Failed to retrieve city from zip code. Status: {response.status}")
-            except Exception as e:
-                logger.error(f"Error retrieving city from zip code: {traceback.format_exc()}")
+        except Exception as e:
+            logger.error(f"Error retrieving city from zip code: {traceback.format_exc()}")
         return None
 
-    async def city_from_ip(self):
-        async with aiohttp.ClientSession() as session:
-            response = await session.get(f"https://ipinfo.io/json")
+    @staticmethod
+    async def city_from_ip():
+        city = geocode_cache.get("ip")
+        if city is not None:
+            return city
+
+        async with get_session().get(f"{IPINFO_URL}/json") as response:
             if response.status == 200:
                 json_response = await response.json()
                 city = json_response.get('city')
+                if city:
+                    # The public IP can change, don't keep it as long as a geocoded city
+                    geocode_cache.set("ip", city, ttl=IP_LOCATION_TTL)
                 return city
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,419 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+import traceback
+
+import spotipy
+from cachetools import TTLCache
+from difflib import SequenceMatcher
+from spotipy.cache_handler import CacheHandler
+
+from config import logger
+
+TOKEN_PATH = "spotify_token.json"
+DEVICE_NAME = "GPT Home"
+TOKEN_REFRESH_MARGIN = 5 * 60  # Refresh tokens this many seconds before they expire
+SPOTIFYD_RESTART_DELAY = 3
+REQUESTS_TIMEOUT = 10
+IPC_SOCKET_PATH = "/tmp/gpt-home-spotify.sock"
+SEARCH_TYPES = ('artist', 'album', 'track', 'playlist', 'show')
+SEARCH_TYPE_WEIGHTS = {'artist': 1.0, 'album': 0.97, 'track': 0.95, 'playlist': 0.9, 'show': 0.85}
+SEARCH_RANK_PENALTY = 0.02  # Prefer Spotify's own ranking between close matches
+SEARCH_LIMIT = 3
+SEARCH_CACHE_SIZE = 128
+SEARCH_CACHE_TTL = 6 * 60 * 60
+
+_search_cache = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+_search_cache_lock = threading.Lock()
+
+
+class SpotifyUnavailable(Exception):
+    """Raised with a message meant for the user when a command can't be sent."""
+
+
+class InvalidSpotifyCommand(SpotifyUnavailable):
+    """Raised when the text isn't a command we know."""
+
+
+class TokenCache(CacheHandler):
+    """
+    Keeps the token in memory. The file is only read once, and written when
+    spotipy refreshes the token so it survives restarts.
+    """
+    def __init__(self, path=TOKEN_PATH):
+        self.path = path
+        self._token_info = None
+        self._loaded = False
+
+    def get_cached_token(self):
+        if not self._loaded:
+            try:
+                with open(self.path, 'r') as f:
+                    self._token_info = json.load(f)
+            except (OSError, ValueError):
+                self._token_info = None
+            self._loaded = True
+        return self._token_info
+
+    def save_token_to_cache(self, token_info):
+        self._token_info = token_info
+        self._loaded = True
+        with open(self.path, 'w') as f:
+            json.dump(token_info, f)
+
+    def clear(self):
+        self._token_info = None
+        self._loaded = True
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class SpotifySession:
+    """
+    One long-lived Spotify client for the whole process: the token lives in
+    memory and is refreshed ahead of expiry, HTTP connections are pooled by
+    the client's requests session and the "GPT Home" device id is cached
+    until a command fails because of it.
+    """
+    def __init__(self, token_path=TOKEN_PATH):
+        self.token_cache = TokenCache(token_path)
+        self._oauth = None
+        self._oauth_settings = None
+        self._client = None
+        self._device_id = None
+        self._recovery_task = None
+        self._refresh_task = None
+
+    ## Token ##
+
+    def oauth(self):
+        oauth_settings = (
+            os.environ.get('SPOTIFY_CLIENT_ID'),
+            os.environ.get('SPOTIFY_CLIENT_SECRET'),
+            os.environ.get('SPOTIFY_REDIRECT_URI'),
+            os.environ.get('SPOTIFY_SCOPES'),
+        )
+        # Rebuilt only when the integration is reconfigured
+        if self._oauth is None or oauth_settings != self._oauth_settings:
+            client_id, client_secret, redirect_uri, scopes = oauth_settings
+            self._oauth = spotipy.oauth2.SpotifyOAuth(
+                client_id=client_id,
+                client_secret=client_secret,
+                redirect_uri=redirect_uri,
+                scope=scopes,
+                cache_handler=self.token_cache,
+                open_browser=False,
+            )
+            self._oauth_settings = oauth_settings
+            self._client = None
+        return self._oauth
+
+    def token_info(self):
+        return self.token_cache.get_cached_token()
+
+    def store_token(self, token_info):
+        self.token_cache.save_token_to_cache(token_info)
+
+    def clear_token(self):
+        self.token_cache.clear()
+        self._client = None
+        self._device_id = None
+
+    def is_token_valid(self):
+        token_info = self.token_info()
+        return bool(token_info) and token_info["expires_at"] > time.time()
+
+    def refresh_token(self):
+        token_info = self.token_info()
+        if not token_info:
+            return None
+        # spotipy stores the new token through the cache handler
+        return self.oauth().refresh_access_token(token_info['refresh_token'])
+
+    def ensure_token(self):
+        token_info = self.token_info()
+        if not token_info:
+            raise SpotifyUnavailable("No token information available. Please reauthorize with Spotify.")
+        if token_info["expires_at"] - time.time() < TOKEN_REFRESH_MARGIN:
+            self.refresh_token()
+            if not self.is_token_valid():
+                logger.warning("Token expired. Need to reauthorize with Spotify.")
+                raise SpotifyUnavailable("Token expired. Need to reauthorize Spotify in the web interface.")
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = spotipy.Spotify(auth_manager=self.oauth(), requests_timeout=REQUESTS_TIMEOUT)
+        return self._client
+
+    def start(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+
+    async def _refresh_loop(self):
+        while True:
+            token_info = self.token_info()
+            if not token_info:
+                await asyncio.sleep(60)
+                continue
+            delay = token_info["expires_at"] - TOKEN_REFRESH_MARGIN - time.time()
+            if delay > 0:
+                await asyncio.sleep(min(delay, 60))  # Wake up regularly in case the token was replaced
+                continue
+            try:
+                await asyncio.to_thread(self.refresh_token)
+                logger.debug("Spotify token refreshed")
+            except Exception as e:
+                logger.warning(f"Failed to refresh the Spotify token: {e}")
+                await asyncio.sleep(60)
+
+    ## Device ##
+
+    def _find_device(self):
+        devices = self.client.devices()
+        logger.debug(f"Devices: {devices}")
+        for device in devices['devices']:
+            if DEVICE_NAME in device['name']:
+                return device['id']
+        return None
+
+    def invalidate_device(self):
+        self._device_id = None
+
+    async def device_id(self):
+        if self._device_id is None:
+            self._device_id = await asyncio.to_thread(self._find_device)
+        if self._device_id is None:
+            self._device_id = await self.recover_device()
+        return self._device_id
+
+    async def recover_device(self):
+        # Concurrent commands wait for the same restart instead of starting their own
+        if self._recovery_task is None or self._recovery_task.done():
+            self._recovery_task = asyncio.create_task(self._restart_spotifyd())
+        return await asyncio.shield(self._recovery_task)
+
+    async def _restart_spotifyd(self):
+        logger.info(f"{DEVICE_NAME} not found as a Spotify device, restarting spotifyd")
+        await SpotifySession._supervisorctl("stop", "spotifyd")
+        await asyncio.sleep(SPOTIFYD_RESTART_DELAY)
+        await SpotifySession._supervisorctl("start", "spotifyd")
+        await asyncio.sleep(SPOTIFYD_RESTART_DELAY)
+        return await asyncio.to_thread(self._find_device)
+
+    @staticmethod
+    async def _supervisorctl(*args):
+        process = await asyncio.create_subprocess_exec(
+            "supervisorctl", *args,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        await process.wait()
+
+    ## Commands ##
+
+    async def command(self, action):
+        """
+        Runs `action(client, device_id)` in a worker thread. On a 401 the token
+        is refreshed, on a 404 the device is looked up again, then it's retried once.
+        """
+        await asyncio.to_thread(self.ensure_token)
+        for attempt in range(2):
+            device_id = await self.device_id()
+            if not device_id:
+                raise SpotifyUnavailable(f"{DEVICE_NAME} not found as an available device.")
+            try:
+                return await asyncio.to_thread(action, self.client, device_id)
+            except spotipy.exceptions.SpotifyException as e:
+                if attempt or e.http_status not in (401, 404):
+                    raise
+                logger.debug(f"Spotify command failed with {e.http_status}, retrying: {traceback.format_exc()}")
+                if e.http_status == 401:
+                    await asyncio.to_thread(self.refresh_token)
+                    if not self.is_token_valid():
+                        logger.warning("Token expired. Need to reauthorize with Spotify.")
+                        raise SpotifyUnavailable("Token expired. Need to reauthorize Spotify in the web interface.")
+                else:
+                    self.invalidate_device()
+
+
+spotify_session = SpotifySession()
+
+
+## Spoken commands ##
+
+async def execute_spotify_command(text, session=spotify_session):
+    """
+    Parses a spoken command and runs it, returns the message to tell the user.
+    Shared by the assistant's SpotifyRoute and the backend's /spotify-control.
+    """
+    text = text.lower().strip()
+
+    if "play" in text:
+        song = re.sub(r'^play\s+', '', text)  # Remove "play" at the beginning
+        song = re.sub(r'\s+on\s+spotify$', '', song)  # Remove "on Spotify" at the end
+        song = song.strip()
+        if song:
+            # Searched with the same checked token and retries as playback
+            def play(sp, device_id):
+                spotify_uris, message = resolve_track_uris(song, sp)
+                sp.start_playback(device_id=device_id, uris=spotify_uris)
+                return message
+            return await session.command(play)
+        else:
+            await session.command(lambda sp, device_id: sp.start_playback(device_id=device_id))
+            return "Resumed playback."
+
+    elif "next" in text or "skip" in text:
+        await session.command(lambda sp, device_id: sp.next_track(device_id=device_id))
+        return "Playing next track."
+
+    elif "previous" in text or "go back" in text:
+        await session.command(lambda sp, device_id: sp.previous_track(device_id=device_id))
+        return "Playing previous track."
+
+    elif "pause" in text or "stop" in text:
+        await session.command(lambda sp, device_id: sp.pause_playback(device_id=device_id))
+        return "Paused playback."
+
+    elif "volume" in text:
+        volume = int(text.split('volume', 1)[1].strip())
+        await session.command(lambda sp, device_id: sp.volume(volume_percent=volume, device_id=device_id))
+        return f"Set volume to {text.split('volume', 1)[1].strip()}."
+
+    elif "shuffle" in text:
+        await session.command(lambda sp, device_id: sp.shuffle(state=True, device_id=device_id))
+        return "Shuffled playback."
+
+    elif "repeat" in text:
+        await session.command(lambda sp, device_id: sp.repeat(state="track", device_id=device_id))
+        return "Repeating track."
+
+    else:
+        logger.warning(f"Invalid command: {text}")
+        raise InvalidSpotifyCommand("Invalid command.")
+
+## Search ##
+# All types are searched with one request and the best match is picked by
+# score, so a query only pays for the search plus one call to get the tracks.
+
+def search_spotify(song: str, sp, search_types=SEARCH_TYPES, limit=SEARCH_LIMIT):
+    return sp.search(song, limit=limit, type=",".join(search_types))
+
+def score_match(query: str, search_type: str, item, rank: int):
+    names = [item['name'].lower()]
+    # "thriller by michael jackson" or "michael jackson thriller" should match the album
+    for artist in item.get('artists', [])[:1]:
+        artist_name = artist['name'].lower()
+        names += [f"{names[0]} by {artist_name}", f"{artist_name} {names[0]}", f"{names[0]} {artist_name}"]
+    similarity = max(SequenceMatcher(None, query, name).ratio() for name in names)
+    return similarity * SEARCH_TYPE_WEIGHTS[search_type] - rank * SEARCH_RANK_PENALTY
+
+def best_match(query: str, result, search_types=SEARCH_TYPES):
+    best = None
+    for search_type in search_types:
+        items = (result.get(search_type + 's') or {}).get('items') or []
+        for rank, item in enumerate(items):
+            if not item:
+                continue  # Spotify returns null for unavailable playlists and shows
+            score = score_match(query, search_type, item, rank)
+            if best is None or score > best[0]:
+                best = (score, search_type, item)
+    return best[1:] if best else (None, None)
+
+def get_podcast_episodes(show_id: str, sp):
+    episodes = sp.show_episodes(show_id)
+    return [episode['uri'] for episode in episodes['items']]
+
+def get_album_tracks(album_id: str, sp):
+    tracks = sp.album_tracks(album_id)
+    return [track['uri'] for track in tracks['items']]
+
+def get_artist_top_tracks(artist_id: str, sp):
+    tracks = sp.artist_top_tracks(artist_id)
+    return [track['uri'] for track in tracks['tracks']]
+
+def get_track_recommendations(track_id: str, sp):
+    recommendations = sp.recommendations(seed_tracks=[track_id])
+    return [track['uri'] for track in recommendations['tracks']]
+
+def get_playlist_tracks(playlist_id: str, sp):
+    items = sp.playlist_items(playlist_id, additional_types=['track'])
+    return [item['track']['uri'] for item in items['items'] if item.get('track')]
+
+def resolve_track_uris(song: str, sp):
+    query = song.lower().strip()
+    with _search_cache_lock:
+        cached = _search_cache.get(query)
+    if cached:
+        logger.debug(f"Spotify search cache hit for: {query}")
+        return cached
+
+    search_type, item = best_match(query, search_spotify(query, sp))
+    if item is None:
+        raise SpotifyUnavailable(f"No match found for: {song}")
+
+    item_id = item['id']
+    item_name = item['name']
+    if search_type == 'album':
+        resolved = (get_album_tracks(item_id, sp), f"Playing album '{item_name} by {item['artists'][0]['name']}'...")
+    elif search_type == 'artist':
+        resolved = (get_artist_top_tracks(item_id, sp), f"Playing top tracks based on artist '{item_name}'...")
+    elif search_type == 'track':
+        resolved = ([item['uri']] + get_track_recommendations(item_id, sp), f"Playing radio based on track '{item_name}'...")
+    elif search_type == 'playlist':
+        resolved = (get_playlist_tracks(item_id, sp), f"Playing playlist '{item_name}'...")
+    else:
+        resolved = (get_podcast_episodes(item_id, sp), f"Playing episodes from the show '{item_name}'...")
+
+    with _search_cache_lock:
+        _search_cache[query] = resolved
+    return resolved
+
+
+## Local IPC ##
+# One JSON line per request and per reply over a Unix socket, for when the
+# assistant should not talk to Spotify itself and delegates to the backend.
+
+async def _handle_ipc_client(reader, writer):
+    try:
+        request = json.loads(await reader.readline())
+        try:
+            reply = {"message": await execute_spotify_command(request.get("text", ""))}
+        except SpotifyUnavailable as e:
+            reply = {"message": str(e)}
+        except Exception as e:
+            logger.error(f"Error: {traceback.format_exc()}")
+            reply = {"message": f"Something went wrong: {e}"}
+        writer.write((json.dumps(reply) + "\n").encode())
+        await writer.drain()
+    except Exception as e:
+        logger.error(f"Spotify IPC request failed: {e}")
+    finally:
+        writer.close()
+
+async def serve_spotify_ipc(path=IPC_SOCKET_PATH):
+    if os.path.exists(path):
+        os.remove(path)
+    return await asyncio.start_unix_server(_handle_ipc_client, path=path)
+
+async def execute_spotify_command_via_ipc(text, path=IPC_SOCKET_PATH, timeout=30):
+    reader, writer = await asyncio.open_unix_connection(path)
+    try:
+        writer.write((json.dumps({"text": text}) + "\n").encode())
+        await writer.drain()
+        reply = json.loads(await asyncio.wait_for(reader.readline(), timeout))
+        return reply.get("message")
+    finally:
+        writer.close()
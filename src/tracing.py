@@ -0,0 +1,232 @@
+import contextlib
+import contextvars
+import json
+import math
+import os
+import queue
+import secrets
+import threading
+import time
+import traceback
+from collections import deque
+from pathlib import Path
+
+from config import logger, load_settings
+
+TRACE_BUFFER_SIZE = 2000  # Spans kept in memory and in the export file
+# Shared with the backend, which runs as another process
+TRACE_EXPORT_PATH = Path("/dev/shm" if os.path.isdir("/dev/shm") else "/tmp") / "gpt-home-traces.json"
+OTLP_TIMEOUT = 5
+SERVICE_NAME = "gpt-home"
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile, q between 0 and 100."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, math.ceil(q * len(values) / 100) - 1))]
+
+
+class Span:
+    def __init__(self, name, trace_id, parent_id=None, start=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start = time.time() if start is None else start
+        self.end = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    @property
+    def duration(self):
+        return None if self.end is None else self.end - self.start
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "end": self.end,
+            "duration_ms": None if self.end is None else round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+    def to_otlp(self):
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": int(self.start * 1e9),
+            "endTimeUnixNano": int(self.end * 1e9),
+            "attributes": [{"key": key, "value": {"stringValue": str(value)}} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+
+
+class Tracer:
+    """
+    Per-utterance tracing. Every stage of the voice pipeline records a span
+    under the utterance's trace id, carried in a context variable so it
+    follows tasks and the listener thread's callbacks.
+
+    Finished spans go to a ring buffer. When an utterance ends, the buffer is
+    written as JSON for the backend's /traces endpoints, and the utterance's
+    spans are sent to an OpenTelemetry collector when `otlp_endpoint` is set
+    (or OTEL_EXPORTER_OTLP_ENDPOINT). Exports run in a background thread.
+    """
+    def __init__(self, export_path=TRACE_EXPORT_PATH, size=TRACE_BUFFER_SIZE):
+        self.export_path = export_path
+        self._spans = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._exports = queue.Queue()
+        self._exporter = None
+
+    @staticmethod
+    def current_trace():
+        return _current_trace.get()
+
+    def new_trace(self):
+        """Starts a new utterance in the current context and returns its id."""
+        trace_id = secrets.token_hex(16)
+        _current_trace.set(trace_id)
+        _current_span.set(None)
+        return trace_id
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        trace_id = _current_trace.get()
+        if trace_id is None:
+            trace_id = self.new_trace()
+        parent = _current_span.get()
+        span = Span(name, trace_id, parent.span_id if parent else None, attributes=attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            self._finish(span)
+
+    @contextlib.contextmanager
+    def utterance(self, **attributes):
+        """Root span of an utterance, continuing the trace audio capture started if any."""
+        with self.span("utterance", **attributes) as span:
+            try:
+                yield span
+            finally:
+                self.export(span.trace_id)
+
+    def record(self, name, start, end, trace_id=None, parent_id=None, error=None, **attributes):
+        """Records a span timed elsewhere, such as in a worker thread."""
+        trace_id = trace_id or _current_trace.get()
+        if trace_id is None:
+            return
+        if parent_id is None:
+            parent = _current_span.get()
+            parent_id = parent.span_id if parent else None
+        span = Span(name, trace_id, parent_id, start=start, attributes=attributes)
+        span.end = end
+        span.error = error
+        self._finish(span)
+
+    def _finish(self, span):
+        if span.end is None:
+            span.end = time.time()
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self, trace_id=None):
+        with self._lock:
+            spans = list(self._spans)
+        return spans if trace_id is None else [span for span in spans if span.trace_id == trace_id]
+
+    ## Export ##
+
+    def export(self, trace_id):
+        if self._exporter is None or not self._exporter.is_alive():
+            self._exporter = threading.Thread(target=self._export_loop, name="trace-exporter", daemon=True)
+            self._exporter.start()
+        self._exports.put(trace_id)
+
+    def _export_loop(self):
+        while True:
+            trace_id = self._exports.get()
+            try:
+                self._write_json()
+                endpoint = load_settings().get("otlp_endpoint") or os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+                if endpoint:
+                    self._send_otlp(endpoint, self.spans(trace_id))
+            except Exception as e:
+                logger.debug(f"Failed to export trace {trace_id}: {e}\n{traceback.format_exc()}")
+
+    def _write_json(self):
+        tmp_path = f"{self.export_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump([span.to_dict() for span in self.spans()], f)
+        os.replace(tmp_path, self.export_path)
+
+    @staticmethod
+    def _send_otlp(endpoint, spans):
+        url = endpoint if endpoint.rstrip("/").endswith("/v1/traces") else f"{endpoint.rstrip('/')}/v1/traces"
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "gpt-home"}, "spans": [span.to_otlp() for span in spans]}],
+        }]}
+        import requests  # Only when exporting to a collector, the backend imports this module too
+        requests.post(url, json=payload, timeout=OTLP_TIMEOUT).raise_for_status()
+
+
+def load_exported_spans(path=TRACE_EXPORT_PATH):
+    """Spans the assistant exported, for the backend."""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return []
+
+
+def stage_stats(spans):
+    """p50/p95 duration in milliseconds for each stage name."""
+    durations = {}
+    for span in spans:
+        if span.get("duration_ms") is not None:
+            durations.setdefault(span["name"], []).append(span["duration_ms"])
+    return {
+        name: {"count": len(values), "p50_ms": percentile(values, 50), "p95_ms": percentile(values, 95)}
+        for name, values in sorted(durations.items())
+    }
+
+
+def aiohttp_trace_config():
+    """A span for each upstream HTTP request made through the shared aiohttp session."""
+    import aiohttp
+
+    async def on_request_start(session, context, params):
+        context.start = time.time()
+
+    async def on_request_end(session, context, params):
+        tracer.record("http", context.start, time.time(), method=params.method, host=params.url.host, status=params.response.status)
+
+    async def on_request_exception(session, context, params):
+        tracer.record("http", context.start, time.time(), error=f"{type(params.exception).__name__}: {params.exception}", method=params.method, host=params.url.host)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
+
+
+tracer = Tracer()
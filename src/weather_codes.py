@@ -1,282 +1,76 @@
-weather_codes = {
-	"0":{
-		"day":{
-			"description":"Sunny",
-			"image":"http://openweathermap.org/img/wn/01d@2x.png"
-		},
-		"night":{
-			"description":"Clear",
-			"image":"http://openweathermap.org/img/wn/01n@2x.png"
-		}
-	},
-	"1":{
-		"day":{
-			"description":"Mainly Sunny",
-			"image":"http://openweathermap.org/img/wn/01d@2x.png"
-		},
-		"night":{
-			"description":"Mainly Clear",
-			"image":"http://openweathermap.org/img/wn/01n@2x.png"
-		}
-	},
-	"2":{
-		"day":{
-			"description":"Partly Cloudy",
-			"image":"http://openweathermap.org/img/wn/02d@2x.png"
-		},
-		"night":{
-			"description":"Partly Cloudy",
-			"image":"http://openweathermap.org/img/wn/02n@2x.png"
-		}
-	},
-	"3":{
-		"day":{
-			"description":"Cloudy",
-			"image":"http://openweathermap.org/img/wn/03d@2x.png"
-		},
-		"night":{
-			"description":"Cloudy",
-			"image":"http://openweathermap.org/img/wn/03n@2x.png"
-		}
-	},
-	"45":{
-		"day":{
-			"description":"Foggy",
-			"image":"http://openweathermap.org/img/wn/50d@2x.png"
-		},
-		"night":{
-			"description":"Foggy",
-			"image":"http://openweathermap.org/img/wn/50n@2x.png"
-		}
-	},
-	"48":{
-		"day":{
-			"description":"Rime Fog",
-			"image":"http://openweathermap.org/img/wn/50d@2x.png"
-		},
-		"night":{
-			"description":"Rime Fog",
-			"image":"http://openweathermap.org/img/wn/50n@2x.png"
-		}
-	},
-	"51":{
-		"day":{
-			"description":"Light Drizzle",
-			"image":"http://openweathermap.org/img/wn/09d@2x.png"
-		},
-		"night":{
-			"description":"Light Drizzle",
-			"image":"http://openweathermap.org/img/wn/09n@2x.png"
-		}
-	},
-	"53":{
-		"day":{
-			"description":"Drizzle",
-			"image":"http://openweathermap.org/img/wn/09d@2x.png"
-		},
-		"night":{
-			"description":"Drizzle",
-			"image":"http://openweathermap.org/img/wn/09n@2x.png"
-		}
-	},
-	"55":{
-		"day":{
-			"description":"Heavy Drizzle",
-			"image":"http://openweathermap.org/img/wn/09d@2x.png"
-		},
-		"night":{
-			"description":"Heavy Drizzle",
-			"image":"http://openweathermap.org/img/wn/09n@2x.png"
-		}
-	},
-	"56":{
-		"day":{
-			"description":"Light Freezing Drizzle",
-			"image":"http://openweathermap.org/img/wn/09d@2x.png"
-		},
-		"night":{
-			"description":"Light Freezing Drizzle",
-			"image":"http://openweathermap.org/img/wn/09n@2x.png"
-		}
-	},
-	"57":{
-		"day":{
-			"description":"Freezing Drizzle",
-			"image":"http://openweathermap.org/img/wn/09d@2x.png"
-		},
-		"night":{
-			"description":"Freezing Drizzle",
-			"image":"http://openweathermap.org/img/wn/09n@2x.png"
-		}
-	},
-	"61":{
-		"day":{
-			"description":"Light Rain",
-			"image":"http://openweathermap.org/img/wn/10d@2x.png"
-		},
-		"night":{
-			"description":"Light Rain",
-			"image":"http://openweathermap.org/img/wn/10n@2x.png"
-		}
-	},
-	"63":{
-		"day":{
-			"description":"Rain",
-			"image":"http://openweathermap.org/img/wn/10d@2x.png"
-		},
-		"night":{
-			"description":"Rain",
-			"image":"http://openweathermap.org/img/wn/10n@2x.png"
-		}
-	},
-	"65":{
-		"day":{
-			"description":"Heavy Rain",
-			"image":"http://openweathermap.org/img/wn/10d@2x.png"
-		},
-		"night":{
-			"description":"Heavy Rain",
-			"image":"http://openweathermap.org/img/wn/10n@2x.png"
-		}
-	},
-	"66":{
-		"day":{
-			"description":"Light Freezing Rain",
-			"image":"http://openweathermap.org/img/wn/10d@2x.png"
-		},
-		"night":{
-			"description":"Light Freezing Rain",
-			"image":"http://openweathermap.org/img/wn/10n@2x.png"
-		}
-	},
-	"67":{
-		"day":{
-			"description":"Freezing Rain",
-			"image":"http://openweathermap.org/img/wn/10d@2x.png"
-		},
-		"night":{
-			"description":"Freezing Rain",
-			"image":"http://openweathermap.org/img/wn/10n@2x.png"
-		}
-	},
-	"71":{
-		"day":{
-			"description":"Light Snow",
-			"image":"http://openweathermap.org/img/wn/13d@2x.png"
-		},
-		"night":{
-			"description":"Light Snow",
-			"image":"http://openweathermap.org/img/wn/13n@2x.png"
-		}
-	},
-	"73":{
-		"day":{
-			"description":"Snow",
-			"image":"http://openweathermap.org/img/wn/13d@2x.png"
-		},
-		"night":{
-			"description":"Snow",
-			"image":"http://openweathermap.org/img/wn/13n@2x.png"
-		}
-	},
-	"75":{
-		"day":{
-			"description":"Heavy Snow",
-			"image":"http://openweathermap.org/img/wn/13d@2x.png"
-		},
-		"night":{
-			"description":"Heavy Snow",
-			"image":"http://openweathermap.org/img/wn/13n@2x.png"
-		}
-	},
-	"77":{
-		"day":{
-			"description":"Snow Grains",
-			"image":"http://openweathermap.org/img/wn/13d@2x.png"
-		},
-		"night":{
-			"description":"Snow Grains",
-			"image":"http://openweathermap.org/img/wn/13n@2x.png"
-		}
-	},
-	"80":{
-		"day":{
-			"description":"Light Showers",
-			"image":"http://openweathermap.org/img/wn/09d@2x.png"
-		},
-		"night":{
-			"description":"Light Showers",
-			"image":"http://openweathermap.org/img/wn/09n@2x.png"
-		}
-	},
-	"81":{
-		"day":{
-			"description":"Showers",
-			"image":"http://openweathermap.org/img/wn/09d@2x.png"
-		},
-		"night":{
-			"description":"Showers",
-			"image":"http://openweathermap.org/img/wn/09n@2x.png"
-		}
-	},
-	"82":{
-		"day":{
-			"description":"Heavy Showers",
-			"image":"http://openweathermap.org/img/wn/09d@2x.png"
-		},
-		"night":{
-			"description":"Heavy Showers",
-			"image":"http://openweathermap.org/img/wn/09n@2x.png"
-		}
-	},
-	"85":{
-		"day":{
-			"description":"Light Snow Showers",
-			"image":"http://openweathermap.org/img/wn/13d@2x.png"
-		},
-		"night":{
-			"description":"Light Snow Showers",
-			"image":"http://openweathermap.org/img/wn/13n@2x.png"
-		}
-	},
-	"86":{
-		"day":{
-			"description":"Snow Showers",
-			"image":"http://openweathermap.org/img/wn/13d@2x.png"
-		},
-		"night":{
-			"description":"Snow Showers",
-			"image":"http://openweathermap.org/img/wn/13n@2x.png"
-		}
-	},
-	"95":{
-		"day":{
-			"description":"Thunderstorm",
-			"image":"http://openweathermap.org/img/wn/11d@2x.png"
-		},
-		"night":{
-			"description":"Thunderstorm",
-			"image":"http://openweathermap.org/img/wn/11n@2x.png"
-		}
-	},
-	"96":{
-		"day":{
-			"description":"Light Thunderstorms With Hail",
-			"image":"http://openweathermap.org/img/wn/11d@2x.png"
-		},
-		"night":{
-			"description":"Light Thunderstorms With Hail",
-			"image":"http://openweathermap.org/img/wn/11n@2x.png"
-		}
-	},
-	"99":{
-		"day":{
-			"description":"Thunderstorm With Hail",
-			"image":"http://openweathermap.org/img/wn/11d@2x.png"
-		},
-		"night":{
-			"description":"Thunderstorm With Hail",
-			"image":"http://openweathermap.org/img/wn/11n@2x.png"
-		}
-	}
-}
\ No newline at end of file
+import time
+
+ICON_URL = "http://openweathermap.org/img/wn/{icon}{suffix}@2x.png"
+
+# WMO weather codes used by Open-Meteo: (day description, night description, OpenWeather icon)
+_WEATHER_CODES = {
+    0: ("Sunny", "Clear", "01"),
+    1: ("Mainly Sunny", "Mainly Clear", "01"),
+    2: ("Partly Cloudy", "Partly Cloudy", "02"),
+    3: ("Cloudy", "Cloudy", "03"),
+    45: ("Foggy", "Foggy", "50"),
+    48: ("Rime Fog", "Rime Fog", "50"),
+    51: ("Light Drizzle", "Light Drizzle", "09"),
+    53: ("Drizzle", "Drizzle", "09"),
+    55: ("Heavy Drizzle", "Heavy Drizzle", "09"),
+    56: ("Light Freezing Drizzle", "Light Freezing Drizzle", "09"),
+    57: ("Freezing Drizzle", "Freezing Drizzle", "09"),
+    61: ("Light Rain", "Light Rain", "10"),
+    63: ("Rain", "Rain", "10"),
+    65: ("Heavy Rain", "Heavy Rain", "10"),
+    66: ("Light Freezing Rain", "Light Freezing Rain", "10"),
+    67: ("Freezing Rain", "Freezing Rain", "10"),
+    71: ("Light Snow", "Light Snow", "13"),
+    73: ("Snow", "Snow", "13"),
+    75: ("Heavy Snow", "Heavy Snow", "13"),
+    77: ("Snow Grains", "Snow Grains", "13"),
+    80: ("Light Showers", "Light Showers", "09"),
+    81: ("Showers", "Showers", "09"),
+    82: ("Heavy Showers", "Heavy Showers", "09"),
+    85: ("Light Snow Showers", "Light Snow Showers", "13"),
+    86: ("Snow Showers", "Snow Showers", "13"),
+    95: ("Thunderstorm", "Thunderstorm", "11"),
+    96: ("Light Thunderstorms With Hail", "Light Thunderstorms With Hail", "11"),
+    99: ("Thunderstorm With Hail", "Thunderstorm With Hail", "11"),
+}
+UNKNOWN = ("Unknown", "Unknown", "03")
+
+# Indexed by code, then by is_day: DESCRIPTIONS[False] is the night table
+DESCRIPTIONS = (
+    tuple(_WEATHER_CODES.get(code, UNKNOWN)[1] for code in range(100)),
+    tuple(_WEATHER_CODES.get(code, UNKNOWN)[0] for code in range(100)),
+)
+ICONS = (
+    tuple(ICON_URL.format(icon=_WEATHER_CODES.get(code, UNKNOWN)[2], suffix="n") for code in range(100)),
+    tuple(ICON_URL.format(icon=_WEATHER_CODES.get(code, UNKNOWN)[2], suffix="d") for code in range(100)),
+)
+
+
+def describe(code, is_day=True):
+    return DESCRIPTIONS[bool(is_day)][int(code)]
+
+
+def describe_many(codes, is_day=True):
+    # One lookup table for the whole forecast
+    return list(map(DESCRIPTIONS[bool(is_day)].__getitem__, map(int, codes)))
+
+
+def icon(code, is_day=True):
+    return ICONS[bool(is_day)][int(code)]
+
+
+def is_daytime(sunrise=None, sunset=None, now=None):
+    """
+    Whether it's day at the location, from the sunrise and sunset
+    timestamps the weather APIs return. Falls back to 6am-6pm local time
+    when they're missing (polar day/night or an older cached response).
+    """
+    now = time.time() if now is None else now
+    if sunrise is not None and sunset is not None:
+        return sunrise <= now < sunset
+    return 6 <= time.localtime(now).tm_hour < 18
+
+
+def is_precipitation(code):
+    # WMO codes from 51 up are drizzle, rain, snow, showers and thunderstorms
+    return int(code) >= 51